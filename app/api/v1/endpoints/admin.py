@@ -0,0 +1,95 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.llm.limiter import provider_limiters
+from app.core.llm.resilience import provider_resilience
+from app.core.summarizer.coalescing import summary_flights
+from app.core.summarizer.extraction import pdf_extraction_pool
+from app.core.summarizer.jobs import summary_jobs
+from app.core.summarizer.store import KEY_PATTERN, summary_store
+from app.core.summarizer.tree import summary_node_cache
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/summary-store")
+async def get_summary_store_stats():
+    """Get the number of entries and bytes used by the summary store"""
+    return await asyncio.to_thread(summary_store.stats)
+
+
+@router.delete("/summary-store")
+async def purge_summary_store(
+    key: Optional[str] = Query(None, pattern=KEY_PATTERN, description="sha256 key of the entry")
+):
+    """Purge one entry of the summary store, or every entry if no key is given"""
+    try:
+        purged = await asyncio.to_thread(summary_store.purge, key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    logger.info("Purged %d summary store entries", purged)
+    return {"purged": purged}
+
+
+@router.get("/summarizer-coalescing")
+async def get_summarizer_coalescing_stats():
+    """Get how many summarization requests were deduplicated by request coalescing"""
+    return summary_flights.stats()
+
+
+@router.get("/provider-limits")
+async def get_provider_limits():
+    """Get the current concurrency limit, in-flight calls and queue depth per provider and model"""
+    return {"enabled": provider_limiters.enabled, "limiters": provider_limiters.stats()}
+
+
+@router.get("/provider-circuits")
+async def get_provider_circuits():
+    """Get the circuit breaker state of every provider"""
+    return {"circuits": provider_resilience.stats()}
+
+
+@router.get("/summary-jobs")
+async def get_summary_jobs_stats():
+    """Get the number of pending, running and retained summary jobs"""
+    return summary_jobs.stats()
+
+
+@router.get("/pdf-extraction")
+async def get_pdf_extraction_stats():
+    """Get the number of PDF extraction processes and extractions in progress or waiting"""
+    return pdf_extraction_pool.stats()
+
+
+@router.get("/summary-nodes")
+async def get_summary_node_cache_stats():
+    """Get the number of cached summary tree nodes and how often they were reused"""
+    return summary_node_cache.stats()
+
+
+@router.delete("/summary-nodes")
+async def clear_summary_node_cache():
+    """Remove every cached summary tree node"""
+    cleared = len(summary_node_cache)
+    summary_node_cache.clear()
+    logger.info("Cleared %d summary tree nodes", cleared)
+    return {"cleared": cleared}
@@ -11,13 +11,22 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+from functools import partial
 import logging
+from typing import Any, AsyncIterator, Dict
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 
+from app.api.v1.streaming import ndjson_response, sse_response
+from app.core.batch import BatchResult, run_batch
 from app.core.config import settings
-from app.core.llm import get_llm_provider
-from app.schemas.llm import LLMAvailableProvidersResponse, LLMRequest, LLMResponse
+from app.core.llm.cache import response_cache
+from app.core.llm.errors import ProviderUnavailableError
+from app.core.llm.semantic_cache import semantic_cache
+from app.core.providers import get_llm_provider
+from app.core.routing import route_llm_provider
+from app.schemas.llm import LLMAvailableProvidersResponse, LLMBatchItemResult
+from app.schemas.llm import LLMBatchRequest, LLMBatchResponse, LLMRequest, LLMResponse
 
 
 logger = logging.getLogger(__name__)
@@ -31,20 +40,41 @@ async def get_available_providers():
     return {"providers": settings.available_ai_providers}
 
 
+def _llm_provider(request: LLMRequest):
+    """Return the provider of the request, behind the router and the semantic cache"""
+    llm_provider = get_llm_provider(request.provider)
+    routed_provider = route_llm_provider(llm_provider, request.routing)
+    return semantic_cache.wrap(routed_provider, llm_provider, request.cache)
+
+
 @router.post("/ask", response_model=LLMResponse)
-async def ask(request: LLMRequest):
-    """Ask a question to the specified LLM provider"""
+async def ask(request: LLMRequest, response: Response):
+    """
+    Ask a question to the specified LLM provider
+
+    Deterministic answers are served from the response cache when it is enabled, the cache
+    status is reported in the X-Cache response header. Paraphrased questions are answered by
+    the semantic cache when it is enabled, reporting the similarity of the earlier question and
+    X-Cache HIT-SEMANTIC.
+    Responds 429 with a Retry-After header when the provider is overloaded.
+
+    With routing enabled the question fails over to, or is hedged with, the configured fallback
+    providers and the provider field reports the provider that actually answered.
+    """
     try:
         # Get the provider
-        llm_provider = get_llm_provider(request.provider)
+        llm_provider = _llm_provider(request)
 
         # Send the query
-        result = await llm_provider.ask(
+        result, cache_status = await response_cache.ask(
+            llm_provider,
             query=request.query,
             model=request.model,
             temperature=request.temperature,
             max_tokens=request.max_tokens,
+            mode=request.cache,
         )
+        response.headers["X-Cache"] = cache_status
 
         return LLMResponse(
             provider=result["provider"],
@@ -52,8 +82,98 @@ async def ask(request: LLMRequest):
             model=result["model"],
             temperature=result["temperature"],
             response_max_tokens=result["response_max_tokens"],
+            similarity=result.get("similarity"),
         )
+    except ProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        ) from e
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}") from e
+
+
+@router.post("/ask/stream")
+async def ask_stream(request: LLMRequest):
+    """
+    Ask a question to the specified LLM provider streaming the answer as Server-Sent Events
+
+    Sends a "token" event per generated chunk and a final "metadata" event with the model,
+    provider and token usage. The upstream generation is cancelled if the client disconnects.
+    Streams are not routed, they can not switch provider once tokens were sent. Responds 429 or
+    503 with a Retry-After header when the provider is overloaded or unavailable.
+    """
+    try:
+        llm_provider = get_llm_provider(request.provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    return sse_response(
+        llm_provider.stream_ask(
+            query=request.query,
+            model=request.model,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens,
+        ),
+        llm_provider.provider_name,
+        request.model or llm_provider.default_model,
+    )
+
+
+async def _ask_batch_item(request: LLMRequest) -> LLMResponse:
+    llm_provider = _llm_provider(request)
+    result, _ = await response_cache.ask(
+        llm_provider,
+        query=request.query,
+        model=request.model,
+        temperature=request.temperature,
+        max_tokens=request.max_tokens,
+        mode=request.cache,
+    )
+    return LLMResponse(
+        provider=result["provider"],
+        response=result["response"],
+        model=result["model"],
+        temperature=result["temperature"],
+        response_max_tokens=result["response_max_tokens"],
+        similarity=result.get("similarity"),
+    )
+
+
+def _batch_item_result(batch_result: BatchResult) -> LLMBatchItemResult:
+    error = batch_result.error
+    if error is None:
+        return LLMBatchItemResult(index=batch_result.index, result=batch_result.result)
+    if isinstance(error, (ValueError, ProviderUnavailableError)):
+        return LLMBatchItemResult(index=batch_result.index, error=str(error))
+    return LLMBatchItemResult(
+        index=batch_result.index, error=f"Error processing request: {str(error)}"
+    )
+
+
+@router.post("/ask/batch", response_model=LLMBatchResponse)
+async def ask_batch(request: LLMBatchRequest):
+    """
+    Ask a batch of questions, running at most BATCH_MAX_CONCURRENCY at a time per provider
+
+    Returns one result or error per item in input order. With stream enabled every item is
+    sent as an NDJSON line, tagged with its index, as soon as it finishes.
+    """
+    calls = [(item.provider, partial(_ask_batch_item, item)) for item in request.items]
+    batch = run_batch(calls, settings.batch_max_concurrency)
+
+    if request.stream:
+
+        async def lines() -> AsyncIterator[Dict[str, Any]]:
+            try:
+                async for batch_result in batch:
+                    yield _batch_item_result(batch_result).model_dump()
+            finally:
+                await batch.aclose()
+
+        return ndjson_response(lines())
+
+    results = [_batch_item_result(batch_result) async for batch_result in batch]
+    results.sort(key=lambda item_result: item_result.index)
+    return LLMBatchResponse(results=results)
@@ -11,15 +11,27 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+from functools import partial
 import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, status, HTTPException, Depends
+from fastapi import APIRouter, status, HTTPException, Depends, Response
 
+from app.api.v1.streaming import ndjson_response, sse_response
+from app.api.v1.uploads import read_pdf_upload
+from app.core.batch import BatchResult, run_batch
 from app.core.config import settings
-from app.core.summarizer import get_summary_provider
+from app.core.llm.errors import ProviderUnavailableError
+from app.core.providers import get_summary_provider
+from app.core.summarizer.base import BaseSummarizer
+from app.core.summarizer.coalescing import summary_flights
+from app.core.summarizer.jobs import JobQueueFullError, summary_jobs
+from app.core.summarizer.store import content_hash, summary_key, summary_store
 from app.core.summarizer.summary_types import get_summary_types
 from app.schemas.summarizer import SummaryAvailableProvidersResponse, TextSummaryRequest
 from app.schemas.summarizer import PDFSummaryRequest, SummaryResponse
+from app.schemas.summarizer import PDFSummaryBatchRequest, SummaryBatchItemResult
+from app.schemas.summarizer import SummaryJobResponse, TextSummaryBatchRequest
 
 
 logger = logging.getLogger(__name__)
@@ -32,6 +44,99 @@ async def get_available_providers():
     return {"providers": settings.available_ai_providers}
 
 
+async def _summarize_text(
+    summarizer: BaseSummarizer,
+    text: str,
+    summary_type: str,
+    model: Optional[str],
+    temperature: Optional[float],
+    max_length: Optional[int],
+    strategy: Optional[str],
+    compression_ratio: Optional[float],
+) -> Dict[str, Any]:
+    """Summarize a text, sharing the generation with identical requests in flight"""
+    key = summary_key(
+        content_hash(text.encode("utf-8")),
+        summarizer.provider_name,
+        summary_type,
+        model,
+        temperature,
+        max_length,
+        strategy,
+        compression_ratio,
+    )
+    return await summary_flights.do(
+        f"text:{key}",
+        lambda: summarizer.summarize_text(
+            text=text,
+            summary_type=summary_type,
+            model=model,
+            temperature=temperature,
+            max_length=max_length,
+            strategy=strategy,
+            compression_ratio=compression_ratio,
+        ),
+    )
+
+
+async def _summarize_pdf(
+    summarizer: BaseSummarizer,
+    file_content: bytes,
+    file_name: str,
+    summary_type: str,
+    model: Optional[str],
+    temperature: Optional[float],
+    max_length: Optional[int],
+    strategy: Optional[str],
+    compression_ratio: Optional[float],
+) -> Tuple[Dict[str, Any], str]:
+    """Summarize a PDF through the summary store, sharing it with identical requests in flight"""
+    key = summary_key(
+        content_hash(file_content),
+        summarizer.provider_name,
+        summary_type,
+        model,
+        temperature,
+        max_length,
+        strategy,
+        compression_ratio,
+    )
+    return await summary_flights.do(
+        f"pdf:{key}",
+        lambda: summary_store.summarize_pdf(
+            summarizer,
+            file_content=file_content,
+            file_name=file_name,
+            summary_type=summary_type,
+            model=model,
+            temperature=temperature,
+            max_length=max_length,
+            strategy=strategy,
+            compression_ratio=compression_ratio,
+        ),
+    )
+
+
+def _summary_response(result: Dict[str, Any]) -> SummaryResponse:
+    return SummaryResponse(
+        provider=result["provider"],
+        summary_type=result["summary_type"],
+        summary=result["summary"],
+        model=result["model"],
+        response_max_tokens=result["response_max_tokens"],
+        source=result["source"],
+        temperature=result["temperature"],
+        strategy=result.get("strategy"),
+        chunks=result.get("chunks"),
+        chunks_reused=result.get("chunks_reused"),
+        nodes=result.get("nodes"),
+        nodes_reused=result.get("nodes_reused"),
+        input_tokens=result.get("input_tokens"),
+        compressed_tokens=result.get("compressed_tokens"),
+        timings=result.get("timings"),
+    )
+
+
 @router.get("/types", status_code=status.HTTP_200_OK)
 def summary_types():
     """Get the supported summary types"""
@@ -54,23 +159,22 @@ async def summarize_text(request: TextSummaryRequest):
         summarizer = get_summary_provider(request.provider)
 
         # Generate the summary
-        result = await summarizer.summarize_text(
+        result = await _summarize_text(
+            summarizer,
             text=request.text,
             summary_type=request.summary_type,
             model=request.model,
             temperature=request.temperature,
             max_length=request.max_length,
+            strategy=request.strategy,
+            compression_ratio=request.compression_ratio,
         )
 
-        return SummaryResponse(
-            provider=result["provider"],
-            summary_type=result["summary_type"],
-            summary=result["summary"],
-            model=result["model"],
-            response_max_tokens=result["response_max_tokens"],
-            source=result["source"],
-            temperature=result["temperature"],
-        )
+        return _summary_response(result)
+    except ProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        ) from e
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
     except Exception as e:
@@ -78,42 +182,347 @@ async def summarize_text(request: TextSummaryRequest):
 
 
 @router.post("/pdf", response_model=SummaryResponse)
-async def summarize_pdf(request: PDFSummaryRequest = Depends()):
-    """Summarize a PDF file using the specified provider"""
+async def summarize_pdf(response: Response, request: PDFSummaryRequest = Depends()):
+    """
+    Summarize a PDF file using the specified provider
+
+    Summaries are served from the content addressed summary store when it is enabled, the
+    store status is reported in the X-Cache response header. Files larger than
+    UPLOAD_MAX_BYTES are rejected with 413.
+    """
     logger.debug("Summarize PDF document")
 
     # Validate file type
     if not request.file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
+    # Read file content, rejecting files too large or that are not PDFs
+    file_content = await read_pdf_upload(request.file)
+
     try:
         # Get the provider
         summarizer = get_summary_provider(request.provider)
 
-        # Read file content
-        file_content = await request.file.read()
-
         # Generate the summary
-        result = await summarizer.summarize_pdf(
+        result, store_status = await _summarize_pdf(
+            summarizer,
             file_content=file_content,
             file_name=request.file.filename,
             summary_type=request.summary_type,
             model=request.model,
             temperature=request.temperature,
             max_length=request.max_length,
+            strategy=request.strategy,
+            compression_ratio=request.compression_ratio,
         )
+        response.headers["X-Cache"] = store_status
 
-        return SummaryResponse(
-            provider=result["provider"],
-            summary_type=result["summary_type"],
-            summary=result["summary"],
-            model=result["model"],
-            response_max_tokens=result["response_max_tokens"],
-            source=result["source"],
-            temperature=result["temperature"],
-        )
+        return _summary_response(result)
+    except ProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        ) from e
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}") from e
+
+
+@router.post("/text/stream")
+async def summarize_text_stream(request: TextSummaryRequest):
+    """
+    Summarize text using the specified provider streaming the summary as Server-Sent Events
+
+    Sends "progress" events, a "token" event per generated chunk and a final "summary" event
+    with the same fields as the non streaming response.
+    """
+    logger.debug("Summarize text (streaming)")
+    try:
+        summarizer = get_summary_provider(request.provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    return sse_response(
+        summarizer.stream_summarize_text(
+            text=request.text,
+            summary_type=request.summary_type,
+            model=request.model,
+            temperature=request.temperature,
+            max_length=request.max_length,
+            strategy=request.strategy,
+            compression_ratio=request.compression_ratio,
+        ),
+        summarizer.provider_name,
+        request.model,
+    )
+
+
+@router.post("/pdf/stream")
+async def summarize_pdf_stream(request: PDFSummaryRequest = Depends()):
+    """
+    Summarize a PDF file using the specified provider streaming the summary as Server-Sent Events
+
+    Sends "progress" events for the extraction and prompting phases first, then a "token" event
+    per generated chunk and a final "summary" event with the same fields as the non streaming
+    response.
+    """
+    logger.debug("Summarize PDF document (streaming)")
+
+    # Validate file type
+    if not request.file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    try:
+        summarizer = get_summary_provider(request.provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    # Read the upload before streaming, the file is closed once the endpoint returns
+    file_content = await read_pdf_upload(request.file)
+
+    return sse_response(
+        summarizer.stream_summarize_pdf(
+            file_content=file_content,
+            file_name=request.file.filename,
+            summary_type=request.summary_type,
+            model=request.model,
+            temperature=request.temperature,
+            max_length=request.max_length,
+            strategy=request.strategy,
+            compression_ratio=request.compression_ratio,
+        ),
+        summarizer.provider_name,
+        request.model,
+    )
+
+
+def _batch_lines(
+    batch: AsyncIterator[BatchResult], file_names: Optional[List[str]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Turn batch results into NDJSON lines, closing the batch if the client goes away"""
+
+    async def lines() -> AsyncIterator[Dict[str, Any]]:
+        try:
+            async for batch_result in batch:
+                item_result = SummaryBatchItemResult(
+                    index=batch_result.index,
+                    file_name=file_names[batch_result.index] if file_names else None,
+                )
+                error = batch_result.error
+                if error is None:
+                    item_result.result = _summary_response(batch_result.result)
+                elif isinstance(error, (ValueError, ProviderUnavailableError)):
+                    item_result.error = str(error)
+                else:
+                    item_result.error = f"Error processing request: {str(error)}"
+                yield item_result.model_dump()
+        finally:
+            await batch.aclose()
+
+    return lines()
+
+
+@router.post("/text/batch")
+async def summarize_text_batch(request: TextSummaryBatchRequest):
+    """
+    Summarize a batch of texts, running at most BATCH_MAX_CONCURRENCY at a time per provider
+
+    Every result or error is sent as an NDJSON line, tagged with its index, as soon as it
+    finishes.
+    """
+    logger.debug("Summarize %d texts", len(request.items))
+
+    async def summarize(item):
+        summarizer = get_summary_provider(item.provider)
+        return await _summarize_text(
+            summarizer,
+            text=item.text,
+            summary_type=item.summary_type,
+            model=item.model,
+            temperature=item.temperature,
+            max_length=item.max_length,
+            strategy=item.strategy,
+            compression_ratio=item.compression_ratio,
+        )
+
+    calls = [(item.provider, partial(summarize, item)) for item in request.items]
+    return ndjson_response(_batch_lines(run_batch(calls, settings.batch_max_concurrency)))
+
+
+@router.post("/pdf/batch")
+async def summarize_pdf_batch(request: PDFSummaryBatchRequest = Depends()):
+    """
+    Summarize a batch of PDF files, running at most BATCH_MAX_CONCURRENCY at a time
+
+    Batches whose files add up to more than BATCH_MAX_BYTES are rejected with 413. PDFs are
+    extracted in parallel and every result or error is sent as an NDJSON line, tagged
+    with its index and file name, as soon as it finishes.
+    """
+    logger.debug("Summarize %d PDF documents", len(request.files))
+
+    if len(request.files) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.batch_max_items} files are supported"
+        )
+    if not all(file.filename.lower().endswith(".pdf") for file in request.files):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    try:
+        summarizer = get_summary_provider(request.provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    # Read the uploads before streaming, the files are closed once the endpoint returns. They
+    # are all held in memory until the batch ends, so their total size is capped too.
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Batches larger than {settings.batch_max_bytes} bytes are not supported",
+    )
+    if sum(file.size or 0 for file in request.files) > settings.batch_max_bytes:
+        raise too_large
+    file_names = [file.filename for file in request.files]
+    file_contents = []
+    batch_bytes = 0
+    for file in request.files:
+        file_contents.append(await read_pdf_upload(file))
+        batch_bytes += len(file_contents[-1])
+        if batch_bytes > settings.batch_max_bytes:
+            raise too_large
+
+    async def summarize(file_content: bytes, file_name: str):
+        result, _ = await _summarize_pdf(
+            summarizer,
+            file_content=file_content,
+            file_name=file_name,
+            summary_type=request.summary_type,
+            model=request.model,
+            temperature=request.temperature,
+            max_length=request.max_length,
+            strategy=request.strategy,
+            compression_ratio=request.compression_ratio,
+        )
+        return result
+
+    calls = [
+        (request.provider, partial(summarize, file_content, file_name))
+        for file_content, file_name in zip(file_contents, file_names)
+    ]
+    batch = run_batch(calls, settings.batch_max_concurrency)
+    return ndjson_response(_batch_lines(batch, file_names))
+
+
+def _submit_job(events, key: str) -> SummaryJobResponse:
+    try:
+        job = summary_jobs.submit(events, key)
+    except JobQueueFullError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    return SummaryJobResponse(**job.to_dict())
+
+
+@router.post("/jobs/text", response_model=SummaryJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_text_summary_job(request: TextSummaryRequest):
+    """
+    Start summarizing a text in the background, returning the job to poll right away
+
+    Identical requests share the job of the first one until it fails or is forgotten.
+    """
+    logger.debug("Create text summary job")
+    try:
+        summarizer = get_summary_provider(request.provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    key = summary_key(
+        content_hash(request.text.encode("utf-8")),
+        summarizer.provider_name,
+        request.summary_type,
+        request.model,
+        request.temperature,
+        request.max_length,
+        request.strategy,
+        request.compression_ratio,
+    )
+    return _submit_job(
+        lambda: summarizer.stream_summarize_text(
+            text=request.text,
+            summary_type=request.summary_type,
+            model=request.model,
+            temperature=request.temperature,
+            max_length=request.max_length,
+            strategy=request.strategy,
+            compression_ratio=request.compression_ratio,
+        ),
+        f"text:{key}",
+    )
+
+
+@router.post("/jobs/pdf", response_model=SummaryJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_pdf_summary_job(request: PDFSummaryRequest = Depends()):
+    """
+    Start summarizing a PDF file in the background, returning the job to poll right away
+
+    Long documents no longer hold the request open: poll the job for its progress and result.
+    Identical requests share the job of the first one until it fails or is forgotten, and
+    summaries are served from and saved to the summary store.
+    """
+    logger.debug("Create PDF summary job")
+
+    # Validate file type
+    if not request.file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    try:
+        summarizer = get_summary_provider(request.provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    # Read the upload now, the file is closed once the endpoint returns
+    file_content = await read_pdf_upload(request.file)
+
+    key = summary_key(
+        content_hash(file_content),
+        summarizer.provider_name,
+        request.summary_type,
+        request.model,
+        request.temperature,
+        request.max_length,
+        request.strategy,
+        request.compression_ratio,
+    )
+    return _submit_job(
+        lambda: summary_store.summary_events(
+            key,
+            lambda: summarizer.stream_summarize_pdf(
+                file_content=file_content,
+                file_name=request.file.filename,
+                summary_type=request.summary_type,
+                model=request.model,
+                temperature=request.temperature,
+                max_length=request.max_length,
+                strategy=request.strategy,
+                compression_ratio=request.compression_ratio,
+            ),
+        ),
+        f"pdf:{key}",
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=SummaryJobResponse)
+async def get_summary_job(job_id: str):
+    """Get the status, progress and, once finished, the result of a summary job"""
+    job = summary_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Summary job not found")
+    return SummaryJobResponse(**job.to_dict())
+
+
+@router.delete("/jobs/{job_id}", response_model=SummaryJobResponse)
+async def cancel_summary_job(job_id: str):
+    """Cancel a pending or running summary job"""
+    job = summary_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Summary job not found")
+    return SummaryJobResponse(**job.to_dict())
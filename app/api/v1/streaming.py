@@ -0,0 +1,86 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.core.llm.errors import ProviderUnavailableError
+from app.core.llm.resilience import provider_resilience
+
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format an event and its JSON payload as a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def sse_events(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    Format provider events as Server-Sent Events
+
+    Errors raised while streaming are sent as a final "error" event since the response status
+    has already been sent, overloaded providers also report when to retry. If the client
+    disconnects the response task is cancelled and the provider stream is closed, which cancels
+    the upstream generation.
+    """
+    try:
+        async for event in events:
+            yield format_sse(event["event"], event["data"])
+    except ProviderUnavailableError as e:
+        yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+    except ValueError as e:
+        yield format_sse("error", {"detail": str(e)})
+    except Exception as e:
+        logger.error("Error streaming response: %s", e)
+        yield format_sse("error", {"detail": f"Error processing request: {str(e)}"})
+    finally:
+        await events.aclose()
+
+
+def sse_response(
+    events: AsyncIterator[Dict[str, Any]], provider: str, model: Optional[str] = None
+) -> StreamingResponse:
+    """
+    Build a streaming response sending the provider events as Server-Sent Events
+
+    If the provider is unavailable or overloaded right now the stream is not started and the
+    error is raised as an HTTPException with its status and a Retry-After header instead.
+    """
+    try:
+        provider_resilience.check(provider, model)
+    except ProviderUnavailableError as e:
+        raise HTTPException(
+            status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        ) from e
+
+    return StreamingResponse(
+        sse_events(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def ndjson_response(lines: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Build a streaming response sending every item as a JSON line"""
+
+    async def ndjson_lines() -> AsyncIterator[str]:
+        async for line in lines:
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
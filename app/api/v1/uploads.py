@@ -0,0 +1,63 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from io import BytesIO
+import logging
+
+from fastapi import HTTPException, UploadFile, status
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b"%PDF-"
+# PDF readers accept a header anywhere in the first KiB, after junk such as a BOM
+PDF_HEADER_WINDOW = 1024
+
+
+async def read_pdf_upload(file: UploadFile) -> bytes:
+    """
+    Read an uploaded PDF file in bounded chunks
+
+    The multipart parser already spools uploads to a temporary file, so the file is only read
+    into memory after checking the size reported by the parser and the PDF header in its first
+    KiB, and reading stops with a 413 as soon as it exceeds UPLOAD_MAX_BYTES.
+    """
+    max_bytes = settings.upload_max_bytes
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"PDF files larger than {max_bytes} bytes are not supported",
+    )
+
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    header = await file.read(PDF_HEADER_WINDOW)
+    if PDF_MAGIC not in header:
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    # Write into one buffer, getvalue hands it over without the copy joining chunks would make
+    buffer = BytesIO()
+    buffer.write(header)
+    size = len(header)
+    if size > max_bytes:
+        raise too_large
+    while chunk := await file.read(settings.upload_chunk_size):
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        buffer.write(chunk)
+
+    logger.debug("Read %d bytes from %s", size, file.filename)
+    return buffer.getvalue()
@@ -0,0 +1,61 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from collections import defaultdict
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, NamedTuple, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchResult(NamedTuple):
+    index: int
+    result: Any
+    error: Optional[Exception]
+
+
+async def run_batch(
+    calls: Sequence[Tuple[str, Callable[[], Awaitable[Any]]]], max_concurrency: int
+) -> AsyncIterator[BatchResult]:
+    """
+    Run a batch of calls concurrently, at most max_concurrency at a time per group
+
+    Args:
+        calls: Pairs of group name (usually the provider) and callable returning the awaitable
+        max_concurrency: Maximum number of calls of the same group running at the same time
+
+    Yields:
+        The result or error of every call, tagged with its index, as soon as it finishes.
+        Pending calls are cancelled if the consumer stops iterating.
+    """
+    semaphores = defaultdict(lambda: asyncio.Semaphore(max_concurrency))
+
+    async def run(index: int, group: str, call: Callable[[], Awaitable[Any]]) -> BatchResult:
+        async with semaphores[group]:
+            try:
+                return BatchResult(index, await call(), None)
+            except Exception as e:
+                logger.debug("Batch item %d failed: %s", index, e)
+                return BatchResult(index, None, e)
+
+    tasks = [
+        asyncio.ensure_future(run(index, group, call)) for index, (group, call) in enumerate(calls)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
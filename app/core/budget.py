@@ -0,0 +1,300 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import math
+import re
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+import numpy as np
+
+from app.core.chunker import iter_chunks, iter_text_chunks
+from app.core.config import settings
+
+
+STRATEGY_NONE = "none"
+STRATEGY_AUTO = "auto"
+STRATEGY_TRUNCATE = "truncate"
+STRATEGY_EXTRACTIVE = "extractive"
+STRATEGY_CHUNKED = "chunked"
+STRATEGY_MAP_REDUCE = "map_reduce"
+STRATEGY_TREE = "tree"
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text from its length"""
+    return math.ceil(len(text) / settings.token_estimate_chars_per_token)
+
+
+def documents_tokens(docs: List[Document]) -> int:
+    """Estimate the number of tokens of the documents"""
+    return sum(estimate_tokens(doc.page_content) for doc in docs)
+
+
+def context_size(model: Optional[str]) -> int:
+    """Return the context window size of the model, in tokens"""
+    return settings.model_context_sizes.get(model, settings.default_context_size)
+
+
+def context_window(model: Optional[str], tokens: Optional[int] = None) -> int:
+    """
+    Return the context window to request for a call of about tokens, prompt and output included
+
+    Windows are powers of two from TOKEN_BUDGET_MIN_CONTEXT up to the context size of the model,
+    so short prompts do not make the server allocate the cache of the whole context, and only a
+    few windows, each a warm client, are used per model. The whole context if tokens is None.
+    """
+    size = context_size(model)
+    if tokens is None:
+        return size
+    window = settings.token_budget_min_context
+    while window < tokens:
+        window *= 2
+    return min(window, size)
+
+
+class TokenBudget:
+    """Number of input tokens a summary prompt can use without overflowing the model context"""
+
+    def __init__(
+        self,
+        context_size: int,
+        max_output_tokens: int,
+        reserved_tokens: int = settings.token_budget_reserved_tokens,
+        overflow_strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
+    ):
+        self.context_size = context_size
+        self.max_output_tokens = max_output_tokens
+        self.reserved_tokens = reserved_tokens
+        self.overflow_strategy = overflow_strategy
+        self.compression_ratio = compression_ratio
+
+    @classmethod
+    def for_model(
+        cls,
+        model: Optional[str],
+        max_output_tokens: Optional[int],
+        overflow_strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
+    ) -> "TokenBudget":
+        """Return the budget of the model generating at most max_output_tokens"""
+        return cls(
+            context_size(model),
+            max_output_tokens or settings.default_max_tokens,
+            overflow_strategy=overflow_strategy,
+            compression_ratio=compression_ratio,
+        )
+
+    def input_tokens(self, prompt_template: str) -> int:
+        """Return the number of tokens left for the context of the prompt template"""
+        available = (
+            self.context_size
+            - self.max_output_tokens
+            - self.reserved_tokens
+            - estimate_tokens(prompt_template.replace("{context}", ""))
+        )
+        if available <= 0:
+            raise ValueError("Maximum summary length exceeds the model context size")
+        return available
+
+    def compression_tokens(self, tokens: int) -> Optional[int]:
+        """
+        Return how many tokens to pre-compress documents of the given size to, if any
+
+        Uses the compression ratio of the budget, falling back to the configured one.
+        """
+        ratio = self.compression_ratio or settings.token_budget_compression_ratio
+        if not ratio or ratio >= 1:
+            return None
+        return max(1, math.ceil(tokens * ratio))
+
+    def strategy(self, tokens: int, max_tokens: int) -> str:
+        """
+        Return how to fit documents of the given size in max_tokens
+
+        Uses the overflow strategy of the budget, falling back to the configured one.
+        """
+        if tokens <= max_tokens:
+            return STRATEGY_NONE
+
+        strategy = self.overflow_strategy or settings.token_budget_overflow_strategy
+        if strategy != STRATEGY_AUTO:
+            return strategy
+
+        # Mild overflows keep most of the text, larger ones need every part summarized and the
+        # largest ones several tiers of summaries
+        if tokens <= max_tokens * settings.token_budget_extractive_ratio:
+            return STRATEGY_EXTRACTIVE
+        if tokens > max_tokens * settings.token_budget_tree_ratio:
+            return STRATEGY_TREE
+        return STRATEGY_MAP_REDUCE
+
+
+def truncate_documents(docs: List[Document], max_tokens: int) -> List[Document]:
+    """Keep the documents in order until max_tokens, cutting the last one"""
+    truncated = []
+    remaining = max_tokens
+    for doc in docs:
+        if remaining <= 0:
+            break
+        tokens = estimate_tokens(doc.page_content)
+        if tokens > remaining:
+            max_chars = int(remaining * settings.token_estimate_chars_per_token)
+            doc = Document(page_content=doc.page_content[:max_chars], metadata=doc.metadata)
+            tokens = remaining
+        truncated.append(doc)
+        remaining -= tokens
+    return truncated
+
+
+def split_documents(docs: List[Document], max_tokens: int) -> List[List[Document]]:
+    """
+    Group the documents in order into groups of at most max_tokens
+
+    Documents over max_tokens are split by the chunker first, at paragraph or sentence
+    boundaries, keeping their page and character offsets.
+    """
+    groups: List[List[Document]] = []
+    group: List[Document] = []
+    group_tokens = 0
+    for doc in docs:
+        parts = [doc]
+        if estimate_tokens(doc.page_content) > max_tokens:
+            parts = iter_chunks([doc], max_tokens)
+        for part in parts:
+            tokens = estimate_tokens(part.page_content)
+            if group and group_tokens + tokens > max_tokens:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(part)
+            group_tokens += tokens
+    if group:
+        groups.append(group)
+    return groups
+
+
+def textrank_scores(
+    sentences: List[str], damping: float = 0.85, iterations: int = 50, tolerance: float = 1e-6
+) -> np.ndarray:
+    """
+    Score how central every sentence is with TextRank over their TF-IDF cosine similarity
+
+    The similarity graph is never built: with X the L2 normalized TF-IDF matrix, stored as
+    coordinates, every power iteration multiplies by X X^T through two bincounts, in time and
+    memory linear in the number of words instead of quadratic in the number of sentences.
+    """
+    count = len(sentences)
+    vocabulary: Dict[str, int] = {}
+    rows: List[int] = []
+    columns: List[int] = []
+    for index, sentence in enumerate(sentences):
+        for word in WORD.findall(sentence.lower()):
+            if len(word) > 3:
+                rows.append(index)
+                columns.append(vocabulary.setdefault(word, len(vocabulary)))
+    if not rows:
+        return np.full(count, 1.0 / max(count, 1))
+
+    # One coordinate per sentence and word, weighted by its TF-IDF
+    words = len(vocabulary)
+    pairs, term_counts = np.unique(
+        np.array(rows, dtype=np.int64) * words + np.array(columns), return_counts=True
+    )
+    rows, columns = np.divmod(pairs, words)
+    document_frequency = np.bincount(columns, minlength=words)
+    idf = np.log((1 + count) / (1 + document_frequency)) + 1
+    values = (1 + np.log(term_counts)) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights=values**2, minlength=count))
+    values /= norms[rows]
+    has_words = norms > 0
+
+    def similarity(vector: np.ndarray) -> np.ndarray:
+        """Multiply by the similarity matrix without its diagonal, X X^T - I"""
+        word_weights = np.bincount(columns, weights=values * vector[rows], minlength=words)
+        return np.bincount(rows, weights=values * word_weights[columns], minlength=count) - (
+            vector * has_words
+        )
+
+    degree = similarity(np.ones(count))
+    connected = degree > 1e-12
+    degree[~connected] = 1.0
+    scores = np.full(count, 1.0 / count)
+    for _ in range(iterations):
+        updated = (1 - damping) / count + damping * similarity(
+            np.where(connected, scores / degree, 0.0)
+        )
+        converged = np.abs(updated - scores).sum() < tolerance
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+def _split_sentences(text: str, max_tokens: int) -> List[str]:
+    """Split the text in sentences, chunking the ones over max_tokens such as unpunctuated text"""
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        if estimate_tokens(sentence) > max_tokens:
+            sentences.extend(
+                sentence[start:end] for start, end in iter_text_chunks(sentence, max_tokens)
+            )
+        elif sentence.strip():
+            sentences.append(sentence)
+    return sentences
+
+
+def extract_documents(docs: List[Document], max_tokens: int) -> List[Document]:
+    """
+    Keep the most central sentences of the documents within max_tokens
+
+    Sentences are ranked with TextRank over their TF-IDF similarity and the best ones are kept
+    in their original order, so the prompt covers the whole text instead of its beginning.
+    Sentences over TOKEN_BUDGET_MAX_SENTENCE_TOKENS, like text without punctuation, are chunked
+    first. When no sentence fits, the most central one is cut to max_tokens, so text is never
+    dropped whole.
+    """
+    sentences = [
+        (doc_index, sentence)
+        for doc_index, doc in enumerate(docs)
+        for sentence in _split_sentences(
+            doc.page_content, min(max_tokens, settings.token_budget_max_sentence_tokens)
+        )
+    ]
+    scores = textrank_scores([sentence for _, sentence in sentences])
+
+    kept = set()
+    remaining = max_tokens
+    for index in np.argsort(-scores, kind="stable").tolist():
+        tokens = estimate_tokens(sentences[index][1]) + 1
+        if tokens <= remaining:
+            kept.add(index)
+            remaining -= tokens
+    if not kept and sentences:
+        # Even the most central sentence is over the budget, cut it rather than prompt nothing
+        doc_index, sentence = sentences[int(np.argmax(scores))]
+        sentence_doc = Document(page_content=sentence, metadata=docs[doc_index].metadata)
+        return truncate_documents([sentence_doc], max_tokens)
+
+    kept_sentences: List[List[str]] = [[] for _ in docs]
+    for index in sorted(kept):
+        doc_index, sentence = sentences[index]
+        kept_sentences[doc_index].append(sentence)
+    return [
+        Document(page_content=" ".join(doc_sentences), metadata=doc.metadata)
+        for doc, doc_sentences in zip(docs, kept_sentences)
+        if doc_sentences
+    ]
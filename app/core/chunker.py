@@ -0,0 +1,104 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import re
+from typing import Iterable, Iterator, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+WHITESPACE = re.compile(r"\s+")
+NON_WHITESPACE = re.compile(r"\S")
+
+# Preferred places to end a chunk, from the best to the worst
+BOUNDARIES = (PARAGRAPH_BREAK, SENTENCE_END, WHITESPACE)
+
+
+def _last_boundary(text: str, start: int, end: int) -> int:
+    """Return the end of the last paragraph break, sentence end or whitespace in [start, end)"""
+    for boundary in BOUNDARIES:
+        last = None
+        for last in boundary.finditer(text, start, end):
+            pass
+        if last is not None:
+            return last.end()
+    return end
+
+
+def iter_text_chunks(
+    text: str, max_tokens: int, overlap_tokens: int = 0
+) -> Iterator[Tuple[int, int]]:
+    """
+    Yield the [start, end) character offsets of the chunks of the text
+
+    Chunks hold up to max_tokens and end at the last paragraph break of their second half,
+    or else its last sentence end or whitespace, so words are only cut when a chunk has no
+    whitespace at all. Every chunk after the first starts up to overlap_tokens before the end
+    of the previous one, at the start of a word. Leading and trailing whitespace is left out.
+
+    The text is scanned in place, so only one chunk is copied at a time whatever its size.
+    """
+    max_chars = max(1, int(max_tokens * settings.token_estimate_chars_per_token))
+    overlap_chars = min(
+        int(overlap_tokens * settings.token_estimate_chars_per_token), max_chars // 2
+    )
+
+    start = 0
+    while True:
+        first = NON_WHITESPACE.search(text, start)
+        if first is None:
+            return
+        start = first.start()
+
+        if len(text) - start <= max_chars:
+            cut = len(text)
+        else:
+            cut = _last_boundary(text, start + max_chars // 2, start + max_chars)
+
+        end = cut
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        yield start, end
+
+        if cut >= len(text):
+            return
+        next_start = cut
+        if overlap_chars:
+            word = WHITESPACE.search(text, max(start + 1, end - overlap_chars), end)
+            if word is not None:
+                next_start = word.end()
+        start = next_start
+
+
+def iter_chunks(
+    docs: Iterable[Document],
+    max_tokens: int,
+    overlap_tokens: int = settings.chunk_overlap_tokens,
+) -> Iterator[Document]:
+    """
+    Yield chunks of up to max_tokens of the documents, lazily and in order
+
+    Chunks never span two documents. Each one keeps the metadata of its document, so PDF pages
+    keep their page numbers, and adds start_index and end_index, its character offsets in the
+    document.
+    """
+    for doc in docs:
+        for start, end in iter_text_chunks(doc.page_content, max_tokens, overlap_tokens):
+            yield Document(
+                page_content=doc.page_content[start:end],
+                metadata={**doc.metadata, "start_index": start, "end_index": end},
+            )
@@ -11,7 +11,7 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -28,6 +28,107 @@ class Settings(BaseSettings):
     default_model_temperature: float = Field(default=0.0)
     default_max_tokens: int = Field(default=1000)
 
+    # Token budgets
+    default_context_size: int = Field(default=8192)
+    model_context_sizes: Dict[str, int] = Field(
+        default={
+            "llama3:8b": 8192,
+            "llama3.1:8b": 131072,
+            "mistral": 32768,
+            "gpt-4o": 128000,
+            "gpt-4o-mini": 128000,
+            "gpt-4": 8192,
+        }
+    )
+    token_estimate_chars_per_token: float = Field(default=4.0)
+    token_budget_reserved_tokens: int = Field(default=256)
+    token_budget_min_context: int = Field(default=2048)
+    token_budget_overflow_strategy: str = Field(default="auto")
+    token_budget_extractive_ratio: float = Field(default=1.5)
+    token_budget_max_rounds: int = Field(default=3)
+    token_budget_map_concurrency: int = Field(default=4)
+    token_budget_tree_ratio: float = Field(default=8.0)
+    token_budget_compression_ratio: Optional[float] = Field(default=None)
+    token_budget_max_sentence_tokens: int = Field(default=100)
+
+    # Chunking
+    chunk_overlap_tokens: int = Field(default=0)
+
+    # Summary trees
+    summary_tree_fan_in: int = Field(default=4)
+    summary_node_cache_enabled: bool = Field(default=True)
+    summary_node_cache_size: int = Field(default=4096)
+    summary_node_cache_path: str = Field(default="")
+    summary_node_cache_save_interval: float = Field(default=60.0)
+
+    # LLM clients
+    llm_client_registry_size: int = Field(default=32)
+    llm_http_max_connections: int = Field(default=100)
+    llm_http_max_keepalive_connections: int = Field(default=20)
+
+    # Batches
+    batch_max_items: int = Field(default=1000)
+    batch_max_concurrency: int = Field(default=4)
+    batch_max_bytes: int = Field(default=200 * 1024 * 1024)
+
+    # Provider concurrency limits
+    limiter_enabled: bool = Field(default=True)
+    limiter_initial_limit: int = Field(default=8)
+    limiter_min_limit: int = Field(default=1)
+    limiter_max_limit: int = Field(default=64)
+    limiter_max_queue: int = Field(default=64)
+    limiter_latency_threshold: float = Field(default=60.0)
+    limiter_backoff: float = Field(default=0.75)
+
+    # Provider resilience
+    provider_call_timeout: float = Field(default=120.0)
+    provider_retry_attempts: int = Field(default=3)
+    provider_retry_base_delay: float = Field(default=0.5)
+    provider_retry_max_delay: float = Field(default=8.0)
+    circuit_breaker_failure_threshold: int = Field(default=5)
+    circuit_breaker_reset_timeout: float = Field(default=30.0)
+
+    # LLM routing
+    llm_routing_mode: str = Field(default="off")
+    llm_routing_fallbacks: List[str] = Field(default=["ollama", "openai"])
+    llm_hedging_quantile: float = Field(default=0.95)
+    llm_hedging_min_delay: float = Field(default=2.0)
+    llm_hedging_min_samples: int = Field(default=20)
+    llm_hedging_window: int = Field(default=200)
+
+    # LLM response cache
+    llm_response_cache_enabled: bool = Field(default=False)
+    llm_response_cache_size: int = Field(default=1024)
+    llm_response_cache_ttl: float = Field(default=3600.0)
+
+    # Semantic answer cache
+    semantic_cache_enabled: bool = Field(default=False)
+    semantic_cache_threshold: float = Field(default=0.92)
+    semantic_cache_size: int = Field(default=1024)
+    semantic_cache_ttl: float = Field(default=3600.0)
+    semantic_cache_embed_timeout: float = Field(default=5.0)
+
+    # Summary store
+    summary_store_enabled: bool = Field(default=False)
+    summary_store_path: str = Field(default=".cache/summaries")
+    summary_store_max_bytes: int = Field(default=256 * 1024 * 1024)
+
+    # Uploads
+    upload_max_bytes: int = Field(default=50 * 1024 * 1024)
+    upload_chunk_size: int = Field(default=1024 * 1024)
+
+    # PDF extraction
+    pdf_extraction_processes: int = Field(default=2)
+    pdf_extraction_max_queued: int = Field(default=16)
+    pdf_extraction_cpu_time: float = Field(default=60.0)
+    pdf_extraction_parallel_min_pages: int = Field(default=100)
+
+    # Summary jobs
+    summary_jobs_max_concurrency: int = Field(default=2)
+    summary_jobs_max_queued: int = Field(default=100)
+    summary_jobs_max_retained: int = Field(default=1000)
+    summary_jobs_retention: float = Field(default=3600.0)
+
     # OpenAI
     openai_api_key: Optional[str] = Field(default=None)
     openai_default_embeddings_model: Optional[str] = Field(default="text-embedding-3-small")
@@ -12,9 +12,10 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from typing import Any, AsyncIterator, Dict, Optional
 
 from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
 
 
 class BaseLLM(ABC):
@@ -26,10 +27,38 @@ class BaseLLM(ABC):
         """Return the provider name"""
         pass
 
+    @property
+    def default_model(self) -> Optional[str]:
+        """Return the chat model used when none is requested"""
+        return None
+
     @abstractmethod
     def get_embeddings_provider(self, model_name: Optional[str] = None) -> Embeddings:
         pass
 
+    @abstractmethod
+    def get_chat_model(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        prompt_tokens: Optional[int] = None,
+    ) -> BaseChatModel:
+        """
+        Return a warm chat model client from the client registry
+
+        Args:
+            model: Model to use
+            temperature: Temperature for generation
+            max_tokens: Maximum tokens to generate
+            prompt_tokens: Estimated size of the prompts, to size the context window of
+                providers allocating it per model instance, the whole context if None
+
+        Returns:
+            Chat model client configured with the given parameters
+        """
+        pass
+
     @abstractmethod
     async def ask(
         self,
@@ -51,3 +80,26 @@ class BaseLLM(ABC):
             Dictionary containing the response and metadata
         """
         pass
+
+    @abstractmethod
+    def stream_ask(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ask a question to the LLM streaming the answer as it is generated
+
+        Args:
+            query: The question to ask
+            model: Specific model to use
+            temperature: Temperature for generation
+            max_tokens: Maximum tokens to generate
+
+        Yields:
+            "token" events with the generated content, followed by a final "metadata" event
+            with the model, provider and token usage
+        """
+        pass
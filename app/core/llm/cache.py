@@ -0,0 +1,196 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.llm.base import BaseLLM
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_HIT = "HIT"
+CACHE_MISS = "MISS"
+CACHE_BYPASS = "BYPASS"
+CACHE_SEMANTIC_HIT = "HIT-SEMANTIC"
+
+
+class CachedLLM:
+    """LLM provider answering through a cache of its own, reporting whether it was used"""
+
+    async def ask_cached(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Ask a question, returning the answer and the cache status"""
+        raise NotImplementedError
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of LLM answers with a time to live
+
+    Only deterministic answers (temperature 0) are cached. Keys are a hash of the normalized
+    provider, model, query, temperature and max tokens.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.llm_response_cache_enabled,
+        max_size: int = settings.llm_response_cache_size,
+        ttl: float = settings.llm_response_cache_ttl,
+    ):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: Optional[str],
+        query: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+    ) -> str:
+        """Return the hash of the normalized request parameters"""
+        normalized = json.dumps(
+            [
+                provider.strip().lower(),
+                (model or "").strip(),
+                " ".join(query.split()),
+                float(temperature or 0.0),
+                max_tokens,
+            ],
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_cacheable(temperature: Optional[float]) -> bool:
+        """Only answers generated without sampling temperature are deterministic"""
+        return not temperature
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached answer, if present and not expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Cache an answer, evicting the least recently used ones when full"""
+        self._entries[key] = (time.monotonic() + self.ttl, dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every cached answer"""
+        self._entries.clear()
+
+    async def aclose(self):
+        """Release the cached answers on shutdown"""
+        self.clear()
+
+    async def ask(
+        self,
+        llm_provider: BaseLLM,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        mode: str = "use",
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Ask a question through the cache
+
+        Args:
+            llm_provider: The provider answering cache misses
+            query: The question to ask
+            model: Specific model to use
+            temperature: Temperature for generation
+            max_tokens: Maximum tokens to generate
+            mode: "use" to read and fill the cache, "refresh" to skip the lookup but store the
+                new answer, or "bypass" to ignore the cache entirely
+
+        Returns:
+            The answer and the cache status (HIT, HIT-SEMANTIC when the provider answered from
+            the semantic cache, MISS or BYPASS when neither cache was used)
+        """
+        if not self.enabled or mode == "bypass" or not self.is_cacheable(temperature):
+            return await self._ask_provider(
+                llm_provider, query, model, temperature, max_tokens, CACHE_BYPASS
+            )
+
+        key = self.make_key(llm_provider.provider_name, model, query, temperature, max_tokens)
+        if mode != "refresh":
+            cached = self.get(key)
+            if cached is not None:
+                logger.debug("Response cache hit %s", key)
+                return cached, CACHE_HIT
+
+        result, status = await self._ask_provider(
+            llm_provider, query, model, temperature, max_tokens, CACHE_MISS
+        )
+        # The provider may fall back to a non zero default temperature
+        if self.is_cacheable(result.get("temperature")):
+            # The similarity belongs to this paraphrase, exact repeats are plain hits
+            self.set(key, {k: v for k, v in result.items() if k != "similarity"})
+        return result, status
+
+    @staticmethod
+    async def _ask_provider(
+        llm_provider: BaseLLM,
+        query: str,
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        status: str,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Ask the provider, reporting the status of its semantic cache unless it was bypassed"""
+        if not isinstance(llm_provider, CachedLLM):
+            result = await llm_provider.ask(
+                query=query, model=model, temperature=temperature, max_tokens=max_tokens
+            )
+            return result, status
+
+        result, semantic_status = await llm_provider.ask_cached(
+            query=query, model=model, temperature=temperature, max_tokens=max_tokens
+        )
+        if semantic_status == CACHE_SEMANTIC_HIT:
+            return result, semantic_status
+        if semantic_status == CACHE_MISS:
+            return result, CACHE_MISS
+        return result, status
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,123 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from collections import OrderedDict
+import logging
+from typing import Callable, Dict, Hashable, Optional
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def chat_model_name(llm: BaseChatModel) -> Optional[str]:
+    """Return the name of the model the chat model client calls"""
+    return getattr(llm, "model", None) or getattr(llm, "model_name", None)
+
+
+class ChatModelRegistry:
+    """
+    Process-wide registry of warm chat model clients
+
+    Clients are keyed by provider, model and generation parameters and evicted in LRU order
+    once the registry is full. Every client talking to the same upstream shares one pooled
+    async HTTP transport, so connections are reused across requests and clients. Providers
+    that take a whole HTTP client share one per upstream too, so evicting a chat model
+    never leaks an open client.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.llm_client_registry_size,
+        max_connections: int = settings.llm_http_max_connections,
+        max_keepalive_connections: int = settings.llm_http_max_keepalive_connections,
+    ):
+        self.max_size = max_size
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._clients: OrderedDict[Hashable, BaseChatModel] = OrderedDict()
+        self._transports: Dict[str, httpx.AsyncHTTPTransport] = {}
+        self._http_clients: Dict[str, httpx.AsyncClient] = {}
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._clients
+
+    def get_transport(self, upstream: str) -> httpx.AsyncHTTPTransport:
+        """Return the pooled async transport shared by every client of an upstream"""
+        transport = self._transports.get(upstream)
+        if transport is None:
+            logger.debug("Creating HTTP transport for %s", upstream)
+            transport = httpx.AsyncHTTPTransport(limits=self.limits)
+            self._transports[upstream] = transport
+        return transport
+
+    def get_http_client(self, upstream: str) -> httpx.AsyncClient:
+        """Return the async HTTP client shared by every client of an upstream"""
+        http_client = self._http_clients.get(upstream)
+        if http_client is None:
+            logger.debug("Creating HTTP client for %s", upstream)
+            http_client = httpx.AsyncClient(transport=self.get_transport(upstream))
+            self._http_clients[upstream] = http_client
+        return http_client
+
+    def get(self, key: Hashable, factory: Callable[[], BaseChatModel]) -> BaseChatModel:
+        """
+        Get a chat model client, creating it with the factory if it is not registered yet
+
+        Args:
+            key: Hashable key identifying provider, model and generation parameters
+            factory: Callable building the client when it is not in the registry
+
+        Returns:
+            The registered chat model client
+        """
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+            return client
+
+        client = factory()
+        self._clients[key] = client
+        if len(self._clients) > self.max_size:
+            evicted_key, _ = self._clients.popitem(last=False)
+            logger.debug("Evicted chat model client %s", evicted_key)
+        return client
+
+    def clear(self):
+        """Forget every registered client, keeping the shared HTTP clients and transports open"""
+        self._clients.clear()
+
+    async def aclose(self):
+        """Forget every registered client and close the shared HTTP clients and transports"""
+        self.clear()
+        http_clients = list(self._http_clients.values())
+        self._http_clients.clear()
+        for http_client in http_clients:
+            await http_client.aclose()
+        transports = list(self._transports.values())
+        self._transports.clear()
+        for transport in transports:
+            await transport.aclose()
+        logger.info("Closed %d LLM HTTP transports", len(transports))
+
+
+chat_model_registry = ChatModelRegistry()
@@ -0,0 +1,75 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from typing import Optional
+
+import httpx
+import openai
+
+
+def is_timeout(error: BaseException) -> bool:
+    """Return whether the error, or an error that caused it, is a timeout"""
+    while error is not None:
+        if isinstance(error, (TimeoutError, httpx.TimeoutException, openai.APITimeoutError)):
+            return True
+        error = error.__cause__
+    return False
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when a provider can not serve a call: refused, overloaded or failing upstream"""
+
+    status_code = 503
+
+    def __init__(self, message: str, provider: str, retry_after: int):
+        super().__init__(message)
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class OverloadedError(ProviderUnavailableError):
+    """Raised when a provider has no free slot and its wait queue is full"""
+
+    status_code = 429
+
+    def __init__(self, provider: str, model: Optional[str], retry_after: int):
+        super().__init__(
+            f"Provider {provider} is overloaded, retry after {retry_after} seconds",
+            provider,
+            retry_after,
+        )
+        self.model = model
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """Raised while the circuit breaker of an unhealthy provider is open"""
+
+    def __init__(self, provider: str, retry_after: int):
+        super().__init__(
+            f"Provider {provider} is unavailable, retry after {retry_after} seconds",
+            provider,
+            retry_after,
+        )
+
+
+class UpstreamError(ProviderUnavailableError):
+    """Raised when a provider call timed out or failed upstream, once retries are exhausted"""
+
+    def __init__(self, provider: str, error: BaseException, retry_after: int):
+        if is_timeout(error):
+            self.status_code = 504
+            message = f"Provider {provider} timed out"
+        else:
+            self.status_code = 502
+            message = f"Provider {provider} failed: {error!r}"
+        super().__init__(message, provider, retry_after)
@@ -0,0 +1,229 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import logging
+import math
+import time
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.llm.errors import OverloadedError, ProviderUnavailableError, is_timeout
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_congestion(error: BaseException) -> bool:
+    """
+    Return whether the error shows the provider is saturated: a timeout, 429 or 5xx response
+
+    Errors of the request itself, refusals that never reached the provider and unreachable
+    providers say nothing about how many calls it can take. Wrapped errors are walked.
+    """
+    while error is not None:
+        if isinstance(error, (ProviderUnavailableError, asyncio.CancelledError)):
+            return False
+        if is_timeout(error):
+            return True
+
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            status_code = getattr(getattr(error, "response", None), "status_code", None)
+        if isinstance(status_code, int) and (status_code == 429 or status_code >= 500):
+            return True
+
+        error = error.__cause__
+    return False
+
+
+class AdaptiveLimiter:
+    """
+    Adaptive concurrency limit with a bounded wait queue
+
+    The limit follows an AIMD controller: it grows by one slot per window of successful calls
+    faster than the latency threshold, and is multiplied by the backoff factor on congestion
+    errors or slow calls. Callers beyond the limit wait in a FIFO queue; once the queue is full
+    they are rejected with an OverloadedError.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: Optional[str],
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int,
+        latency_threshold: float,
+        backoff: float,
+    ):
+        self.provider = provider
+        self.model = model
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.latency_threshold = latency_threshold
+        self.backoff = backoff
+        self.in_flight = 0
+        self.average_latency: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Estimate in seconds when a slot should be free for a new caller"""
+        latency = self.average_latency or 1.0
+        return max(1, math.ceil(latency * (self.queue_depth + 1) / max(1, int(self.limit))))
+
+    def _has_free_slot(self) -> bool:
+        return self.in_flight < int(self.limit) and not self._waiters
+
+    def check(self):
+        """Raise an OverloadedError if a new caller would be rejected right now"""
+        if not self._has_free_slot() and len(self._waiters) >= self.max_queue:
+            raise OverloadedError(self.provider, self.model, self.retry_after())
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if every slot is in use"""
+        if self._has_free_slot():
+            self.in_flight += 1
+            return
+
+        self.check()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over right before the cancellation, pass it on
+                self.in_flight -= 1
+                self._wake_waiters()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: Optional[float] = None, error: bool = False):
+        """Free a slot and adapt the limit to the outcome of the call"""
+        self.in_flight -= 1
+
+        if error or (latency is not None and latency > self.latency_threshold):
+            self.limit = max(float(self.min_limit), self.limit * self.backoff)
+            logger.debug("Decreased %s/%s limit to %.2f", self.provider, self.model, self.limit)
+        elif latency is not None:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+        if latency is not None:
+            if self.average_latency is None:
+                self.average_latency = latency
+            else:
+                self.average_latency = 0.8 * self.average_latency + 0.2 * latency
+
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the duration of a single upstream call"""
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_congestion(e):
+                self.release(time.monotonic() - start, error=True)
+            else:
+                # Other failures say nothing about the load the provider can take
+                self.release()
+            raise
+        except BaseException:
+            # Cancelled calls say nothing about the health of the provider
+            self.release()
+            raise
+        else:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "average_latency": self.average_latency,
+        }
+
+
+class ProviderLimiters:
+    """Adaptive concurrency limiters, one per provider and model"""
+
+    def __init__(self, enabled: bool = settings.limiter_enabled):
+        self.enabled = enabled
+        self._limiters: Dict[Tuple[str, Optional[str]], AdaptiveLimiter] = {}
+
+    def get(self, provider: str, model: Optional[str]) -> AdaptiveLimiter:
+        """Return the limiter of the provider and model, creating it on first use"""
+        limiter = self._limiters.get((provider, model))
+        if limiter is None:
+            limiter = AdaptiveLimiter(
+                provider,
+                model,
+                initial_limit=settings.limiter_initial_limit,
+                min_limit=settings.limiter_min_limit,
+                max_limit=settings.limiter_max_limit,
+                max_queue=settings.limiter_max_queue,
+                latency_threshold=settings.limiter_latency_threshold,
+                backoff=settings.limiter_backoff,
+            )
+            self._limiters[(provider, model)] = limiter
+        return limiter
+
+    def check(self, provider: str, model: Optional[str]):
+        """Raise an OverloadedError if a call to the provider and model would be rejected now"""
+        limiter = self._limiters.get((provider, model))
+        if self.enabled and limiter is not None:
+            limiter.check()
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: Optional[str]) -> AsyncIterator[None]:
+        """Hold a slot of the provider and model limiter for the duration of an upstream call"""
+        if not self.enabled:
+            yield
+            return
+
+        async with self.get(provider, model).slot():
+            yield
+
+    def clear(self):
+        self._limiters.clear()
+
+    def stats(self):
+        """Return the current limit, in-flight calls and queue depth of every limiter"""
+        return [limiter.stats() for limiter in self._limiters.values()]
+
+
+provider_limiters = ProviderLimiters()
@@ -12,12 +12,16 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import logging
-from typing import Optional, Dict, Any
+from typing import Any, AsyncIterator, Dict, Optional
 
 from langchain_ollama import ChatOllama, OllamaEmbeddings
 
+from app.core.budget import context_window, estimate_tokens
 from app.core.config import settings
 from app.core.llm.base import BaseLLM
+from app.core.llm.clients import chat_model_registry
+from app.core.llm.errors import ProviderUnavailableError
+from app.core.llm.resilience import provider_resilience
 
 
 logger = logging.getLogger(__name__)
@@ -34,12 +38,46 @@ class OllamaLLM(BaseLLM):
     def provider_name(self) -> str:
         return "ollama"
 
+    @property
+    def default_model(self) -> Optional[str]:
+        return settings.ollama_default_model
+
     def get_embeddings_provider(self, model_name: Optional[str] = None) -> OllamaEmbeddings:
         """Return the embeddings model"""
         return OllamaEmbeddings(
             base_url=self.server_url, model=model_name or settings.ollama_default_embeddings_model
         )
 
+    def get_chat_model(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        prompt_tokens: Optional[int] = None,
+    ) -> ChatOllama:
+        """
+        Return a warm chat model sharing the pooled transport to the Ollama server
+
+        Ollama allocates the cache of the whole num_ctx window for every call, so the window is
+        sized to the prompt and output rather than to the context size of the model.
+        """
+        transport = chat_model_registry.get_transport(self.server_url)
+        num_ctx = None
+        if prompt_tokens is not None:
+            num_ctx = prompt_tokens + max_tokens + settings.token_budget_reserved_tokens
+        num_ctx = context_window(model, num_ctx)
+        return chat_model_registry.get(
+            (self.provider_name, self.server_url, model, temperature, max_tokens, num_ctx),
+            lambda: ChatOllama(
+                base_url=self.server_url,
+                model=model,
+                temperature=temperature,
+                num_predict=max_tokens,
+                num_ctx=num_ctx,
+                async_client_kwargs={"transport": transport},
+            ),
+        )
+
     async def ask(
         self,
         query: str,
@@ -55,14 +93,13 @@ class OllamaLLM(BaseLLM):
         response_max_tokens = max_tokens or settings.default_max_tokens
 
         try:
-            llm = ChatOllama(
-                base_url=self.server_url,
-                model=model_name,
-                temperature=model_temperature,
-                num_predict=response_max_tokens,
+            llm = self.get_chat_model(
+                model_name, model_temperature, response_max_tokens, estimate_tokens(query)
             )
 
-            answer = llm.invoke([("human", query)])
+            answer = await provider_resilience.call(
+                self.provider_name, lambda: llm.ainvoke([("human", query)]), model_name
+            )
             logger.info(answer)
 
             return {
@@ -72,6 +109,54 @@ class OllamaLLM(BaseLLM):
                 "temperature": model_temperature,
                 "response_max_tokens": response_max_tokens,
             }
+        except ProviderUnavailableError:
+            raise
+        except (ValueError, Exception) as e:
+            msg = "Error generating answer"
+            logger.error("%s: %s", msg, e)
+            raise ValueError(msg) from e
+
+    async def stream_ask(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Ask a question to Ollama streaming the answer"""
+
+        # Use default values if none custom provided
+        model_name = model or settings.ollama_default_model
+        model_temperature = temperature or settings.default_model_temperature
+        response_max_tokens = max_tokens or settings.default_max_tokens
+
+        try:
+            llm = self.get_chat_model(
+                model_name, model_temperature, response_max_tokens, estimate_tokens(query)
+            )
+
+            answer = None
+            async for chunk in provider_resilience.stream(
+                self.provider_name, llm.astream([("human", query)]), model_name
+            ):
+                answer = chunk if answer is None else answer + chunk
+                if chunk.content:
+                    yield {"event": "token", "data": {"content": chunk.content}}
+
+            yield {
+                "event": "metadata",
+                "data": {
+                    "model": (
+                        answer.response_metadata.get("model", model_name) if answer else model_name
+                    ),
+                    "provider": self.provider_name,
+                    "temperature": model_temperature,
+                    "response_max_tokens": response_max_tokens,
+                    "usage": dict(answer.usage_metadata or {}) if answer else {},
+                },
+            }
+        except ProviderUnavailableError:
+            raise
         except (ValueError, Exception) as e:
             msg = "Error generating answer"
             logger.error("%s: %s", msg, e)
@@ -12,12 +12,15 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import logging
-from typing import Optional, Dict, Any
+from typing import Any, AsyncIterator, Dict, Optional
 
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
 from app.core.config import settings
 from app.core.llm.base import BaseLLM
+from app.core.llm.clients import chat_model_registry
+from app.core.llm.errors import ProviderUnavailableError
+from app.core.llm.resilience import provider_resilience
 
 
 logger = logging.getLogger(__name__)
@@ -34,12 +37,39 @@ class OpenAILLM(BaseLLM):
     def provider_name(self) -> str:
         return "openai"
 
+    @property
+    def default_model(self) -> Optional[str]:
+        return settings.openai_default_model
+
     def get_embeddings_provider(self, model_name: Optional[str] = None) -> OpenAIEmbeddings:
         return OpenAIEmbeddings(
             openai_api_key=self.api_key,
             model=model_name or settings.openai_default_embeddings_model,
         )
 
+    def get_chat_model(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        prompt_tokens: Optional[int] = None,
+    ) -> ChatOpenAI:
+        """Return a warm chat model sharing the pooled HTTP client to the OpenAI API"""
+        http_client = chat_model_registry.get_http_client(self.provider_name)
+        return chat_model_registry.get(
+            (self.provider_name, model, temperature, max_tokens),
+            lambda: ChatOpenAI(
+                api_key=self.api_key,
+                temperature=temperature,
+                model_name=model,
+                max_tokens=max_tokens,
+                stream_usage=True,
+                # Retries are done by the provider resilience layer
+                max_retries=0,
+                http_async_client=http_client,
+            ),
+        )
+
     async def ask(
         self,
         query: str,
@@ -55,20 +85,63 @@ class OpenAILLM(BaseLLM):
         response_max_tokens = max_tokens or settings.default_max_tokens
 
         try:
-            llm = ChatOpenAI(
-                api_key=self.api_key,
-                temperature=model_temperature,
-                model_name=model_name,
-                max_tokens=response_max_tokens,
+            llm = self.get_chat_model(model_name, model_temperature, response_max_tokens)
+
+            answer = await provider_resilience.call(
+                self.provider_name, lambda: llm.ainvoke([("human", query)]), model_name
             )
 
             return {
-                "response": llm.invoke([("human", query)]),
+                "response": answer.content,
                 "model": model_name,
                 "provider": self.provider_name,
                 "temperature": model_temperature,
                 "response_max_tokens": response_max_tokens,
             }
+        except ProviderUnavailableError:
+            raise
+        except (ValueError, Exception) as e:
+            msg = "Error generating answer"
+            logger.error("%s: %s", msg, e)
+            raise ValueError(msg) from e
+
+    async def stream_ask(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Ask a question to OpenAI streaming the answer"""
+
+        # Use default values if none custom provided
+        model_name = model or settings.openai_default_model
+        model_temperature = temperature or settings.default_model_temperature
+        response_max_tokens = max_tokens or settings.default_max_tokens
+
+        try:
+            llm = self.get_chat_model(model_name, model_temperature, response_max_tokens)
+
+            answer = None
+            async for chunk in provider_resilience.stream(
+                self.provider_name, llm.astream([("human", query)]), model_name
+            ):
+                answer = chunk if answer is None else answer + chunk
+                if chunk.content:
+                    yield {"event": "token", "data": {"content": chunk.content}}
+
+            yield {
+                "event": "metadata",
+                "data": {
+                    "model": model_name,
+                    "provider": self.provider_name,
+                    "temperature": model_temperature,
+                    "response_max_tokens": response_max_tokens,
+                    "usage": dict(answer.usage_metadata or {}) if answer else {},
+                },
+            }
+        except ProviderUnavailableError:
+            raise
         except (ValueError, Exception) as e:
             msg = "Error generating answer"
             logger.error("%s: %s", msg, e)
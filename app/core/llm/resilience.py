@@ -0,0 +1,289 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+import math
+import random
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Optional
+from typing import TypeVar
+
+import httpx
+import openai
+
+from app.core.config import settings
+from app.core.llm.errors import CircuitOpenError, ProviderUnavailableError, UpstreamError
+from app.core.llm.errors import is_timeout
+from app.core.llm.limiter import provider_limiters
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Return whether the error is a transient upstream failure worth retrying
+
+    Timeouts, connection errors and throttling or server error responses are retryable, the
+    errors they caused are walked so wrapped upstream errors are recognized too.
+    """
+    while error is not None:
+        if isinstance(error, ProviderUnavailableError):
+            return False
+        if isinstance(
+            error, (TimeoutError, ConnectionError, httpx.TransportError, openai.APIConnectionError)
+        ):
+            return True
+
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            status_code = getattr(getattr(error, "response", None), "status_code", None)
+        if status_code in RETRYABLE_STATUS_CODES:
+            return True
+
+        error = error.__cause__
+    return False
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Return a full jitter exponential backoff delay for the retry attempt, starting at 1"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one provider
+
+    The circuit opens after failure_threshold consecutive upstream failures and calls fail fast
+    until reset_timeout elapses. A single trial call is then let through: its success closes
+    the circuit, its failure opens it again.
+    """
+
+    def __init__(self, provider: str, failure_threshold: int, reset_timeout: float):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    def retry_after(self) -> int:
+        if self.opened_at is None:
+            return 1
+        remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+        return max(1, math.ceil(remaining))
+
+    def check(self):
+        """Raise a CircuitOpenError if the circuit is open, without letting a trial call in"""
+        if self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_at < self.reset_timeout:
+            raise CircuitOpenError(self.provider, self.retry_after())
+
+    def before_call(self):
+        """Raise a CircuitOpenError if the call must not reach the provider"""
+        if self.state == CIRCUIT_OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(self.provider, self.retry_after())
+            self.state = CIRCUIT_HALF_OPEN
+
+        if self.state == CIRCUIT_HALF_OPEN:
+            if self._trial_in_flight:
+                raise CircuitOpenError(self.provider, self.retry_after())
+            self._trial_in_flight = True
+
+    def record_success(self):
+        if self.state != CIRCUIT_CLOSED:
+            logger.info("Closing circuit of provider %s", self.provider)
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == CIRCUIT_HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != CIRCUIT_OPEN:
+                logger.warning("Opening circuit of provider %s", self.provider)
+            self.state = CIRCUIT_OPEN
+            self.opened_at = time.monotonic()
+
+    def record_ignored(self):
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "state": self.state,
+            "failures": self.failures,
+            "retry_after": self.retry_after() if self.state != CIRCUIT_CLOSED else None,
+        }
+
+
+class ProviderResilience:
+    """Deadlines, retries and circuit breakers around provider calls"""
+
+    def __init__(
+        self,
+        timeout: float = settings.provider_call_timeout,
+        max_attempts: int = settings.provider_retry_attempts,
+        base_delay: float = settings.provider_retry_base_delay,
+        max_delay: float = settings.provider_retry_max_delay,
+        failure_threshold: int = settings.circuit_breaker_failure_threshold,
+        reset_timeout: float = settings.circuit_breaker_reset_timeout,
+    ):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get_breaker(self, provider: str) -> CircuitBreaker:
+        """Return the circuit breaker of the provider, creating it on first use"""
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider, self.failure_threshold, self.reset_timeout)
+            self._breakers[provider] = breaker
+        return breaker
+
+    async def call(
+        self, provider: str, call: Callable[[], Awaitable[T]], model: Optional[str] = None
+    ) -> T:
+        """
+        Run a provider call with a deadline per attempt
+
+        Every attempt holds a slot of the provider and model limiter, but not the backoff
+        between attempts. Retryable errors are retried with jittered exponential backoff up to
+        max_attempts, except timeouts: the attempt already ran for the whole deadline and
+        generating again would only add to the load of a saturated provider. Once retries are
+        exhausted an UpstreamError is raised. Other errors are raised right away.
+        """
+        attempt = 1
+        while True:
+            try:
+                async with self._attempt(provider, model):
+                    async with asyncio.timeout(self.timeout):
+                        return await call()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt >= self.max_attempts or is_timeout(e):
+                    raise UpstreamError(
+                        provider, e, self.get_breaker(provider).retry_after()
+                    ) from e
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                logger.warning(
+                    "Provider %s call failed (attempt %d), retrying in %.2fs: %r",
+                    provider,
+                    attempt,
+                    delay,
+                    e,
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def check(self, provider: str, model: Optional[str] = None):
+        """
+        Raise the ProviderUnavailableError a call to the provider and model would fail with now,
+        if its circuit is open or its limiter is overloaded
+
+        Lets streamed responses be refused with a proper status before they start.
+        """
+        self.get_breaker(provider).check()
+        provider_limiters.check(provider, model)
+
+    @asynccontextmanager
+    async def guard(self, provider: str, model: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        Run a provider call in a slot of the provider and model limiter, through the circuit
+        breaker of the provider, raising an UpstreamError if it fails upstream
+
+        Used for streamed calls, which can not be retried once tokens were sent, and calls with
+        a deadline of their own.
+        """
+        try:
+            async with self._attempt(provider, model):
+                yield
+        except Exception as e:
+            if is_retryable(e):
+                raise UpstreamError(provider, e, self.get_breaker(provider).retry_after()) from e
+            raise
+
+    async def stream(
+        self, provider: str, chunks: AsyncIterable[T], model: Optional[str] = None
+    ) -> AsyncIterator[T]:
+        """
+        Stream the chunks of a provider call through guard, waiting at most the call deadline
+        for every chunk
+
+        The deadline bounds how long the upstream may stall, not how long the whole stream or
+        its consumer takes. A stalled stream raises an UpstreamError, like a timed out call.
+        """
+        iterator = aiter(chunks)
+        try:
+            async with self.guard(provider, model):
+                while True:
+                    try:
+                        async with asyncio.timeout(self.timeout):
+                            chunk = await anext(iterator)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+        finally:
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    @asynccontextmanager
+    async def _attempt(self, provider: str, model: Optional[str]) -> AsyncIterator[None]:
+        # Checked first, so calls to an open circuit do not wait in the limiter queue
+        breaker = self.get_breaker(provider)
+        breaker.before_call()
+        try:
+            async with provider_limiters.slot(provider, model):
+                yield
+        except Exception as e:
+            if is_retryable(e):
+                breaker.record_failure()
+            else:
+                # Errors of the request itself, or an overloaded limiter, say nothing about the
+                # health of the provider
+                breaker.record_ignored()
+            raise
+        except BaseException:
+            breaker.record_ignored()
+            raise
+        else:
+            breaker.record_success()
+
+    def clear(self):
+        self._breakers.clear()
+
+    def stats(self):
+        """Return the state of the circuit breaker of every provider"""
+        return [breaker.stats() for breaker in self._breakers.values()]
+
+
+provider_resilience = ProviderResilience()
@@ -0,0 +1,279 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.llm.base import BaseLLM
+from app.core.llm.cache import CACHE_BYPASS, CACHE_MISS, CACHE_SEMANTIC_HIT, CachedLLM
+from app.core.llm.cache import ResponseCache
+from app.core.llm.resilience import provider_resilience
+
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    Fixed size index of unit vectors searched by cosine similarity
+
+    Vectors are stored in one preallocated matrix so a search is a single matrix product.
+    Entries are partitioned by namespace and expire; when the index is full the least recently
+    used entry is replaced.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.clear()
+
+    def clear(self):
+        self._vectors: Optional[np.ndarray] = None
+        self._namespaces = np.full(self.max_size, -1, dtype=np.int64)
+        self._expires = np.zeros(self.max_size)
+        self._last_used = np.zeros(self.max_size)
+        self._values: List[Optional[Dict[str, Any]]] = [None] * self.max_size
+        self._namespace_ids: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._namespaces >= 0))
+
+    @staticmethod
+    def normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(
+        self, namespace: Hashable, vector: np.ndarray, now: float, threshold: float = -1.0
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Return the most similar live value of the namespace and its similarity, if it is at
+        least the threshold
+
+        Only values returned count as used, near misses do not keep an entry from eviction.
+        """
+        namespace_id = self._namespace_ids.get(namespace)
+        if namespace_id is None or self._vectors is None or len(vector) != self._vectors.shape[1]:
+            return None
+
+        live = (self._namespaces == namespace_id) & (self._expires > now)
+        if not live.any():
+            return None
+
+        similarities = self._vectors @ vector
+        similarities[~live] = -np.inf
+        index = int(np.argmax(similarities))
+        if similarities[index] < threshold:
+            return None
+        self._last_used[index] = now
+        return self._values[index], float(similarities[index])
+
+    def add(
+        self,
+        namespace: Hashable,
+        vector: np.ndarray,
+        value: Dict[str, Any],
+        expires_at: float,
+        now: float,
+    ):
+        """Store a value, replacing an expired or the least recently used entry when full"""
+        if self._vectors is None or len(vector) != self._vectors.shape[1]:
+            # First vector, or the embeddings model changed
+            self.clear()
+            self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+
+        namespace_id = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+        free = np.flatnonzero((self._namespaces < 0) | (self._expires <= now))
+        index = int(free[0]) if len(free) else int(np.argmin(self._last_used))
+
+        self._vectors[index] = vector
+        self._namespaces[index] = namespace_id
+        self._expires[index] = expires_at
+        self._last_used[index] = now
+        self._values[index] = dict(value)
+
+
+class SemanticCache:
+    """
+    Cache of LLM answers looked up by the meaning of the question
+
+    Questions are embedded with the embeddings model of their provider and an earlier answer
+    of the same provider, model and max tokens is reused when the cosine similarity of the
+    questions is at least the threshold. Only deterministic answers (temperature 0) are cached.
+
+    Embedding calls hold a slot of the limiter of the embeddings model and go through the
+    circuit breaker of the provider, with a short deadline: a slow lookup is skipped rather
+    than delaying the question.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.semantic_cache_enabled,
+        threshold: float = settings.semantic_cache_threshold,
+        max_size: int = settings.semantic_cache_size,
+        ttl: float = settings.semantic_cache_ttl,
+        embed_timeout: float = settings.semantic_cache_embed_timeout,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.embed_timeout = embed_timeout
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._embeddings: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return sum(len(index) for index in self._indexes.values())
+
+    def _index(self, embeddings_provider: str) -> VectorIndex:
+        index = self._indexes.get(embeddings_provider)
+        if index is None:
+            index = VectorIndex(self.max_size)
+            self._indexes[embeddings_provider] = index
+        return index
+
+    async def embed(self, embeddings_llm: BaseLLM, query: str) -> np.ndarray:
+        """Return the normalized embedding of the whitespace normalized query"""
+        provider = embeddings_llm.provider_name
+        embeddings = self._embeddings.get(provider)
+        if embeddings is None:
+            embeddings = embeddings_llm.get_embeddings_provider()
+            self._embeddings[provider] = embeddings
+        async with provider_resilience.guard(provider, getattr(embeddings, "model", None)):
+            async with asyncio.timeout(self.embed_timeout):
+                vector = await embeddings.aembed_query(" ".join(query.split()))
+        return VectorIndex.normalize(vector)
+
+    def clear(self):
+        """Remove every cached answer"""
+        for index in self._indexes.values():
+            index.clear()
+
+    async def aclose(self):
+        """Release the cached answers and embeddings clients on shutdown"""
+        self._indexes.clear()
+        self._embeddings.clear()
+
+    async def ask(
+        self,
+        llm_provider: Any,
+        embeddings_llm: BaseLLM,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        mode: str = "use",
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Ask a question through the cache
+
+        Args:
+            llm_provider: The provider answering cache misses
+            embeddings_llm: The provider whose embeddings model embeds the question
+            query: The question to ask
+            model: Specific model to use
+            temperature: Temperature for generation
+            max_tokens: Maximum tokens to generate
+            mode: "use" to read and fill the cache, "refresh" to skip the lookup but store the
+                new answer, or "bypass" to ignore the cache entirely
+
+        Returns:
+            The answer, with the similarity of the cached question on hits, and the cache status
+            (HIT-SEMANTIC, MISS or BYPASS)
+        """
+        if not self.enabled or mode == "bypass" or not ResponseCache.is_cacheable(temperature):
+            result = await llm_provider.ask(
+                query=query, model=model, temperature=temperature, max_tokens=max_tokens
+            )
+            return result, CACHE_BYPASS
+
+        namespace = (llm_provider.provider_name, model, max_tokens)
+        index = self._index(embeddings_llm.provider_name)
+        try:
+            vector = await self.embed(embeddings_llm, query)
+        except Exception as e:
+            # The cache must never fail a question the provider can answer
+            logger.warning("Error embedding query, skipping the semantic cache: %s", e)
+            vector = None
+
+        if vector is not None and mode != "refresh":
+            found = index.search(namespace, vector, time.monotonic(), self.threshold)
+            if found is not None:
+                cached, similarity = found
+                logger.debug("Semantic cache hit with similarity %.3f", similarity)
+                return {**cached, "similarity": similarity}, CACHE_SEMANTIC_HIT
+
+        result = await llm_provider.ask(
+            query=query, model=model, temperature=temperature, max_tokens=max_tokens
+        )
+        # The provider may fall back to a non zero default temperature
+        if vector is not None and ResponseCache.is_cacheable(result.get("temperature")):
+            now = time.monotonic()
+            index.add(namespace, vector, result, now + self.ttl, now)
+        return result, CACHE_MISS
+
+    def wrap(self, llm_provider: Any, embeddings_llm: BaseLLM, mode: str) -> "SemanticCachedLLM":
+        """Return the provider answering through the cache"""
+        return SemanticCachedLLM(self, llm_provider, embeddings_llm, mode)
+
+
+class SemanticCachedLLM(CachedLLM):
+    """LLM provider answering through the semantic cache, usable wherever a provider's ask is"""
+
+    def __init__(self, cache: SemanticCache, llm_provider: Any, embeddings_llm: BaseLLM, mode: str):
+        self.cache = cache
+        self.llm_provider = llm_provider
+        self.embeddings_llm = embeddings_llm
+        self.mode = mode
+
+    @property
+    def provider_name(self) -> str:
+        return self.llm_provider.provider_name
+
+    async def ask(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        result, _ = await self.ask_cached(
+            query=query, model=model, temperature=temperature, max_tokens=max_tokens
+        )
+        return result
+
+    async def ask_cached(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Ask a question, returning the answer and the semantic cache status"""
+        return await self.cache.ask(
+            self.llm_provider,
+            self.embeddings_llm,
+            query=query,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            mode=self.mode,
+        )
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,171 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import logging
+from typing import Awaitable, Callable, Dict, List, Type
+
+from app.core.config import settings
+from app.core.llm.base import BaseLLM
+from app.core.llm.cache import response_cache
+from app.core.llm.clients import chat_model_registry
+from app.core.llm.ollama import OllamaLLM
+from app.core.llm.openai import OpenAILLM
+from app.core.llm.semantic_cache import semantic_cache
+from app.core.summarizer.base import BaseSummarizer
+from app.core.summarizer.extraction import pdf_extraction_pool
+from app.core.summarizer.jobs import summary_jobs
+from app.core.summarizer.ollama import OllamaSummarizer
+from app.core.summarizer.openai import OpenAISummarizer
+from app.core.summarizer.tree import summary_node_cache
+
+
+logger = logging.getLogger(__name__)
+
+Hook = Callable[[], Awaitable[None]]
+
+
+class ProviderFactory:
+    """
+    Builds the LLM and summarizer providers once and owns their lifecycle
+
+    Providers are created on startup (or lazily on first use) and cached for the lifetime of the
+    process. Summarizers reuse the LLM provider of the same name so both sides share clients.
+    Other subsystems register startup and shutdown hooks here so pools, caches and warm-up
+    work have a single owner.
+    """
+
+    llm_provider_classes: Dict[str, Type[BaseLLM]] = {
+        "ollama": OllamaLLM,
+        "openai": OpenAILLM,
+    }
+
+    summary_provider_classes: Dict[str, Type[BaseSummarizer]] = {
+        "ollama": OllamaSummarizer,
+        "openai": OpenAISummarizer,
+    }
+
+    def __init__(self):
+        self.available_providers: List[str] = []
+        self._llm_providers: Dict[str, BaseLLM] = {}
+        self._summary_providers: Dict[str, BaseSummarizer] = {}
+        self._startup_hooks: List[Hook] = []
+        self._shutdown_hooks: List[Hook] = []
+        self._built = False
+
+    def add_startup_hook(self, hook: Hook):
+        """Register a coroutine function to run when the application starts"""
+        self._startup_hooks.append(hook)
+
+    def add_shutdown_hook(self, hook: Hook):
+        """Register a coroutine function to run when the application shuts down"""
+        self._shutdown_hooks.append(hook)
+
+    def build(self):
+        """Create one instance of every available provider"""
+        self.available_providers = settings.available_ai_providers
+        self._llm_providers = {
+            name: provider_class()
+            for name, provider_class in self.llm_provider_classes.items()
+            if name in self.available_providers
+        }
+        self._summary_providers = {
+            name: provider_class(llm=self._llm_providers[name])
+            for name, provider_class in self.summary_provider_classes.items()
+            if name in self._llm_providers
+        }
+        self._built = True
+        logger.info("Providers ready: %s", ", ".join(self._llm_providers))
+
+    async def startup(self):
+        """Build the providers and run the startup hooks"""
+        self.build()
+        for hook in self._startup_hooks:
+            await hook()
+
+    async def shutdown(self):
+        """Run the shutdown hooks in reverse registration order and drop the providers"""
+        for hook in reversed(self._shutdown_hooks):
+            try:
+                await hook()
+            except Exception as e:
+                logger.error("Error running shutdown hook %s: %s", hook, e)
+        self._llm_providers = {}
+        self._summary_providers = {}
+        self._built = False
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def _get_provider(self, providers: Dict, provider: str):
+        if provider not in self.available_providers:
+            raise ValueError(f"Provider {provider} not available or not configured")
+
+        if provider not in providers:
+            raise ValueError(f"Provider {provider} not supported")
+
+        return providers[provider]
+
+    def get_llm_provider(self, provider: str) -> BaseLLM:
+        """
+        Get an LLM provider instance by name
+
+        Args:
+            provider: The name of the provider
+
+        Returns:
+            The shared instance of the LLM provider
+
+        Raises:
+            ValueError: If the provider is not available or not supported
+        """
+        self._ensure_built()
+        return self._get_provider(self._llm_providers, provider)
+
+    def get_summary_provider(self, provider: str) -> BaseSummarizer:
+        """
+        Get a Summary provider instance by name
+
+        Args:
+            provider: The name of the provider
+
+        Returns:
+            The shared instance of the Summary provider
+
+        Raises:
+            ValueError: If the provider is not available or not supported
+        """
+        self._ensure_built()
+        return self._get_provider(self._summary_providers, provider)
+
+
+provider_factory = ProviderFactory()
+provider_factory.add_shutdown_hook(chat_model_registry.aclose)
+provider_factory.add_shutdown_hook(response_cache.aclose)
+provider_factory.add_shutdown_hook(semantic_cache.aclose)
+# Saved after the summary jobs stopped, keeping the nodes they generated
+provider_factory.add_startup_hook(summary_node_cache.start)
+provider_factory.add_shutdown_hook(summary_node_cache.aclose)
+provider_factory.add_shutdown_hook(summary_jobs.aclose)
+provider_factory.add_startup_hook(pdf_extraction_pool.start)
+provider_factory.add_shutdown_hook(pdf_extraction_pool.aclose)
+
+
+def get_llm_provider(provider: str) -> BaseLLM:
+    """Get the shared LLM provider instance by name"""
+    return provider_factory.get_llm_provider(provider)
+
+
+def get_summary_provider(provider: str) -> BaseSummarizer:
+    """Get the shared Summary provider instance by name"""
+    return provider_factory.get_summary_provider(provider)
@@ -0,0 +1,220 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from collections import deque
+import logging
+import math
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.llm.base import BaseLLM
+from app.core.providers import get_llm_provider
+
+
+logger = logging.getLogger(__name__)
+
+ROUTING_OFF = "off"
+ROUTING_FAILOVER = "failover"
+ROUTING_HEDGE = "hedge"
+
+Route = Tuple[BaseLLM, Optional[str]]
+
+
+class LatencyTracker:
+    """Recent answer latencies of a provider and model"""
+
+    def __init__(self, window: int):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class LLMRouter:
+    """
+    Route questions across the configured providers
+
+    In failover mode a failed or timed out provider is replaced by the next route of
+    LLM_ROUTING_FALLBACKS. In hedge mode the next route is also started when the current one
+    takes longer than its recent p95 latency; the first answer wins and the others are
+    cancelled.
+    """
+
+    def __init__(
+        self,
+        fallbacks: List[str] = settings.llm_routing_fallbacks,
+        hedging_quantile: float = settings.llm_hedging_quantile,
+        hedging_min_delay: float = settings.llm_hedging_min_delay,
+        hedging_min_samples: int = settings.llm_hedging_min_samples,
+        hedging_window: int = settings.llm_hedging_window,
+    ):
+        self.fallbacks = fallbacks
+        self.hedging_quantile = hedging_quantile
+        self.hedging_min_delay = hedging_min_delay
+        self.hedging_min_samples = hedging_min_samples
+        self.hedging_window = hedging_window
+        self._latencies: Dict[Tuple[str, Optional[str]], LatencyTracker] = {}
+
+    def routes(self, llm_provider: BaseLLM, model: Optional[str]) -> List[Route]:
+        """Return the requested provider and model followed by the available fallbacks"""
+        routes = [(llm_provider, model)]
+        for fallback in self.fallbacks:
+            provider, _, fallback_model = fallback.partition(":")
+            if provider == llm_provider.provider_name:
+                continue
+            try:
+                fallback_provider = get_llm_provider(provider)
+            except ValueError:
+                # Not available, e.g. without OpenAI credentials
+                continue
+            routes.append((fallback_provider, fallback_model or None))
+        return routes
+
+    def _tracker(self, llm_provider: BaseLLM, model: Optional[str]) -> LatencyTracker:
+        key = (llm_provider.provider_name, model)
+        tracker = self._latencies.get(key)
+        if tracker is None:
+            tracker = LatencyTracker(self.hedging_window)
+            self._latencies[key] = tracker
+        return tracker
+
+    def hedging_delay(self, llm_provider: BaseLLM, model: Optional[str]) -> float:
+        """Return how long to wait for the route before hedging it with the next one"""
+        tracker = self._tracker(llm_provider, model)
+        if len(tracker.samples) < self.hedging_min_samples:
+            return self.hedging_min_delay
+        return max(self.hedging_min_delay, tracker.quantile(self.hedging_quantile))
+
+    async def _ask(self, route: Route, **kwargs) -> Dict[str, Any]:
+        llm_provider, model = route
+        start = time.monotonic()
+        result = await llm_provider.ask(model=model, **kwargs)
+        self._tracker(llm_provider, model).record(time.monotonic() - start)
+        return result
+
+    async def ask(
+        self,
+        llm_provider: BaseLLM,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        mode: str = ROUTING_FAILOVER,
+    ) -> Dict[str, Any]:
+        """Ask a question through the routes of the provider, raising the last error if all fail"""
+        routes = self.routes(llm_provider, model)
+        kwargs = {"query": query, "temperature": temperature, "max_tokens": max_tokens}
+
+        if mode == ROUTING_HEDGE:
+            return await self._ask_hedged(routes, kwargs)
+
+        for index, route in enumerate(routes):
+            try:
+                return await self._ask(route, **kwargs)
+            except Exception as e:
+                if index == len(routes) - 1:
+                    raise
+                logger.warning(
+                    "Provider %s failed, failing over to %s: %s",
+                    route[0].provider_name,
+                    routes[index + 1][0].provider_name,
+                    e,
+                )
+
+    async def _ask_hedged(self, routes: List[Route], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        remaining = deque(routes)
+        pending: Dict[asyncio.Task, Route] = {}
+
+        def start_next():
+            route = remaining.popleft()
+            pending[asyncio.create_task(self._ask(route, **kwargs))] = route
+
+        start_next()
+        try:
+            while True:
+                timeout = None
+                if remaining:
+                    # Hedge once the latest started route is slower than usual
+                    timeout = self.hedging_delay(*list(pending.values())[-1])
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    logger.info("Hedging with provider %s", remaining[0][0].provider_name)
+                    start_next()
+                    continue
+
+                error = None
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    logger.warning("Provider %s failed: %s", route[0].provider_name, error)
+
+                if not pending:
+                    if not remaining:
+                        raise error
+                    start_next()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class RoutedLLM:
+    """LLM provider answering through the router, usable wherever a provider's ask is"""
+
+    def __init__(self, router: LLMRouter, llm_provider: BaseLLM, mode: str):
+        self.router = router
+        self.llm_provider = llm_provider
+        self.mode = mode
+
+    @property
+    def provider_name(self) -> str:
+        # Routed answers may come from another provider, keep them apart in the response cache
+        return f"{self.llm_provider.provider_name}:{self.mode}"
+
+    async def ask(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return await self.router.ask(
+            self.llm_provider,
+            query=query,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            mode=self.mode,
+        )
+
+
+llm_router = LLMRouter()
+
+
+def route_llm_provider(llm_provider: BaseLLM, mode: str):
+    """Return the provider itself or, unless routing is off, the provider behind the router"""
+    if mode == ROUTING_OFF:
+        return llm_provider
+    return RoutedLLM(llm_router, llm_provider, mode)
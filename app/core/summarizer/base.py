@@ -12,23 +12,44 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 from abc import ABC, abstractmethod
+import asyncio
+from functools import partial
 import logging
-import tempfile
-from typing import Optional, Dict, Any
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
 
+from app.core.budget import STRATEGY_CHUNKED, STRATEGY_EXTRACTIVE, STRATEGY_MAP_REDUCE
+from app.core.budget import STRATEGY_NONE, STRATEGY_TREE
+from app.core.budget import STRATEGY_TRUNCATE, TokenBudget, documents_tokens
+from app.core.budget import extract_documents, split_documents, truncate_documents
 from app.core.config import settings
-from app.core.summarizer.summary_types import get_summary_type_details
+from app.core.llm.clients import chat_model_name
+from app.core.llm.errors import ProviderUnavailableError
+from app.core.llm.resilience import provider_resilience
+from app.core.summarizer.chunking import chunk_documents
+from app.core.summarizer.extraction import pdf_extraction_pool
+from app.core.summarizer.summary_types import NODE_SUMMARY_PROMPT, get_summary_type_details
+from app.core.summarizer.tree import group_nodes, leaf_key, model_identity, node_key
+from app.core.summarizer.tree import summary_node_cache
 
 
 logger = logging.getLogger(__name__)
 
 
+def phase_timings(*timings: Dict[str, float], **phases: float) -> Dict[str, float]:
+    """Merge the seconds spent in every phase, rounded to milliseconds"""
+    merged = {}
+    for phase_seconds in (*timings, phases):
+        merged.update(phase_seconds)
+    return {phase: round(seconds, 3) for phase, seconds in merged.items()}
+
+
 class BaseSummarizer(ABC):
     """Base class for summarizer providers"""
 
@@ -46,6 +67,8 @@ class BaseSummarizer(ABC):
         model: Optional[str] = None,
         temperature: Optional[float] = settings.default_model_temperature,
         max_length: int = settings.default_max_tokens,
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
     ) -> Dict[str, Any]:
         """
         Summarize a text
@@ -56,6 +79,8 @@ class BaseSummarizer(ABC):
             model: Specific model to use
             temperature: Temperature for generation
             max_length: Maximum length of the summary
+            strategy: How to fit content exceeding the model context, the configured one if None
+            compression_ratio: Share of the tokens to keep when pre-compressing the content
 
         Returns:
             Dictionary containing the summary and metadata
@@ -71,6 +96,8 @@ class BaseSummarizer(ABC):
         model: Optional[str] = None,
         temperature: Optional[float] = settings.default_model_temperature,
         max_length: int = settings.default_max_tokens,
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
     ) -> Dict[str, Any]:
         """
         Summarize a PDF document
@@ -82,53 +109,578 @@ class BaseSummarizer(ABC):
             model: Specific model to use
             temperature: Temperature for generation
             max_length: Maximum length of the summary
+            strategy: How to fit content exceeding the model context, the configured one if None
+            compression_ratio: Share of the tokens to keep when pre-compressing the content
 
         Returns:
             Dictionary containing the summary and metadata
         """
         pass
 
-    async def generate_text_summary(self, summary_type: str, llm: BaseChatModel, text: str) -> str:
+    @abstractmethod
+    def stream_summarize_text(
+        self,
+        text: str,
+        summary_type: Optional[str] = settings.default_summary_type,
+        model: Optional[str] = None,
+        temperature: Optional[float] = settings.default_model_temperature,
+        max_length: int = settings.default_max_tokens,
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Summarize a text streaming the summary as it is generated
+
+        Args:
+            text: The text to summarize
+            summary_type: They type of summary to generate
+            model: Specific model to use
+            temperature: Temperature for generation
+            max_length: Maximum length of the summary
+            strategy: How to fit content exceeding the model context, the configured one if None
+            compression_ratio: Share of the tokens to keep when pre-compressing the content
+
+        Yields:
+            "progress", "token" and a final "summary" event with the summary and metadata
+        """
+        pass
+
+    @abstractmethod
+    def stream_summarize_pdf(
+        self,
+        file_content: bytes,
+        file_name: str,
+        summary_type: Optional[str] = settings.default_summary_type,
+        model: Optional[str] = None,
+        temperature: Optional[float] = settings.default_model_temperature,
+        max_length: int = settings.default_max_tokens,
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Summarize a PDF document streaming the summary as it is generated
+
+        Args:
+            file_content: The binary content of the PDF file
+            file_name: Name of the original file
+            summary_type: They type of summary to generate
+            model: Specific model to use
+            temperature: Temperature for generation
+            max_length: Maximum length of the summary
+            strategy: How to fit content exceeding the model context, the configured one if None
+            compression_ratio: Share of the tokens to keep when pre-compressing the content
+
+        Yields:
+            "progress", "token" and a final "summary" event with the summary and metadata
+        """
+        pass
+
+    def get_summary_chain(self, summary_type: str, llm: BaseChatModel) -> Runnable:
+        """Return the StuffDocumentsChain generating the summary type requested"""
+        summary_type_details = get_summary_type_details(summary_type)
+        prompt_template = summary_type_details.get("prompt")
+        prompt = PromptTemplate.from_template(prompt_template)
+        return create_stuff_documents_chain(llm, prompt)
+
+    def get_node_chain(self, llm: BaseChatModel) -> Runnable:
+        """Return the StuffDocumentsChain summarizing the nodes of summary trees"""
+        prompt = PromptTemplate.from_template(NODE_SUMMARY_PROMPT)
+        return create_stuff_documents_chain(llm, prompt)
+
+    async def load_pdf_documents(
+        self, file_content: bytes, file_name: Optional[str] = None
+    ) -> List[Document]:
+        """
+        Extract one document per page of the PDF file
+
+        The PDF is parsed straight from its bytes, without writing it to disk, producing the same
+        documents as PyPDFLoader. Parsing runs in the PDF extraction process pool to keep the
+        event loop responsive.
+        """
+        return await pdf_extraction_pool.extract(file_content, file_name)
+
+    async def _summarize_concurrently(
+        self, calls: List[Callable[[], Awaitable[str]]], summaries: List[str]
+    ) -> AsyncIterator[int]:
+        """
+        Run the summary calls concurrently, yielding how many finished after every one
+
+        The summaries are appended in the order of the calls once all of them finished. When one
+        fails, or the caller stops iterating, the calls still running are cancelled.
+        """
+        tasks = [asyncio.ensure_future(call()) for call in calls]
         try:
-            # Define prompt
-            summary_type_details = get_summary_type_details(summary_type)
-            prompt_template = summary_type_details.get("prompt")
-            prompt = PromptTemplate.from_template(prompt_template)
+            for finished, task in enumerate(asyncio.as_completed(tasks), start=1):
+                await task
+                yield finished
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        summaries.extend(task.result() for task in tasks)
 
-            # Define StuffDocumentsChain
-            stuff_chain = create_stuff_documents_chain(llm, prompt)
+    async def map_reduce_events(
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        docs: List[Document],
+        max_tokens: int,
+        concurrency: int,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Summarize the documents in chunks of max_tokens, then reduce the chunk summaries
 
+        At most concurrency chunks of the request are summarized at a time, and every call also
+        takes a slot of the provider and model limiter, so concurrent requests together stay
+        within the provider limit. While the summaries do not fit in
+        max_tokens they are grouped and summarized again, for up to TOKEN_BUDGET_MAX_ROUNDS
+        rounds. Summaries are cached by content and summary type in the summary node cache, so
+        retries and repeated requests of the same content reuse the chunks already summarized.
+        Yields a "progress" event per summarized chunk and ends with a "reduced" event holding
+        the summaries, the number of chunks, how many chunk summaries were reused and the
+        seconds spent mapping and reducing.
+        """
+        stuff_chain = self.get_summary_chain(summary_type, llm)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        model = chat_model_name(llm)
+        # Unlike tree nodes, chunk summaries are prompted for the summary type
+        identity = [*model_identity(self.provider_name, llm), summary_type]
+        reused = 0
+
+        async def summarize(group: List[Document]) -> str:
+            nonlocal reused
+            key = leaf_key(identity, group)
+            summary = summary_node_cache.get(key)
+            if summary is not None:
+                reused += 1
+                return summary
+            async with semaphore:
+                summary = await provider_resilience.call(
+                    self.provider_name, lambda: stuff_chain.ainvoke({"context": group}), model
+                )
+            summary_node_cache.set(key, summary)
+            return summary
+
+        chunks = 0
+        chunks_reused = 0
+        timings = {"map": 0.0}
+        for round_number in range(settings.token_budget_max_rounds):
+            phase = "map" if round_number == 0 else "reduce"
+            started = time.perf_counter()
+            groups = split_documents(docs, max_tokens)
+            chunks = chunks or len(groups)
+            summaries = []
+            calls = [partial(summarize, group) for group in groups]
+            async for summarized in self._summarize_concurrently(calls, summaries):
+                progress = {"chunks": len(groups), "chunks_summarized": summarized}
+                if round_number == 0:
+                    progress = {"phase": "summarizing_chunks", **progress}
+                else:
+                    progress = {"phase": "reducing", "round": round_number, **progress}
+                yield {"event": "progress", "data": progress}
+            docs = [Document(page_content=summary) for summary in summaries]
+            timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+            chunks_reused = chunks_reused if round_number else reused
+            if documents_tokens(docs) <= max_tokens:
+                break
+
+        yield {
+            "event": "reduced",
+            "data": {
+                "documents": docs,
+                "chunks": chunks,
+                "timings": timings,
+                "reuse": {"chunks_reused": chunks_reused},
+            },
+        }
+
+    async def tree_reduce_events(
+        self,
+        llm: BaseChatModel,
+        docs: List[Document],
+        chunk_tokens: int,
+        max_tokens: int,
+        fan_in: int,
+        concurrency: int,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Summarize the documents as a tree: chunks, then sections of chunks, up to the document
+
+        Leaves summarize content defined chunks of up to chunk_tokens and every upper tier
+        summarizes groups of about fan_in nodes, until the top tier fits in max_tokens. Nodes are
+        summarized with a prompt independent of the summary type and cached by content, so
+        retries, other summary types and revisions of the same document reuse every node whose
+        content did not change. Like chunks of map-reduce, at most concurrency nodes of the
+        request are summarized at a time, each in a slot of the provider and model limiter.
+        Yields a "progress" event per node and ends with a "reduced"
+        event holding the top tier summaries, the number of chunks and nodes, how many of them
+        were reused and the seconds spent on the leaves and the upper tiers.
+        """
+        node_chain = self.get_node_chain(llm)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        model = chat_model_name(llm)
+        identity = model_identity(self.provider_name, llm)
+        reused = 0
+
+        async def summarize(key: str, group: List[Document]) -> str:
+            nonlocal reused
+            summary = summary_node_cache.get(key)
+            if summary is not None:
+                reused += 1
+                return summary
+            async with semaphore:
+                summary = await provider_resilience.call(
+                    self.provider_name, lambda: node_chain.ainvoke({"context": group}), model
+                )
+            summary_node_cache.set(key, summary)
+            return summary
+
+        groups = [[chunk] for chunk in chunk_documents(docs, chunk_tokens)]
+        keys = [leaf_key(identity, group) for group in groups]
+        chunks = len(groups)
+        chunks_reused = 0
+        nodes_count = 0
+        timings = {}
+        tier = 0
+        while True:
+            started = time.perf_counter()
+            summaries = []
+            calls = [partial(summarize, key, group) for key, group in zip(keys, groups)]
+            async for summarized in self._summarize_concurrently(calls, summaries):
+                yield {
+                    "event": "progress",
+                    "data": {
+                        "phase": "summarizing_tree",
+                        "tier": tier,
+                        "nodes": len(groups),
+                        "nodes_summarized": summarized,
+                        "nodes_reused": reused,
+                    },
+                }
+            phase = "map" if tier == 0 else "reduce"
+            timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+            chunks_reused = chunks_reused if tier else reused
+            nodes_count += len(groups)
+
+            nodes = [Document(page_content=summary) for summary in summaries]
+            if documents_tokens(nodes) <= max_tokens:
+                break
+            indexes = group_nodes(keys, summaries, max(2, fan_in), chunk_tokens)
+            if len(indexes) == len(nodes):
+                # Every summary fills a whole chunk, another tier would not shorten them
+                break
+            groups = [[nodes[index] for index in group] for group in indexes]
+            keys = [node_key(identity, [keys[index] for index in group]) for group in indexes]
+            tier += 1
+
+        yield {
+            "event": "reduced",
+            "data": {
+                "documents": nodes,
+                "chunks": chunks,
+                "timings": timings,
+                "reuse": {
+                    "chunks_reused": chunks_reused,
+                    "nodes": nodes_count,
+                    "nodes_reused": reused,
+                },
+            },
+        }
+
+    async def fit_documents_events(
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        docs: List[Document],
+        budget: Optional[TokenBudget],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Fit the documents in the token budget of the summary prompt
+
+        When the budget has a compression ratio, the documents are first reduced to their most
+        central sentences. Documents that do not fit are then truncated, pre-compressed keeping
+        their most representative sentences, or summarized in chunks whose summaries become the
+        documents to summarize. The map_reduce strategy summarizes the chunks concurrently, the
+        chunked one one at a time, and the tree one builds a tree of cached summaries.
+
+        Yields a "progress" event per summarized chunk and ends with a "fitted" event holding the
+        documents to prompt with, the strategy used, the number of chunks, the seconds spent in
+        every fitting phase, the tokens before and after compression, if any, and, for chunked
+        strategies, how many chunk summaries and tree nodes were reused.
+        """
+        strategy = STRATEGY_NONE
+        timings = {}
+        compression = None
+        if budget is not None:
+            max_tokens = budget.input_tokens(get_summary_type_details(summary_type)["prompt"])
+            tokens = documents_tokens(docs)
+            target = budget.compression_tokens(tokens)
+            if target is not None:
+                started = time.perf_counter()
+                docs = extract_documents(docs, target)
+                timings["compression"] = time.perf_counter() - started
+                compressed = documents_tokens(docs)
+                logger.info("Compressed %d tokens to %d tokens", tokens, compressed)
+                compression = {"input_tokens": tokens, "compressed_tokens": compressed}
+                tokens = compressed
+            strategy = budget.strategy(tokens, max_tokens)
+
+        if strategy != STRATEGY_NONE:
+            logger.info(
+                "Fitting %d tokens in a budget of %d tokens using %s", tokens, max_tokens, strategy
+            )
+
+        chunks = 0
+        reuse = None
+        started = time.perf_counter()
+        if strategy == STRATEGY_TRUNCATE:
+            docs = truncate_documents(docs, max_tokens)
+            timings["fit"] = time.perf_counter() - started
+        elif strategy == STRATEGY_EXTRACTIVE:
+            docs = truncate_documents(extract_documents(docs, max_tokens), max_tokens)
+            timings["fit"] = time.perf_counter() - started
+        elif strategy in (STRATEGY_CHUNKED, STRATEGY_MAP_REDUCE):
+            concurrency = (
+                settings.token_budget_map_concurrency if strategy == STRATEGY_MAP_REDUCE else 1
+            )
+            async for event in self.map_reduce_events(
+                summary_type, llm, docs, max_tokens, concurrency
+            ):
+                if event["event"] == "reduced":
+                    docs, chunks = event["data"]["documents"], event["data"]["chunks"]
+                    timings.update(event["data"]["timings"])
+                    reuse = event["data"]["reuse"]
+                else:
+                    yield event
+            docs = truncate_documents(docs, max_tokens)
+        elif strategy == STRATEGY_TREE:
+            async for event in self.tree_reduce_events(
+                llm,
+                docs,
+                budget.input_tokens(NODE_SUMMARY_PROMPT),
+                max_tokens,
+                settings.summary_tree_fan_in,
+                settings.token_budget_map_concurrency,
+            ):
+                if event["event"] == "reduced":
+                    docs, chunks = event["data"]["documents"], event["data"]["chunks"]
+                    timings.update(event["data"]["timings"])
+                    reuse = event["data"]["reuse"]
+                else:
+                    yield event
+            docs = truncate_documents(docs, max_tokens)
+        elif strategy != STRATEGY_NONE:
+            raise ValueError(f"Unknown token budget strategy: {strategy}")
+
+        yield {
+            "event": "fitted",
+            "data": {
+                "documents": docs,
+                "strategy": strategy,
+                "chunks": chunks,
+                "timings": timings,
+                "reuse": reuse,
+                "compression": compression,
+            },
+        }
+
+    async def fit_documents(
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        docs: List[Document],
+        budget: Optional[TokenBudget],
+    ) -> Tuple[List[Document], str]:
+        """Fit the documents in the token budget, returning them and the strategy used"""
+        async for event in self.fit_documents_events(summary_type, llm, docs, budget):
+            if event["event"] == "fitted":
+                fitted = event["data"]
+        return fitted["documents"], fitted["strategy"]
+
+    async def summarize_documents(
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        docs: List[Document],
+        budget: Optional[TokenBudget] = None,
+    ) -> Dict[str, Any]:
+        """
+        Summarize the documents, fitting them in the token budget first
+
+        Returns:
+            The summary, the strategy used to fit the documents, the number of chunks summarized,
+            the seconds spent in every phase, the tokens before and after compression, if any,
+            and, for chunked strategies, how many chunk summaries and tree nodes were reused
+        """
+        async for event in self.fit_documents_events(summary_type, llm, docs, budget):
+            if event["event"] == "fitted":
+                fitted = event["data"]
+
+        stuff_chain = self.get_summary_chain(summary_type, llm)
+        started = time.perf_counter()
+        summary = await provider_resilience.call(
+            self.provider_name,
+            lambda: stuff_chain.ainvoke({"context": fitted["documents"]}),
+            chat_model_name(llm),
+        )
+        return {
+            "summary": summary,
+            "strategy": fitted["strategy"],
+            "chunks": fitted["chunks"],
+            **(fitted["reuse"] or {}),
+            **(fitted["compression"] or {}),
+            "timings": phase_timings(fitted["timings"], summary=time.perf_counter() - started),
+        }
+
+    async def generate_text_summary(
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        text: str,
+        budget: Optional[TokenBudget] = None,
+    ) -> Dict[str, Any]:
+        """Summarize a text, returning the summary and how it was generated"""
+        try:
             # Run summarize on the text
             docs = [Document(page_content=text)]
-            return stuff_chain.invoke({"context": docs})
+            return await self.summarize_documents(summary_type, llm, docs, budget)
+        except ProviderUnavailableError:
+            raise
         except (ValueError, Exception) as e:
             msg = "Error generating text summary"
             logger.error("%s: %s", msg, e)
             raise ValueError(msg) from e
 
     async def generate_pdf_summary(
-        self, summary_type: str, llm: BaseChatModel, file_content: bytes
-    ) -> str:
-        # Create temporary file to process the PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        file_content: bytes,
+        budget: Optional[TokenBudget] = None,
+    ) -> Dict[str, Any]:
+        """Summarize a PDF, returning the summary and how it was generated"""
+        try:
+            started = time.perf_counter()
+            docs = await self.load_pdf_documents(file_content)
+            extraction = time.perf_counter() - started
 
+            generated = await self.summarize_documents(summary_type, llm, docs, budget)
+            generated["timings"] = phase_timings({"extraction": extraction}, generated["timings"])
+            return generated
+        except ProviderUnavailableError:
+            raise
+        except (ValueError, Exception) as e:
+            msg = "Error generating text summary"
+            logger.error("%s: %s", msg, e)
+            raise ValueError(msg) from e
+
+    async def stream_text_summary(
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        text: str,
+        metadata: Dict[str, Any],
+        budget: Optional[TokenBudget] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the summary of a text, ending with a "summary" event including the metadata"""
+        docs = [Document(page_content=text)]
+        async for event in self.stream_documents_summary(summary_type, llm, docs, metadata, budget):
+            yield event
+
+    async def stream_pdf_summary(
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        file_content: bytes,
+        metadata: Dict[str, Any],
+        budget: Optional[TokenBudget] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the summary of a PDF, reporting the extraction progress first"""
+        yield {"event": "progress", "data": {"phase": "extracting"}}
+        started = time.perf_counter()
         try:
-            # Define prompt
-            summary_type_details = get_summary_type_details(summary_type)
-            prompt_template = summary_type_details.get("prompt")
-            prompt = PromptTemplate.from_template(prompt_template)
+            docs = await self.load_pdf_documents(file_content)
+        except ProviderUnavailableError:
+            raise
+        except (ValueError, Exception) as e:
+            msg = "Error extracting PDF content"
+            logger.error("%s: %s", msg, e)
+            raise ValueError(msg) from e
+        timings = {"extraction": time.perf_counter() - started}
+        yield {"event": "progress", "data": {"phase": "extracted", "pages": len(docs)}}
 
-            # Load PDF
-            loader = PyPDFLoader(temp_file_path)
-            docs = loader.load()
+        async for event in self.stream_documents_summary(
+            summary_type, llm, docs, metadata, budget, timings
+        ):
+            yield event
+
+    async def stream_documents_summary(
+        self,
+        summary_type: str,
+        llm: BaseChatModel,
+        docs: List[Document],
+        metadata: Dict[str, Any],
+        budget: Optional[TokenBudget] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the summary of the documents as "token" events
+
+        Documents exceeding the token budget are fitted first, reporting the chunks summarized
+        and the strategy used. If generation fails after some tokens were sent, a "partial" event
+        with the summary generated so far is sent before raising, so cut off streams remain
+        usable. The final "summary" event adds how the summary was generated to the metadata,
+        including the seconds spent in every phase after the given timings.
+        """
+        try:
+            async for event in self.fit_documents_events(summary_type, llm, docs, budget):
+                if event["event"] == "fitted":
+                    fitted = event["data"]
+                    docs, strategy = fitted["documents"], fitted["strategy"]
+                else:
+                    yield event
+        except ProviderUnavailableError:
+            raise
+        except (ValueError, Exception) as e:
+            msg = "Error generating text summary"
+            logger.error("%s: %s", msg, e)
+            raise ValueError(msg) from e
+        if strategy != STRATEGY_NONE:
+            yield {"event": "progress", "data": {"phase": "fitted", "strategy": strategy}}
 
-            # Define StuffDocumentsChain
-            stuff_chain = create_stuff_documents_chain(llm, prompt)
+        yield {"event": "progress", "data": {"phase": "prompting", "documents": len(docs)}}
 
-            return stuff_chain.invoke({"context": docs})
+        summary_chunks = []
+        started = time.perf_counter()
+        try:
+            stuff_chain = self.get_summary_chain(summary_type, llm)
+            async for chunk in provider_resilience.stream(
+                self.provider_name, stuff_chain.astream({"context": docs}), chat_model_name(llm)
+            ):
+                if chunk:
+                    summary_chunks.append(chunk)
+                    yield {"event": "token", "data": {"content": chunk}}
         except (ValueError, Exception) as e:
+            # Sent whatever the error, upstream failures cut streams off the most
+            if summary_chunks:
+                yield {"event": "partial", "data": {"summary": "".join(summary_chunks)}}
+            if isinstance(e, ProviderUnavailableError):
+                raise
             msg = "Error generating text summary"
             logger.error("%s: %s", msg, e)
             raise ValueError(msg) from e
+
+        yield {
+            "event": "summary",
+            "data": {
+                **metadata,
+                "summary": "".join(summary_chunks),
+                "strategy": strategy,
+                "chunks": fitted["chunks"],
+                **(fitted["reuse"] or {}),
+                **(fitted["compression"] or {}),
+                "timings": phase_timings(
+                    timings or {}, fitted["timings"], summary=time.perf_counter() - started
+                ),
+            },
+        }
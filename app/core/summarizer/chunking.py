@@ -0,0 +1,82 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import math
+import re
+from typing import List
+import zlib
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+
+WORD = re.compile(r"\S+\s*")
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+
+def content_defined_chunks(text: str, min_chars: int, avg_chars: int, max_chars: int) -> List[str]:
+    """
+    Split the text at content defined boundaries into chunks of min_chars to max_chars
+
+    A gear hash rolls over the words of the text and a chunk ends after a word where its top
+    bits are zero, about every avg_chars characters. The hash only depends on the last 64
+    words, so editing the text moves the boundaries right after the edit only and the other
+    chunks stay the same. Chunks end between words, words longer than max_chars are cut.
+    """
+    words = WORD.findall(text)
+    if not words:
+        return [text] if text else []
+
+    # Probability of a boundary after every word to get chunks of avg_chars on average
+    mean_word_chars = len(text) / len(words)
+    bits = max(0, round(math.log2(max(1.0, (avg_chars - min_chars) / mean_word_chars))))
+    boundary_mask = ((1 << bits) - 1) << (HASH_BITS - bits)
+
+    chunks = []
+    start = 0
+    rolling_hash = 0
+    for match in WORD.finditer(text):
+        end = match.end()
+        rolling_hash = ((rolling_hash << 1) + zlib.crc32(match.group().encode("utf-8"))) & HASH_MASK
+        if end - start > max_chars:
+            word_start = match.start()
+            if word_start > start:
+                chunks.append(text[start:word_start])
+                start = word_start
+            while end - start > max_chars:
+                cut = start + max_chars
+                chunks.append(text[start:cut])
+                start = cut
+        elif end - start >= min_chars and not rolling_hash & boundary_mask:
+            chunks.append(text[start:end])
+            start = end
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+
+def chunk_documents(docs: List[Document], max_tokens: int) -> List[Document]:
+    """
+    Split the text of the documents into content defined chunks of at most max_tokens
+
+    The documents are joined first, so chunks do not depend on where pages start and an edit
+    only changes the chunks around it.
+    """
+    max_chars = max(1, int(max_tokens * settings.token_estimate_chars_per_token))
+    text = "\n\n".join(doc.page_content for doc in docs)
+    return [
+        Document(page_content=chunk)
+        for chunk in content_defined_chunks(text, max_chars // 4, max_chars // 2, max_chars)
+    ]
@@ -0,0 +1,282 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+import logging
+import math
+import multiprocessing
+import signal
+import threading
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_community.document_loaders.parsers import PyPDFParser
+from langchain_core.documents import Document
+from langchain_core.documents.base import Blob
+from pypdf import PdfReader
+
+from app.core.config import settings
+from app.core.llm.errors import ProviderUnavailableError
+
+
+logger = logging.getLogger(__name__)
+
+# Metadata keys PyPDFParser also copies under the name the other PDF parsers use
+PDF_METADATA_ALIASES = {"page_count": "total_pages", "file_path": "source"}
+
+
+class ExtractionOverloadedError(ProviderUnavailableError):
+    """Raised when too much PDF extraction work is already waiting for the process pool"""
+
+    status_code = 429
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            f"PDF extraction is overloaded, retry after {retry_after} seconds", "pdf", retry_after
+        )
+
+
+@contextmanager
+def cpu_time_limit(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Raise a TimeoutError once the process used the given CPU time inside the block
+
+    Only enforced in the main thread of platforms with interval timers, which is where process
+    pool workers run their jobs.
+    """
+    if (
+        not seconds
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def on_limit(signum, frame):
+        raise TimeoutError(f"PDF extraction exceeded {seconds} seconds of CPU time")
+
+    previous_handler = signal.signal(signal.SIGPROF, on_limit)
+    signal.setitimer(signal.ITIMER_PROF, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous_handler)
+
+
+def extract_pdf_documents(
+    file_content: bytes,
+    file_name: Optional[str] = None,
+    cpu_time: Optional[float] = None,
+) -> List[Document]:
+    """Parse the PDF bytes into one document per page, within the CPU time limit"""
+    blob = Blob.from_data(file_content, path=file_name, mime_type="application/pdf")
+    with cpu_time_limit(cpu_time):
+        return list(PyPDFParser().lazy_parse(blob))
+
+
+def count_pdf_pages(file_content: bytes) -> int:
+    """Count the pages of the PDF, reading its page tree but none of the page contents"""
+    return len(PdfReader(BytesIO(file_content)).pages)
+
+
+def page_ranges(pages: int, parts: int) -> List[Tuple[int, int]]:
+    """Split the pages into at most parts contiguous [start, stop) ranges of similar size"""
+    size = math.ceil(pages / max(1, parts)) if pages else 1
+    return [(start, min(start + size, pages)) for start in range(0, pages, size)]
+
+
+def pdf_metadata(reader: PdfReader, file_name: Optional[str]) -> Dict[str, Any]:
+    """
+    Return the metadata PyPDFParser gives every page of the PDF, page number aside
+
+    Keys lose their leading slash and are lower cased, dates become ISO 8601 and values
+    other than strings and integers are turned into strings.
+    """
+    metadata: Dict[str, Any] = {}
+    for key, value in (
+        {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+        | dict(reader.metadata or {})
+        | {"source": file_name, "total_pages": len(reader.pages)}
+    ).items():
+        if type(value) not in (str, int):
+            value = str(value)
+        key = key.removeprefix("/").lower()
+        if key in ("creationdate", "moddate"):
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat()
+            except ValueError:
+                pass
+        elif key in PDF_METADATA_ALIASES:
+            metadata[PDF_METADATA_ALIASES[key]] = value
+        elif isinstance(value, str):
+            value = value.strip()
+        metadata[key] = value
+    return metadata
+
+
+def extract_pdf_page_range(
+    file_content: bytes,
+    file_name: Optional[str],
+    start: int,
+    stop: int,
+    cpu_time: Optional[float] = None,
+) -> List[Document]:
+    """
+    Parse the pages in [start, stop) of the PDF bytes into one document per page
+
+    Builds the same documents, text and metadata, as extract_pdf_documents does for those pages,
+    so the ranges of one file can be extracted in different processes and concatenated.
+    """
+    with cpu_time_limit(cpu_time):
+        reader = PdfReader(BytesIO(file_content))
+        metadata = pdf_metadata(reader, file_name)
+        # Every access to page_labels computes the labels of the whole document
+        labels = reader.page_labels
+        return [
+            Document(
+                page_content=reader.pages[number].extract_text(extraction_mode="plain").strip(),
+                metadata=metadata | {"page": number, "page_label": labels[number]},
+            )
+            for number in range(start, min(stop, len(reader.pages)))
+        ]
+
+
+class PDFExtractionPool:
+    """
+    Process pool extracting the text of PDF files off the event loop
+
+    Every extraction is limited to cpu_time seconds of CPU time and at most max_queued
+    extractions wait for a free process, beyond that they are rejected. With no processes, or
+    before the pool is started, extraction runs in a thread instead.
+
+    Files with at least parallel_min_pages pages are split into one page range per process,
+    extracted in parallel and merged back in page order. The CPU time limit then applies to
+    every range.
+    """
+
+    def __init__(
+        self,
+        processes: int = settings.pdf_extraction_processes,
+        max_queued: int = settings.pdf_extraction_max_queued,
+        cpu_time: float = settings.pdf_extraction_cpu_time,
+        parallel_min_pages: int = settings.pdf_extraction_parallel_min_pages,
+    ):
+        self.processes = processes
+        self.max_queued = max_queued
+        self.cpu_time = cpu_time
+        self.parallel_min_pages = parallel_min_pages
+        self.pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    async def start(self):
+        """Start the worker processes"""
+        if self.processes <= 0 or self._executor is not None:
+            return
+        # Forking a process running an event loop and client threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info("Started %d PDF extraction processes", self.processes)
+
+    async def aclose(self):
+        """Stop the worker processes, cancelling the extractions still waiting"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def extract(self, file_content: bytes, file_name: Optional[str] = None) -> List[Document]:
+        """Extract one document per page of the PDF file"""
+        if self._executor is None:
+            return await asyncio.to_thread(extract_pdf_documents, file_content, file_name)
+
+        capacity = self.processes + self.max_queued
+        if self.pending >= capacity:
+            raise ExtractionOverloadedError(max(1, math.ceil(self.pending / self.processes)))
+
+        # Reserve a slot before awaiting, so concurrent extractions cannot all pass the check
+        executor = self._executor
+        self.pending += 1
+        reserved = 1
+        try:
+            ranges = await self._page_ranges(file_content)
+            # Split in no more ranges than the queue has room for, this one's slot included
+            available = capacity - self.pending + 1
+            if len(ranges) > available:
+                ranges = page_ranges(ranges[-1][1], available) if available > 1 else []
+            if len(ranges) > 1:
+                self.pending += len(ranges) - 1
+                reserved += len(ranges) - 1
+
+            loop = asyncio.get_running_loop()
+            if not ranges:
+                return await loop.run_in_executor(
+                    executor, extract_pdf_documents, file_content, file_name, self.cpu_time
+                )
+            parts = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        executor,
+                        extract_pdf_page_range,
+                        file_content,
+                        file_name,
+                        start,
+                        stop,
+                        self.cpu_time,
+                    )
+                    for start, stop in ranges
+                )
+            )
+            return [doc for part in parts for doc in part]
+        except BrokenProcessPool:
+            # A worker died, e.g. killed by the system, replace the pool for the next jobs.
+            # Only the first extraction failing on this pool restarts it, not the new one.
+            if self._executor is executor:
+                logger.error("PDF extraction process pool is broken, restarting it")
+                await self.aclose()
+                await self.start()
+            raise
+        finally:
+            self.pending -= reserved
+
+    async def _page_ranges(self, file_content: bytes) -> List[Tuple[int, int]]:
+        """Page ranges to extract in parallel, none when the file is extracted as a whole"""
+        if self.processes < 2 or self.parallel_min_pages <= 0:
+            return []
+        try:
+            pages = await asyncio.to_thread(count_pdf_pages, file_content)
+        except Exception:
+            # Let the regular extraction report what is wrong with the file
+            return []
+        if pages < self.parallel_min_pages:
+            return []
+        return page_ranges(pages, self.processes)
+
+    def stats(self):
+        return {
+            "processes": self.processes if self.started else 0,
+            "pending": self.pending,
+            "max_queued": self.max_queued,
+            "parallel_min_pages": self.parallel_min_pages,
+        }
+
+
+pdf_extraction_pool = PDFExtractionPool()
@@ -0,0 +1,261 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from collections import OrderedDict
+import logging
+import math
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import uuid
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = {JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED}
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many summarization jobs are waiting to run"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SummaryJob:
+    """Summarization job running the events of a streamed summary in the background"""
+
+    def __init__(self, events: Callable[[], AsyncIterator[Dict[str, Any]]]):
+        self.id = uuid.uuid4().hex
+        self.status = JOB_PENDING
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._events = events
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+        # Release the summarized content, only the result is kept
+        self._events = None
+
+    async def run(self):
+        """Consume the summary events, keeping the latest progress and the final summary"""
+        self.status = JOB_RUNNING
+        tokens = 0
+        events = self._events()
+        try:
+            async for event in events:
+                if event["event"] == "progress":
+                    self.progress.update(event["data"])
+                elif event["event"] == "token":
+                    tokens += 1
+                    self.progress["tokens"] = tokens
+                elif event["event"] == "summary":
+                    self.result = event["data"]
+            self.progress["phase"] = "done"
+            self.finish(JOB_SUCCEEDED)
+        except asyncio.CancelledError:
+            self.finish(JOB_CANCELLED)
+            raise
+        except ValueError as e:
+            self.error = str(e)
+            self.finish(JOB_FAILED)
+        except Exception as e:
+            logger.error("Summary job %s failed: %s", self.id, e)
+            self.error = f"Error processing request: {str(e)}"
+            self.finish(JOB_FAILED)
+        finally:
+            await events.aclose()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class SummaryJobManager:
+    """
+    In-process pool of workers running summarization jobs
+
+    At most max_concurrency jobs run at a time and at most max_queued wait for a worker. Finished
+    jobs are kept for polling until they are older than retention seconds, or until more than
+    max_retained jobs are known. Jobs submitted with the key of a known job that did not fail or
+    get cancelled are not run again, that job is returned instead.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.summary_jobs_max_concurrency,
+        max_queued: int = settings.summary_jobs_max_queued,
+        max_retained: int = settings.summary_jobs_max_retained,
+        retention: float = settings.summary_jobs_retention,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.max_retained = max_retained
+        self.retention = retention
+        self._jobs: "OrderedDict[str, SummaryJob]" = OrderedDict()
+        self._keys: Dict[str, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.average_duration: Optional[float] = None
+
+    def retry_after(self) -> int:
+        """Estimate in seconds when a queued job should be picked up by a worker"""
+        duration = self.average_duration or 1.0
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return max(1, math.ceil(duration * (queued + 1) / max(1, self.max_concurrency)))
+
+    def _start_workers(self):
+        loop = asyncio.get_running_loop()
+        # Workers belong to the event loop they were started in
+        if self._workers and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != JOB_PENDING:
+                    continue
+                job._task = asyncio.create_task(job.run())
+                started = time.monotonic()
+                # Waiting does not raise when only the job is cancelled
+                await asyncio.wait([job._task])
+                if not job.finished:
+                    # Cancelled before it started running
+                    job.finish(JOB_CANCELLED)
+                elif job.status == JOB_SUCCEEDED:
+                    duration = time.monotonic() - started
+                    if self.average_duration is None:
+                        self.average_duration = duration
+                    else:
+                        self.average_duration = 0.8 * self.average_duration + 0.2 * duration
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        """Forget finished jobs past their retention, then the oldest ones over the limit"""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.retention:
+                del self._jobs[job_id]
+
+        for job_id, job in list(self._jobs.items()):
+            if len(self._jobs) <= self.max_retained:
+                break
+            if job.finished:
+                del self._jobs[job_id]
+
+        self._keys = {key: job_id for key, job_id in self._keys.items() if job_id in self._jobs}
+
+    def submit(
+        self, events: Callable[[], AsyncIterator[Dict[str, Any]]], key: Optional[str] = None
+    ) -> SummaryJob:
+        """
+        Queue a job consuming the summary events returned by the events callable
+
+        Args:
+            events: Callable returning the summary events of the job
+            key: Key identifying the content and parameters of the summary, the job already
+                known for it is returned unless it failed or was cancelled
+        """
+        self._start_workers()
+        self._prune()
+        if key is not None:
+            job = self._jobs.get(self._keys.get(key, ""))
+            if job is not None and job.status not in (JOB_FAILED, JOB_CANCELLED):
+                logger.debug("Joining summary job %s", job.id)
+                return job
+
+        if self._queue.qsize() >= self.max_queued:
+            retry_after = self.retry_after()
+            raise JobQueueFullError(
+                f"Too many summarization jobs are waiting, retry after {retry_after} seconds",
+                retry_after,
+            )
+
+        job = SummaryJob(events)
+        self._jobs[job.id] = job
+        if key is not None:
+            self._keys[key] = job.id
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[SummaryJob]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[SummaryJob]:
+        """Cancel a pending or running job, finished jobs are left as they are"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        if job._task is not None:
+            job._task.cancel()
+        else:
+            job.finish(JOB_CANCELLED)
+        return job
+
+    async def aclose(self):
+        """Cancel the running jobs and stop the workers"""
+        for job in self._jobs.values():
+            if job._task is not None:
+                job._task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+        self._queue = None
+        self._jobs.clear()
+        self._keys.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "pending": statuses.count(JOB_PENDING),
+            "running": statuses.count(JOB_RUNNING),
+            "retained": len(statuses),
+        }
+
+
+summary_jobs = SummaryJobManager()
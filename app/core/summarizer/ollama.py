@@ -12,11 +12,12 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import logging
-from typing import Optional, Dict, Any
-
-from langchain_ollama import ChatOllama
+from typing import Any, AsyncIterator, Dict, Optional
 
+from app.core.budget import TokenBudget, estimate_tokens
 from app.core.config import settings
+from app.core.llm.errors import ProviderUnavailableError
+from app.core.llm.ollama import OllamaLLM
 from app.core.summarizer.base import BaseSummarizer
 
 
@@ -26,9 +27,10 @@ logger = logging.getLogger(__name__)
 class OllamaSummarizer(BaseSummarizer):
     """Ollama summarizer implementation"""
 
-    def __init__(self):
+    def __init__(self, llm: Optional[OllamaLLM] = None):
         """Initialize Ollama with base URL from settings"""
         self.server_url = settings.ollama_base_url
+        self.llm = llm or OllamaLLM()
 
     @property
     def provider_name(self) -> str:
@@ -41,28 +43,32 @@ class OllamaSummarizer(BaseSummarizer):
         model: Optional[str] = settings.ollama_default_model,
         temperature: Optional[float] = settings.default_model_temperature,
         max_length: Optional[int] = settings.default_model_temperature,
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
     ) -> Dict[str, Any]:
         """Summarize text using Ollama"""
         try:
             # Prepare LLM
-            llm = ChatOllama(
-                base_url=self.server_url,
-                model=model,
-                temperature=temperature,
-                num_predict=max_length,
-            )
+            llm = self.llm.get_chat_model(model, temperature, max_length, estimate_tokens(text))
 
-            generated_summary = await self.generate_text_summary(summary_type, llm, text)
+            generated = await self.generate_text_summary(
+                summary_type,
+                llm,
+                text,
+                TokenBudget.for_model(model, max_length, strategy, compression_ratio),
+            )
 
             return {
                 "model": model,
                 "provider": self.provider_name,
                 "response_max_tokens": max_length,
-                "summary": generated_summary,
+                **generated,
                 "summary_type": summary_type,
                 "source": "text",
                 "temperature": temperature,
             }
+        except ProviderUnavailableError:
+            raise
         except (ValueError, Exception) as e:
             msg = "Error summarizing text"
             logger.error("%s: %s", msg, e)
@@ -76,31 +82,86 @@ class OllamaSummarizer(BaseSummarizer):
         model: Optional[str] = settings.ollama_default_model,
         temperature: Optional[float] = settings.default_model_temperature,
         max_length: Optional[int] = settings.default_model_temperature,
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
     ) -> Dict[str, Any]:
         """Summarize PDF using Ollama"""
         try:
             # Prepare LLM
-            llm = ChatOllama(
-                base_url=self.server_url,
-                model=model,
-                temperature=temperature,
-                num_predict=max_length,
-            )
+            llm = self.llm.get_chat_model(model, temperature, max_length)
 
-            generated_summary = await self.generate_pdf_summary(
-                summary_type=summary_type, llm=llm, file_content=file_content
+            generated = await self.generate_pdf_summary(
+                summary_type=summary_type,
+                llm=llm,
+                file_content=file_content,
+                budget=TokenBudget.for_model(model, max_length, strategy, compression_ratio),
             )
 
             return {
                 "model": model,
                 "provider": self.provider_name,
                 "response_max_tokens": max_length,
-                "summary": generated_summary,
+                **generated,
                 "summary_type": summary_type,
                 "source": "pdf",
                 "temperature": temperature,
             }
+        except ProviderUnavailableError:
+            raise
         except (ValueError, Exception) as e:
             msg = "Error summarizing PDF document"
             logger.error("%s: %s", msg, e)
             raise ValueError(msg) from e
+
+    async def stream_summarize_text(
+        self,
+        text: str,
+        summary_type: Optional[str] = settings.default_summary_type,
+        model: Optional[str] = settings.ollama_default_model,
+        temperature: Optional[float] = settings.default_model_temperature,
+        max_length: Optional[int] = settings.default_max_tokens,
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Summarize text using Ollama streaming the summary"""
+        llm = self.llm.get_chat_model(model, temperature, max_length, estimate_tokens(text))
+        budget = TokenBudget.for_model(model, max_length, strategy, compression_ratio)
+        metadata = {
+            "model": model,
+            "provider": self.provider_name,
+            "response_max_tokens": max_length,
+            "summary_type": summary_type,
+            "source": "text",
+            "temperature": temperature,
+        }
+
+        async for event in self.stream_text_summary(summary_type, llm, text, metadata, budget):
+            yield event
+
+    async def stream_summarize_pdf(
+        self,
+        file_content: bytes,
+        file_name: str,
+        summary_type: Optional[str] = settings.default_summary_type,
+        model: Optional[str] = settings.ollama_default_model,
+        temperature: Optional[float] = settings.default_model_temperature,
+        max_length: Optional[int] = settings.default_max_tokens,
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Summarize PDF using Ollama streaming the summary"""
+        llm = self.llm.get_chat_model(model, temperature, max_length)
+        budget = TokenBudget.for_model(model, max_length, strategy, compression_ratio)
+        metadata = {
+            "model": model,
+            "provider": self.provider_name,
+            "response_max_tokens": max_length,
+            "summary_type": summary_type,
+            "source": "pdf",
+            "temperature": temperature,
+        }
+
+        async for event in self.stream_pdf_summary(
+            summary_type, llm, file_content, metadata, budget
+        ):
+            yield event
@@ -0,0 +1,287 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from contextlib import aclosing
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.summarizer.base import BaseSummarizer
+
+
+logger = logging.getLogger(__name__)
+
+STORE_HIT = "HIT"
+STORE_MISS = "MISS"
+STORE_BYPASS = "BYPASS"
+
+# Keys are sha256 hex digests, anything else could escape the store directory
+KEY_PATTERN = r"^[0-9a-f]{64}$"
+
+
+def content_hash(content: bytes) -> str:
+    """Return the sha256 hex digest of the content"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def summary_key(
+    digest: str,
+    provider: str,
+    summary_type: str,
+    model: Optional[str],
+    temperature: Optional[float],
+    max_length: Optional[int],
+    strategy: Optional[str] = None,
+    compression_ratio: Optional[float] = None,
+) -> str:
+    """
+    Return the content addressed key of a summary
+
+    The overflow strategy and compression ratio are resolved against their configured
+    defaults, so summaries made under another server configuration are not reused.
+    """
+    normalized = json.dumps(
+        [
+            digest,
+            provider,
+            summary_type,
+            model or "",
+            float(temperature or 0.0),
+            max_length,
+            strategy or settings.token_budget_overflow_strategy,
+            compression_ratio or settings.token_budget_compression_ratio,
+        ],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class SummaryStore:
+    """
+    Disk backed, content addressed store of generated summaries
+
+    Every summary is saved as a JSON file named after its key, so summaries survive restarts.
+    When the store grows beyond its size cap the least recently used files are deleted.
+
+    The size of the store is counted once and then tracked in memory, the directory is only
+    scanned again when the count crosses the cap. Files written by other processes are only
+    counted on that scan, so the cap is approximate.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.summary_store_path,
+        max_bytes: int = settings.summary_store_max_bytes,
+        enabled: bool = settings.summary_store_enabled,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str) -> Path:
+        if not re.fullmatch(KEY_PATTERN, key):
+            raise ValueError(f"Invalid summary store key: {key!r}")
+        entry_path = self.path / f"{key}.json"
+        if entry_path.resolve().parent != self.path.resolve():
+            raise ValueError(f"Invalid summary store key: {key!r}")
+        return entry_path
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored summary, refreshing its last access time"""
+        entry_path = self._entry_path(key)
+        try:
+            with entry_path.open("r", encoding="utf-8") as entry_file:
+                value = json.load(entry_file)
+            os.utime(entry_path)
+            return value
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError) as e:
+            logger.warning("Discarding unreadable summary store entry %s: %s", key, e)
+            self._remove(entry_path)
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a summary, evicting the least recently used ones over the size cap"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry_path = self._entry_path(key)
+        temp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with temp_path.open("w", encoding="utf-8") as entry_file:
+            json.dump(value, entry_file)
+        added_bytes = temp_path.stat().st_size - self._size(entry_path)
+        os.replace(temp_path, entry_path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_bytes()
+            else:
+                self._total_bytes += added_bytes
+            over_cap = self._total_bytes > self.max_bytes
+        if over_cap:
+            self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the store fits the size cap"""
+        with self._lock:
+            entries = self._entries()
+            total_bytes = sum(entry.stat().st_size for entry in entries)
+            for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+                if total_bytes <= self.max_bytes:
+                    break
+                total_bytes -= entry.stat().st_size
+                Path(entry.path).unlink(missing_ok=True)
+                logger.debug("Evicted summary store entry %s", entry.name)
+            self._total_bytes = total_bytes
+
+    def purge(self, key: Optional[str] = None) -> int:
+        """Delete one entry, or every entry if no key is given, returning how many were deleted"""
+        if key is not None:
+            return int(self._remove(self._entry_path(key)))
+
+        with self._lock:
+            entries = self._entries()
+            for entry in entries:
+                Path(entry.path).unlink(missing_ok=True)
+            self._total_bytes = None
+        return len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of entries and bytes used by the store"""
+        entries = self._entries()
+        return {
+            "enabled": self.enabled,
+            "entries": len(entries),
+            "bytes": sum(entry.stat().st_size for entry in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    @staticmethod
+    def _size(entry_path: Path) -> int:
+        try:
+            return entry_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _remove(self, entry_path: Path) -> bool:
+        """Delete an entry, keeping the size count, returning whether it existed"""
+        size = self._size(entry_path)
+        try:
+            entry_path.unlink()
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes = max(0, self._total_bytes - size)
+        return True
+
+    def _scan_bytes(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        if not self.path.is_dir():
+            return []
+        with os.scandir(self.path) as entries:
+            return [entry for entry in entries if entry.name.endswith(".json")]
+
+    async def summarize_pdf(
+        self,
+        summarizer: BaseSummarizer,
+        file_content: bytes,
+        file_name: str,
+        summary_type: str,
+        model: Optional[str],
+        temperature: Optional[float],
+        max_length: Optional[int],
+        strategy: Optional[str] = None,
+        compression_ratio: Optional[float] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Summarize a PDF document through the store
+
+        Returns:
+            The summary and the store status (HIT, MISS or BYPASS)
+        """
+        if not self.enabled:
+            result = await summarizer.summarize_pdf(
+                file_content=file_content,
+                file_name=file_name,
+                summary_type=summary_type,
+                model=model,
+                temperature=temperature,
+                max_length=max_length,
+                strategy=strategy,
+                compression_ratio=compression_ratio,
+            )
+            return result, STORE_BYPASS
+
+        key = summary_key(
+            content_hash(file_content),
+            summarizer.provider_name,
+            summary_type,
+            model,
+            temperature,
+            max_length,
+            strategy,
+            compression_ratio,
+        )
+        stored = await asyncio.to_thread(self.get, key)
+        if stored is not None:
+            logger.debug("Summary store hit %s", key)
+            return stored, STORE_HIT
+
+        result = await summarizer.summarize_pdf(
+            file_content=file_content,
+            file_name=file_name,
+            summary_type=summary_type,
+            model=model,
+            temperature=temperature,
+            max_length=max_length,
+            strategy=strategy,
+            compression_ratio=compression_ratio,
+        )
+        await asyncio.to_thread(self.put, key, result)
+        return result, STORE_MISS
+
+    async def summary_events(
+        self, key: str, events: Callable[[], AsyncIterator[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the summary events returned by the events callable through the store
+
+        A stored summary is sent as the only "summary" event, otherwise the events are streamed
+        and the summary they end with is stored.
+        """
+        if self.enabled:
+            stored = await asyncio.to_thread(self.get, key)
+            if stored is not None:
+                logger.debug("Summary store hit %s", key)
+                yield {"event": "summary", "data": stored}
+                return
+
+        async with aclosing(events()) as summary_events:
+            async for event in summary_events:
+                if event["event"] == "summary" and self.enabled:
+                    await asyncio.to_thread(self.put, key, event["data"])
+                yield event
+
+
+summary_store = SummaryStore()
@@ -51,6 +51,16 @@ QUESTIONS:
     },
 }
 
+# Summarizes the nodes of summary trees, it does not depend on the summary type requested so
+# the lower tiers of a tree can be reused by any summary type
+NODE_SUMMARY_PROMPT = """Summarize the following part of a longer document:
+{context}
+Keep the key facts, names, figures and conclusions, they will be summarized again later.
+Do not include any other text, return only the summary.
+Generate the summary in the same language as the text provided.
+SUMMARY:
+"""
+
 
 def get_summary_types():
     """Return the supported summary types"""
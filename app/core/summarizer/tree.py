@@ -0,0 +1,226 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from app.core.budget import estimate_tokens
+from app.core.config import settings
+from app.core.llm.clients import chat_model_name
+
+
+logger = logging.getLogger(__name__)
+
+
+def model_identity(provider: str, llm: BaseChatModel) -> List[Any]:
+    """Return what identifies the summaries generated by the chat model"""
+    return [provider, chat_model_name(llm) or "", float(getattr(llm, "temperature", None) or 0.0)]
+
+
+def leaf_key(identity: List[Any], docs: List[Document]) -> str:
+    """Return the content addressed key of the summary of a chunk of documents"""
+    normalized = json.dumps([identity, [doc.page_content for doc in docs]], separators=(",", ":"))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def node_key(identity: List[Any], child_keys: List[str]) -> str:
+    """Return the key of the summary of the child nodes, addressed by the keys of the children"""
+    normalized = json.dumps([identity, child_keys], separators=(",", ":"))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def group_nodes(
+    keys: List[str], summaries: List[str], fan_in: int, max_tokens: int
+) -> List[List[int]]:
+    """
+    Group consecutive nodes, fan_in per group on average and up to max_tokens per group
+
+    A group ends after a node whose key is a multiple of fan_in, or once it holds 2 * fan_in
+    nodes. Like content defined chunks, groups only depend on the nodes they hold, so a
+    changed node changes its group only and the rest of the tier is reused. If that would not
+    reduce the number of nodes, consecutive groups of fan_in nodes are made instead.
+
+    Returns the indexes of the nodes of every group.
+    """
+    boundaries = [int(key[:8], 16) % fan_in == 0 for key in keys]
+    groups = _group_nodes(summaries, boundaries, 2 * fan_in, max_tokens)
+    if len(groups) == len(summaries):
+        boundaries = [False] * len(summaries)
+        groups = _group_nodes(summaries, boundaries, fan_in, max_tokens)
+    return groups
+
+
+def _group_nodes(
+    summaries: List[str], boundaries: List[bool], max_nodes: int, max_tokens: int
+) -> List[List[int]]:
+    groups: List[List[int]] = []
+    group: List[int] = []
+    group_tokens = 0
+    for index, summary in enumerate(summaries):
+        tokens = estimate_tokens(summary)
+        if group and (len(group) >= max_nodes or group_tokens + tokens > max_tokens):
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(index)
+        group_tokens += tokens
+        if boundaries[index]:
+            groups.append(group)
+            group, group_tokens = [], 0
+    if group:
+        groups.append(group)
+    return groups
+
+
+class SummaryNodeCache:
+    """
+    Bounded LRU cache of the intermediate summaries of summary trees and map-reduce chunks
+
+    Nodes are addressed by their content: leaves by the text they summarize, the other nodes by
+    the keys of their children. Intermediate summaries of trees do not depend on the summary
+    type, so retries, other summary types and revisions of the same content reuse the nodes
+    whose content did not change. Map-reduce chunk summaries are also keyed by their summary
+    type, they are only reused by retries and repeats of the same summary.
+
+    With a path, the nodes are loaded from that file on startup, saved to it every
+    save_interval seconds when they changed, and on shutdown, so they are reused across
+    restarts and at most the last interval is lost if the process dies.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.summary_node_cache_enabled,
+        max_size: int = settings.summary_node_cache_size,
+        path: Optional[str] = settings.summary_node_cache_path,
+        save_interval: float = settings.summary_node_cache_save_interval,
+    ):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.path = Path(path) if path else None
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._changed = False
+        self._saver: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached summary of the node"""
+        if not self.enabled:
+            return None
+        summary = self._entries.get(key)
+        if summary is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return summary
+
+    def set(self, key: str, summary: str):
+        """Cache the summary of a node, evicting the least recently used ones when full"""
+        if not self.enabled:
+            return
+        self._entries[key] = summary
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._changed = True
+
+    def clear(self):
+        """Remove every cached node"""
+        self._entries.clear()
+        self.hits = self.misses = 0
+        self._changed = True
+
+    def load(self):
+        """Load the nodes saved in the cache file, keeping their recency order"""
+        if not self.enabled or self.path is None:
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as cache_file:
+                entries = json.load(cache_file)
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            logger.warning("Discarding unreadable summary node cache %s: %s", self.path, e)
+            return
+        for key, summary in entries:
+            self.set(key, summary)
+        self._changed = False
+        logger.info("Loaded %d summary tree nodes", len(self._entries))
+
+    def save(self):
+        """Save the nodes to the cache file, replacing it atomically"""
+        self._write(list(self._entries.items()))
+
+    def _write(self, entries: List[Any]):
+        if not self.enabled or self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with temp_path.open("w", encoding="utf-8") as cache_file:
+            json.dump(entries, cache_file)
+        os.replace(temp_path, self.path)
+
+    async def _save_changes(self):
+        # The nodes are copied in the event loop, which is the only one changing them
+        self._changed = False
+        await asyncio.to_thread(self._write, list(self._entries.items()))
+
+    async def _save_periodically(self):
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self._changed:
+                try:
+                    await self._save_changes()
+                except OSError as e:
+                    logger.warning("Error saving summary node cache %s: %s", self.path, e)
+
+    async def start(self):
+        """Load the saved nodes on startup and start saving them periodically"""
+        await asyncio.to_thread(self.load)
+        if self.enabled and self.path is not None and self.save_interval > 0:
+            self._saver = asyncio.create_task(self._save_periodically())
+
+    async def aclose(self):
+        """Save and release the cached nodes on shutdown"""
+        if self._saver is not None:
+            self._saver.cancel()
+            await asyncio.gather(self._saver, return_exceptions=True)
+            self._saver = None
+        await self._save_changes()
+        self.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "persistent": self.path is not None,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+summary_node_cache = SummaryNodeCache()
@@ -11,6 +11,7 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+from contextlib import asynccontextmanager
 import logging
 
 from fastapi import FastAPI, status, Request
@@ -20,11 +21,21 @@ from app.core.logging_config import root_logger  # noqa: F401
 
 from app.api.v1.routes import router as v1_router
 from app.core.config import settings
+from app.core.providers import provider_factory
 
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title=settings.project_name)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the providers on startup and release shared resources on shutdown"""
+    await provider_factory.startup()
+    yield
+    await provider_factory.shutdown()
+
+
+app = FastAPI(title=settings.project_name, lifespan=lifespan)
 
 logger.info("Starting")
 
@@ -11,10 +11,12 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
+from app.core.config import settings
+
 
 class LLMAvailableProvidersResponse(BaseModel):
     providers: List[str]
@@ -26,6 +28,17 @@ class LLMRequest(BaseModel):
     model: Optional[str] = Field(None, description="Specific model to use (optional)")
     temperature: Optional[float] = Field(0.7, description="Temperature for generation")
     max_tokens: Optional[int] = Field(None, description="Maximum tokens to generate")
+    cache: Literal["use", "bypass", "refresh"] = Field(
+        "use",
+        description="Response cache control: use it, bypass it or refresh the cached answer",
+    )
+    routing: Literal["off", "failover", "hedge"] = Field(
+        settings.llm_routing_mode,
+        description=(
+            "Provider routing: off, failover to the next provider on error, or also hedge slow"
+            " answers with the next provider"
+        ),
+    )
 
     class ConfigDict:
         json_schema_extra = {
@@ -45,3 +58,25 @@ class LLMResponse(BaseModel):
     model: Optional[str] = None
     temperature: float
     response_max_tokens: int
+    similarity: Optional[float] = Field(
+        None, description="Similarity of the earlier question when answered by the semantic cache"
+    )
+
+
+class LLMBatchRequest(BaseModel):
+    items: List[LLMRequest] = Field(
+        ..., max_length=settings.batch_max_items, description="Questions to ask"
+    )
+    stream: bool = Field(
+        False, description="Stream each result as an NDJSON line as soon as it finishes"
+    )
+
+
+class LLMBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    result: Optional[LLMResponse] = None
+    error: Optional[str] = None
+
+
+class LLMBatchResponse(BaseModel):
+    results: List[LLMBatchItemResult]
@@ -11,7 +11,7 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from fastapi import UploadFile, File
 from pydantic import BaseModel, Field
@@ -19,6 +19,9 @@ from pydantic import BaseModel, Field
 from app.core.config import settings
 
 
+OverflowStrategy = Literal["auto", "truncate", "extractive", "chunked", "map_reduce", "tree"]
+
+
 class SummaryAvailableProvidersResponse(BaseModel):
     providers: List[str]
 
@@ -38,6 +41,15 @@ class TextSummaryRequest(BaseModel):
     max_length: Optional[int] = Field(
         settings.default_max_tokens, description="Maximum summary length (optional)"
     )
+    strategy: Optional[OverflowStrategy] = Field(
+        None, description="How to fit content exceeding the model context (optional)"
+    )
+    compression_ratio: Optional[float] = Field(
+        None,
+        gt=0,
+        le=1,
+        description="Share of the tokens to keep extracting the key sentences first (optional)",
+    )
 
     class ConfigDict:
         json_schema_extra = {
@@ -66,6 +78,15 @@ class PDFSummaryRequest(BaseModel):
     max_length: Optional[int] = Field(
         settings.default_max_tokens, description="Maximum summary length (optional)"
     )
+    strategy: Optional[OverflowStrategy] = Field(
+        None, description="How to fit content exceeding the model context (optional)"
+    )
+    compression_ratio: Optional[float] = Field(
+        None,
+        gt=0,
+        le=1,
+        description="Share of the tokens to keep extracting the key sentences first (optional)",
+    )
 
 
 class SummaryResponse(BaseModel):
@@ -76,3 +97,75 @@ class SummaryResponse(BaseModel):
     summary_type: str
     source: str = Field("text", description="Source of the original content (text or pdf)")
     temperature: float
+    strategy: Optional[str] = Field(
+        None, description="How the content was fitted in the model context"
+    )
+    chunks: Optional[int] = Field(None, description="Number of chunks summarized separately")
+    chunks_reused: Optional[int] = Field(
+        None, description="Chunk summaries reused from earlier summaries of the same content"
+    )
+    nodes: Optional[int] = Field(None, description="Number of nodes of the summary tree")
+    nodes_reused: Optional[int] = Field(
+        None, description="Summary tree nodes reused from earlier summaries"
+    )
+    input_tokens: Optional[int] = Field(None, description="Tokens of the content to summarize")
+    compressed_tokens: Optional[int] = Field(
+        None, description="Tokens of the content left after extracting its key sentences"
+    )
+    timings: Optional[Dict[str, float]] = Field(
+        None,
+        description="Seconds spent in every phase: extraction, compression, fit, map, reduce, "
+        "summary",
+    )
+
+
+class TextSummaryBatchRequest(BaseModel):
+    items: List[TextSummaryRequest] = Field(
+        ..., max_length=settings.batch_max_items, description="Texts to summarize"
+    )
+
+
+class PDFSummaryBatchRequest(BaseModel):
+    provider: str = Field("ollama", description="Provider: openai or ollama")
+    files: List[UploadFile] = File(..., description="PDF files to summarise")
+    summary_type: str = Field(
+        settings.default_summary_type, description="Type of summary to generate (optional)"
+    )
+    model: Optional[str] = Field(
+        settings.ollama_default_model, description="Specific model to use (optional)"
+    )
+    temperature: Optional[float] = Field(
+        settings.default_model_temperature, description="Model temperature to use (optional)"
+    )
+    max_length: Optional[int] = Field(
+        settings.default_max_tokens, description="Maximum summary length (optional)"
+    )
+    strategy: Optional[OverflowStrategy] = Field(
+        None, description="How to fit content exceeding the model context (optional)"
+    )
+    compression_ratio: Optional[float] = Field(
+        None,
+        gt=0,
+        le=1,
+        description="Share of the tokens to keep extracting the key sentences first (optional)",
+    )
+
+
+class SummaryBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    file_name: Optional[str] = Field(None, description="Name of the summarized PDF file")
+    result: Optional[SummaryResponse] = None
+    error: Optional[str] = None
+
+
+class SummaryJobResponse(BaseModel):
+    id: str = Field(..., description="Job id to poll or cancel the job with")
+    status: Literal["pending", "running", "succeeded", "failed", "cancelled"]
+    progress: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Latest progress: phase, pages extracted, chunks summarized and tokens",
+    )
+    result: Optional[SummaryResponse] = None
+    error: Optional[str] = None
+    created_at: float = Field(..., description="Creation time as a UNIX timestamp")
+    finished_at: Optional[float] = Field(None, description="End time as a UNIX timestamp")
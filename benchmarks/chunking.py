@@ -0,0 +1,106 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Benchmark of the text chunker on large synthetic texts
+
+Measures the throughput of the token aware chunker and the memory it allocates, next to
+LangChain's RecursiveCharacterTextSplitter for reference.
+
+Usage: python -m benchmarks.chunking [--megabytes 50] [--max-tokens 1000] [--overlap 50]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.chunker import iter_chunks
+from app.core.config import settings
+
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt "
+    "ut labore et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco"
+).split()
+
+
+def build_text(megabytes: float, seed: int = 0) -> str:
+    """Build a text of paragraphs of 3 to 8 sentences of 5 to 20 words"""
+    rng = random.Random(seed)
+    paragraphs = []
+    size = 0
+    while size < megabytes * 2**20:
+        sentences = [
+            " ".join(rng.choices(WORDS, k=rng.randint(5, 20))).capitalize() + "."
+            for _ in range(rng.randint(3, 8))
+        ]
+        paragraphs.append(" ".join(sentences))
+        size += len(paragraphs[-1]) + 2
+    return "\n\n".join(paragraphs)
+
+
+def measure(run: Callable[[], int]) -> Tuple[float, int, int]:
+    """Return the seconds, the number of chunks and the peak bytes allocated by the run"""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        chunks = run()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, chunks, peak
+
+
+def main(arguments: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=50)
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=50)
+    options = parser.parse_args(arguments)
+
+    text = build_text(options.megabytes)
+    megabytes = len(text) / 2**20
+    chars_per_token = settings.token_estimate_chars_per_token
+
+    def chunker() -> int:
+        docs = [Document(page_content=text)]
+        return sum(1 for _ in iter_chunks(docs, options.max_tokens, options.overlap))
+
+    def recursive_splitter() -> int:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=int(options.max_tokens * chars_per_token),
+            chunk_overlap=int(options.overlap * chars_per_token),
+        )
+        return len(splitter.split_text(text))
+
+    print(
+        f"{megabytes:.1f} MiB text, {options.max_tokens} tokens chunks, {options.overlap} overlap"
+    )
+    print(f"{'method':<32}{'seconds':>9}{'MiB/s':>9}{'chunks':>9}{'peak MiB':>10}")
+    for name, run in (
+        ("app.core.chunker", chunker),
+        ("RecursiveCharacterTextSplitter", recursive_splitter),
+    ):
+        elapsed, chunks, peak = measure(run)
+        print(
+            f"{name:<32}{elapsed:>9.2f}{megabytes / elapsed:>9.1f}{chunks:>9}{peak / 2**20:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
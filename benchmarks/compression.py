@@ -0,0 +1,88 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Benchmark of the extractive pre-compression on large synthetic texts
+
+Measures how long ranking and extracting the key sentences takes for several compression
+ratios, and the prompt tokens it saves. The prompt time is an estimate from the prefill rate
+given, no model is called.
+
+Usage: python -m benchmarks.compression [--tokens 100000] [--prefill-rate 1000]
+"""
+import argparse
+import random
+import time
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from app.core.budget import documents_tokens, extract_documents
+
+
+TOPICS = [
+    "solar panels convert sunlight into electricity for homes and batteries",
+    "wind turbines spin generators when strong coastal winds blow",
+    "hydroelectric dams store water and release it through turbines",
+    "battery storage smooths the supply of renewable energy at night",
+]
+FILLER = "the report also notes that several meetings were held during the year".split()
+
+
+def build_documents(tokens: int, pages: int = 100, seed: int = 0) -> List[Document]:
+    """Build pages of sentences mixing a few topics with filler words"""
+    rng = random.Random(seed)
+    sentences = []
+    size = 0
+    while size < tokens:
+        words = rng.choice(TOPICS).split()
+        words = rng.sample(words, rng.randint(4, len(words))) + rng.sample(FILLER, 4)
+        rng.shuffle(words)
+        sentences.append(" ".join(words).capitalize() + ".")
+        size += len(sentences[-1]) // 4 + 1
+    per_page = -(-len(sentences) // pages)
+    return [
+        Document(
+            page_content=" ".join(sentences[start : start + per_page]), metadata={"page": page}
+        )
+        for page, start in enumerate(range(0, len(sentences), per_page))
+    ]
+
+
+def main(arguments: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=100000)
+    parser.add_argument("--prefill-rate", type=float, default=1000, help="Prompt tokens/second")
+    parser.add_argument("--ratios", type=float, nargs="+", default=[0.5, 0.25, 0.1])
+    options = parser.parse_args(arguments)
+
+    docs = build_documents(options.tokens)
+    tokens = documents_tokens(docs)
+    prompt_seconds = tokens / options.prefill_rate
+
+    print(f"{tokens} tokens in {len(docs)} pages, {options.prefill_rate:.0f} prompt tokens/s")
+    print(f"{'ratio':<8}{'tokens':>9}{'saved':>8}{'extract s':>11}{'prompt s':>10}{'total s':>9}")
+    print(f"{'none':<8}{tokens:>9}{'0%':>8}{0:>11.2f}{prompt_seconds:>10.2f}{prompt_seconds:>9.2f}")
+    for ratio in options.ratios:
+        start = time.perf_counter()
+        compressed = documents_tokens(extract_documents(docs, int(tokens * ratio)))
+        elapsed = time.perf_counter() - start
+        prompt_seconds = compressed / options.prefill_rate
+        print(
+            f"{ratio:<8}{compressed:>9}{1 - compressed / tokens:>8.0%}{elapsed:>11.2f}"
+            f"{prompt_seconds:>10.2f}{elapsed + prompt_seconds:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Benchmark of PDF text extraction on synthetic large PDFs
+
+Compares PyPDFLoader.load(), extracting every page in one process, with the page parallel mode
+of the PDF extraction pool for an increasing number of processes.
+
+Usage: python -m benchmarks.pdf_extraction [--pages 1000] [--processes 1 2 4] [--repeat 3]
+"""
+import argparse
+import asyncio
+from io import BytesIO
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+from langchain_community.document_loaders import PyPDFLoader
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from app.core.summarizer.extraction import PDFExtractionPool
+
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt "
+    "ut labore et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco"
+).split()
+
+
+def build_large_pdf(pages: int, lines_per_page: int = 50, seed: int = 0) -> bytes:
+    """Build a PDF with pages full of random text lines"""
+    rng = random.Random(seed)
+    writer = PdfWriter()
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    font_reference = writer._add_object(font)
+
+    for _ in range(pages):
+        lines = [" ".join(rng.choices(WORDS, k=12)) for _ in range(lines_per_page)]
+        operations = " ".join(f"({line}) Tj T*" for line in lines)
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 10 Tf 12 TL 72 760 Td {operations} ET".encode("latin-1"))
+        page = writer.add_blank_page(width=612, height=792)
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_reference})}
+        )
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def best_time(run: Callable[[], int], repeat: int) -> float:
+    """Best wall clock time of the runs"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def loader_extraction(path: str) -> Callable[[], int]:
+    return lambda: len(PyPDFLoader(path).load())
+
+
+async def pool_time(file_content: bytes, processes: int, repeat: int) -> float:
+    pool = PDFExtractionPool(processes=processes, max_queued=0, cpu_time=0, parallel_min_pages=1)
+    await pool.start()
+    try:
+        # Warm up the worker processes, spawning them is not part of the extraction
+        await pool.extract(file_content)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await pool.extract(file_content)
+            times.append(time.perf_counter() - start)
+        return min(times)
+    finally:
+        await pool.aclose()
+
+
+def main(arguments: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args(arguments)
+
+    print(f"CPU cores: {os.cpu_count()}")
+    for pages in options.pages:
+        file_content = build_large_pdf(pages)
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as file:
+            file.write(file_content)
+            file.flush()
+            baseline = best_time(loader_extraction(file.name), options.repeat)
+
+        print(f"\n{pages} pages, {len(file_content) / 2**20:.1f} MiB")
+        print(f"{'method':<28}{'seconds':>10}{'speedup':>10}")
+        print(f"{'PyPDFLoader.load()':<28}{baseline:>10.3f}{1:>10.2f}")
+        for processes in sorted(set(options.processes)):
+            elapsed = asyncio.run(pool_time(file_content, processes, options.repeat))
+            label = f"page parallel, {processes} proc"
+            print(f"{label:<28}{elapsed:>10.3f}{baseline / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import pytest
+
+from app.core.llm.cache import response_cache
+from app.core.llm.clients import chat_model_registry
+from app.core.llm.limiter import provider_limiters
+from app.core.llm.resilience import provider_resilience
+from app.core.llm.semantic_cache import semantic_cache
+from app.core.summarizer.tree import summary_node_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_chat_model_registry():
+    """Make sure chat model clients are not shared between tests"""
+    chat_model_registry.clear()
+    yield
+    chat_model_registry.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Make sure cached answers are not shared between tests"""
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_provider_limiters():
+    """Make sure adapted concurrency limits are not shared between tests"""
+    provider_limiters.clear()
+    yield
+    provider_limiters.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_provider_resilience():
+    """Make sure circuit breakers are not shared between tests"""
+    provider_resilience.clear()
+    yield
+    provider_resilience.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_semantic_cache():
+    """Make sure semantically cached answers are not shared between tests"""
+    semantic_cache.clear()
+    yield
+    semantic_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_summary_node_cache():
+    """Make sure summary tree nodes are not shared between tests"""
+    summary_node_cache.clear()
+    yield
+    summary_node_cache.clear()
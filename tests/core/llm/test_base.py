@@ -42,6 +42,16 @@ def test_get_embeddings_provider_is_abstract():
     assert BaseLLM.get_embeddings_provider.__isabstractmethod__
 
 
+def test_get_chat_model_is_abstract():
+    """Test that get_chat_model is an abstract method"""
+    assert BaseLLM.get_chat_model.__isabstractmethod__
+
+
 def test_ask_is_abstract():
     """Test that ask is an abstract method"""
     assert BaseLLM.ask.__isabstractmethod__
+
+
+def test_stream_ask_is_abstract():
+    """Test that stream_ask is an abstract method"""
+    assert BaseLLM.stream_ask.__isabstractmethod__
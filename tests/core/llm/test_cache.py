@@ -0,0 +1,152 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.llm.cache import CACHE_BYPASS, CACHE_HIT, CACHE_MISS, CACHE_SEMANTIC_HIT
+from app.core.llm.cache import CachedLLM, ResponseCache
+
+
+@pytest.fixture
+def cache():
+    """Fixture to create an enabled ResponseCache"""
+    return ResponseCache(enabled=True, max_size=2, ttl=60)
+
+
+@pytest.fixture
+def llm_provider():
+    """Fixture to create a fake LLM provider answering with temperature 0"""
+    provider = MagicMock()
+    provider.provider_name = "ollama"
+    provider.ask = AsyncMock(
+        side_effect=lambda **kwargs: {
+            "response": f"Answer to {kwargs['query']}",
+            "model": "llama2",
+            "provider": "ollama",
+            "temperature": kwargs["temperature"] or 0.0,
+            "response_max_tokens": 100,
+        }
+    )
+    return provider
+
+
+def test_make_key_normalizes_query():
+    """Test that whitespace and provider case do not change the key"""
+    key = ResponseCache.make_key("ollama", None, "What is  the capital?", 0.0, 100)
+
+    assert ResponseCache.make_key("Ollama", None, " What is the capital? ", None, 100) == key
+    assert ResponseCache.make_key("ollama", "mistral", "What is the capital?", 0.0, 100) != key
+    assert ResponseCache.make_key("ollama", None, "What is the capital?", 0.0, 200) != key
+
+
+def test_lru_eviction(cache):
+    """Test that the least recently used answer is evicted when the cache is full"""
+    cache.set("a", {"response": "a"})
+    cache.set("b", {"response": "b"})
+    cache.get("a")
+    cache.set("c", {"response": "c"})
+
+    assert cache.get("a") == {"response": "a"}
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+def test_ttl_expiration(cache):
+    """Test that answers expire after the time to live"""
+    with patch("app.core.llm.cache.time.monotonic", return_value=100.0):
+        cache.set("a", {"response": "a"})
+
+    with patch("app.core.llm.cache.time.monotonic", return_value=159.0):
+        assert cache.get("a") == {"response": "a"}
+
+    with patch("app.core.llm.cache.time.monotonic", return_value=161.0):
+        assert cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_ask_miss_then_hit(cache, llm_provider):
+    """Test that repeated deterministic questions are answered from the cache"""
+    first, first_status = await cache.ask(llm_provider, "Capital of France?", temperature=0)
+    second, second_status = await cache.ask(llm_provider, "Capital of France?", temperature=0)
+
+    assert (first_status, second_status) == (CACHE_MISS, CACHE_HIT)
+    assert first == second
+    llm_provider.ask.assert_awaited_once()
+
+
+class SemanticHitLLM(CachedLLM):
+    """Fake provider answering every question from its semantic cache"""
+
+    provider_name = "ollama"
+
+    async def ask_cached(self, query, model=None, temperature=None, max_tokens=None):
+        answer = {"response": "Paris", "temperature": 0.0, "similarity": 0.97}
+        return answer, CACHE_SEMANTIC_HIT
+
+
+@pytest.mark.asyncio
+async def test_ask_reports_semantic_hits(cache):
+    """Test that answers of the semantic cache are reported and stored without the similarity"""
+    llm_provider = SemanticHitLLM()
+
+    first, first_status = await cache.ask(llm_provider, "France's capital?", temperature=0)
+    second, second_status = await cache.ask(llm_provider, "France's capital?", temperature=0)
+    _, disabled_status = await ResponseCache(enabled=False).ask(
+        llm_provider, "France's capital?", temperature=0
+    )
+
+    assert (first_status, second_status) == (CACHE_SEMANTIC_HIT, CACHE_HIT)
+    assert disabled_status == CACHE_SEMANTIC_HIT
+    assert first["similarity"] == 0.97
+    assert "similarity" not in second
+
+
+@pytest.mark.asyncio
+async def test_ask_skips_non_zero_temperature(cache, llm_provider):
+    """Test that sampled answers are never cached"""
+    await cache.ask(llm_provider, "Capital of France?", temperature=0.7)
+    _, status = await cache.ask(llm_provider, "Capital of France?", temperature=0.7)
+
+    assert status == CACHE_BYPASS
+    assert llm_provider.ask.await_count == 2
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_ask_bypass_and_refresh(cache, llm_provider):
+    """Test the per-request bypass and refresh controls"""
+    await cache.ask(llm_provider, "Capital of France?", temperature=0)
+
+    _, bypass_status = await cache.ask(
+        llm_provider, "Capital of France?", temperature=0, mode="bypass"
+    )
+    _, refresh_status = await cache.ask(
+        llm_provider, "Capital of France?", temperature=0, mode="refresh"
+    )
+
+    assert (bypass_status, refresh_status) == (CACHE_BYPASS, CACHE_MISS)
+    assert llm_provider.ask.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_ask_disabled_cache(llm_provider):
+    """Test that a disabled cache always asks the provider"""
+    cache = ResponseCache(enabled=False)
+
+    await cache.ask(llm_provider, "Capital of France?", temperature=0)
+    _, status = await cache.ask(llm_provider, "Capital of France?", temperature=0)
+
+    assert status == CACHE_BYPASS
+    assert llm_provider.ask.await_count == 2
@@ -0,0 +1,83 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core.llm.clients import ChatModelRegistry
+
+
+@pytest.fixture
+def registry():
+    """Fixture to create a small ChatModelRegistry"""
+    return ChatModelRegistry(max_size=2)
+
+
+def test_get_creates_client_once(registry):
+    """Test that the factory is only called the first time a key is requested"""
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    first = registry.get(("ollama", "llama2", 0.0, 100), factory)
+    second = registry.get(("ollama", "llama2", 0.0, 100), factory)
+
+    assert first is second
+    factory.assert_called_once()
+    assert len(registry) == 1
+
+
+def test_get_evicts_least_recently_used(registry):
+    """Test that the least recently used client is evicted when the registry is full"""
+    registry.get("a", MagicMock)
+    registry.get("b", MagicMock)
+
+    # Touch "a" so "b" becomes the least recently used client
+    registry.get("a", MagicMock)
+    registry.get("c", MagicMock)
+
+    assert "a" in registry
+    assert "b" not in registry
+    assert "c" in registry
+    assert len(registry) == 2
+
+
+def test_get_transport_is_shared_per_upstream(registry):
+    """Test that every client of an upstream shares one transport"""
+    ollama_transport = registry.get_transport("http://localhost:11434")
+
+    assert registry.get_transport("http://localhost:11434") is ollama_transport
+    assert registry.get_transport("openai") is not ollama_transport
+
+
+def test_get_http_client_is_shared_per_upstream(registry):
+    """Test that every client of an upstream shares one HTTP client on the pooled transport"""
+    http_client = registry.get_http_client("openai")
+
+    assert registry.get_http_client("openai") is http_client
+    assert registry.get_http_client("http://localhost:11434") is not http_client
+    assert http_client._transport is registry.get_transport("openai")
+
+
+@pytest.mark.asyncio
+async def test_aclose_releases_clients_and_transports(registry):
+    """Test that closing the registry drops clients and closes HTTP clients and transports"""
+    registry.get("a", MagicMock)
+    transport = registry.get_transport("openai")
+    http_client = registry.get_http_client("openai")
+
+    await registry.aclose()
+
+    assert len(registry) == 0
+    assert http_client.is_closed
+    assert registry.get_transport("openai") is not transport
+    assert registry.get_http_client("openai") is not http_client
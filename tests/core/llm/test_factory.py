@@ -13,7 +13,7 @@
 #  limitations under the License.
 import pytest
 
-from app.core.llm import get_llm_provider
+from app.core.providers import get_llm_provider
 
 # from app.core.llm.openai import OpenAILLM
 from app.core.llm.ollama import OllamaLLM
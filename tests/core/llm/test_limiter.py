@@ -0,0 +1,162 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.llm.errors import CircuitOpenError
+from app.core.llm.limiter import AdaptiveLimiter, OverloadedError, ProviderLimiters
+from app.core.llm.limiter import is_congestion
+
+
+def make_limiter(**kwargs) -> AdaptiveLimiter:
+    options = {
+        "initial_limit": 2,
+        "min_limit": 1,
+        "max_limit": 4,
+        "max_queue": 1,
+        "latency_threshold": 1.0,
+        "backoff": 0.5,
+    }
+    options.update(kwargs)
+    return AdaptiveLimiter("ollama", "llama2", **options)
+
+
+@pytest.mark.asyncio
+async def test_queue_full_raises_overloaded():
+    """Callers beyond the limit wait in the queue and are rejected once it is full"""
+    limiter = make_limiter()
+    await limiter.acquire()
+    await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 1
+
+    with pytest.raises(OverloadedError) as exc_info:
+        await limiter.acquire()
+    assert exc_info.value.retry_after >= 1
+
+    limiter.release(0.1)
+    await waiter
+    assert limiter.in_flight == 2
+    assert limiter.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    """A cancelled caller does not keep its place in the queue"""
+    limiter = make_limiter(initial_limit=1)
+    await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert limiter.queue_depth == 0
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+def test_limit_adapts_to_outcomes():
+    """The limit grows additively on fast calls and shrinks multiplicatively on failures"""
+    limiter = make_limiter()
+    for _ in range(8):
+        limiter.in_flight += 1
+        limiter.release(0.1)
+    assert limiter.limit > 3
+
+    limit = limiter.limit
+    limiter.in_flight += 1
+    limiter.release(0.1, error=True)
+    assert limiter.limit == pytest.approx(limit / 2)
+
+    limiter.in_flight += 1
+    limiter.release(5.0)
+    assert limiter.limit == pytest.approx(limit / 4)
+
+    for _ in range(4):
+        limiter.in_flight += 1
+        limiter.release(5.0)
+    assert limiter.limit == 1
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"Status {status_code}")
+        self.status_code = status_code
+
+
+def test_is_congestion():
+    """Only timeouts, throttling and server errors show the provider is saturated"""
+    assert is_congestion(TimeoutError())
+    assert is_congestion(httpx.ReadTimeout("Timed out"))
+    assert is_congestion(StatusError(429))
+    assert is_congestion(StatusError(503))
+    assert not is_congestion(StatusError(400))
+    assert not is_congestion(httpx.ConnectError("Connection refused"))
+    assert not is_congestion(ValueError("Invalid summary type"))
+    assert not is_congestion(CircuitOpenError("ollama", 30))
+
+    try:
+        try:
+            raise StatusError(502)
+        except StatusError as e:
+            raise ValueError("Error generating answer") from e
+    except ValueError as e:
+        assert is_congestion(e)
+
+
+@pytest.mark.asyncio
+async def test_slot_releases_on_error():
+    """A failed call frees its slot, only congestion errors lower the limit"""
+    limiter = make_limiter()
+
+    with pytest.raises(ValueError):
+        async with limiter.slot():
+            raise ValueError("Invalid summary type")
+    assert limiter.in_flight == 0
+    assert limiter.limit == 2
+
+    with pytest.raises(StatusError):
+        async with limiter.slot():
+            raise StatusError(503)
+    assert limiter.in_flight == 0
+    assert limiter.limit == 1
+
+
+@pytest.mark.asyncio
+async def test_provider_limiters_are_per_model():
+    """Every provider and model gets its own limiter"""
+    limiters = ProviderLimiters(enabled=True)
+
+    async with limiters.slot("ollama", "llama2"):
+        assert limiters.get("ollama", "llama2").in_flight == 1
+        assert limiters.get("ollama", "mistral").in_flight == 0
+
+    assert [stats["model"] for stats in limiters.stats()] == ["llama2", "mistral"]
+
+
+@pytest.mark.asyncio
+async def test_disabled_provider_limiters():
+    """Disabled limiters neither limit nor track calls"""
+    limiters = ProviderLimiters(enabled=False)
+
+    async with limiters.slot("ollama", "llama2"):
+        pass
+
+    assert limiters.stats() == []
@@ -12,7 +12,8 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import pytest
-from unittest.mock import patch, MagicMock
+from langchain_core.messages import AIMessageChunk
+from unittest.mock import ANY, AsyncMock, patch, MagicMock
 
 from app.core.llm.ollama import OllamaLLM
 from app.core.config import settings
@@ -63,7 +64,7 @@ async def test_ask_with_default_parameters(ollama_llm):
 
         # Set up the mock to return our response
         chat_instance = mock_chat_ollama.return_value
-        chat_instance.invoke.return_value = mock_response
+        chat_instance.ainvoke = AsyncMock(return_value=mock_response)
 
         # Call the ask method
         result = await ollama_llm.ask(query)
@@ -74,10 +75,12 @@ async def test_ask_with_default_parameters(ollama_llm):
             model=settings.ollama_default_model,
             temperature=settings.default_model_temperature,
             num_predict=settings.default_max_tokens,
+            num_ctx=settings.token_budget_min_context,
+            async_client_kwargs={"transport": ANY},
         )
 
-        # Check if invoke was called with the right parameters
-        chat_instance.invoke.assert_called_once_with([("human", query)])
+        # Check if ainvoke was awaited with the right parameters
+        chat_instance.ainvoke.assert_awaited_once_with([("human", query)])
 
         # Check the returned response
         assert result["response"] == "The meaning of life is 42."
@@ -104,7 +107,7 @@ async def test_ask_with_custom_parameters(ollama_llm):
 
         # Set up the mock to return our response
         chat_instance = mock_chat_ollama.return_value
-        chat_instance.invoke.return_value = mock_response
+        chat_instance.ainvoke = AsyncMock(return_value=mock_response)
 
         # Call the ask method with custom parameters
         result = await ollama_llm.ask(
@@ -117,6 +120,8 @@ async def test_ask_with_custom_parameters(ollama_llm):
             model=custom_model,
             temperature=custom_temp,
             num_predict=custom_max_tokens,
+            num_ctx=settings.token_budget_min_context,
+            async_client_kwargs={"transport": ANY},
         )
 
         # Check the returned response
@@ -133,8 +138,85 @@ async def test_ask_exception_handling(ollama_llm):
     # Mock the ChatOllama class to raise an exception
     with patch("app.core.llm.ollama.ChatOllama") as mock_chat_ollama:
         chat_instance = mock_chat_ollama.return_value
-        chat_instance.invoke.side_effect = ValueError("Model not found")
+        chat_instance.ainvoke = AsyncMock(side_effect=ValueError("Model not found"))
 
         # Check if the method raises the expected exception
         with pytest.raises(ValueError, match="Error generating answer"):
             await ollama_llm.ask(query)
+
+
+def test_get_chat_model_sizes_the_context_window_to_the_prompt(ollama_llm):
+    """Test that num_ctx covers the prompt and output instead of the whole model context"""
+    with patch("app.core.llm.ollama.ChatOllama") as mock_chat_ollama:
+        mock_chat_ollama.side_effect = lambda **kwargs: MagicMock()
+
+        ollama_llm.get_chat_model("llama3.1:8b", 0.2, 100, prompt_tokens=10)
+        ollama_llm.get_chat_model("llama3.1:8b", 0.2, 100, prompt_tokens=5000)
+        whole = ollama_llm.get_chat_model("llama3.1:8b", 0.2, 100, prompt_tokens=10**6)
+
+        # Without a prompt size the whole context is used, sharing the client of that window
+        assert ollama_llm.get_chat_model("llama3.1:8b", 0.2, 100) is whole
+        windows = [c.kwargs["num_ctx"] for c in mock_chat_ollama.mock_calls]
+        assert windows == [2048, 8192, settings.model_context_sizes["llama3.1:8b"]]
+
+
+def test_get_chat_model_reuses_clients(ollama_llm):
+    """Test that chat models are reused for the same model and parameters"""
+    with patch("app.core.llm.ollama.ChatOllama") as mock_chat_ollama:
+        mock_chat_ollama.side_effect = lambda **kwargs: MagicMock()
+
+        first = ollama_llm.get_chat_model("llama2", 0.2, 100)
+        second = ollama_llm.get_chat_model("llama2", 0.2, 100)
+        other = ollama_llm.get_chat_model("llama2", 0.5, 100)
+
+        assert first is second
+        assert first is not other
+        assert mock_chat_ollama.call_count == 2
+
+        # Both clients share the same pooled transport
+        transports = [
+            c.kwargs["async_client_kwargs"]["transport"] for c in mock_chat_ollama.mock_calls
+        ]
+        assert transports[0] is transports[1]
+
+
+@pytest.mark.asyncio
+async def test_stream_ask(ollama_llm):
+    """Test stream_ask yields tokens followed by the metadata event"""
+    query = "What is the meaning of life?"
+
+    async def fake_stream(messages):
+        yield AIMessageChunk(content="The meaning ")
+        yield AIMessageChunk(
+            content="of life is 42.",
+            response_metadata={"model": "llama2"},
+            usage_metadata={"input_tokens": 7, "output_tokens": 6, "total_tokens": 13},
+        )
+
+    with patch("app.core.llm.ollama.ChatOllama") as mock_chat_ollama:
+        mock_chat_ollama.return_value.astream = fake_stream
+
+        events = [event async for event in ollama_llm.stream_ask(query)]
+
+    assert [event["event"] for event in events] == ["token", "token", "metadata"]
+    assert "".join(event["data"]["content"] for event in events[:2]) == (
+        "The meaning of life is 42."
+    )
+    assert events[2]["data"]["model"] == "llama2"
+    assert events[2]["data"]["provider"] == "ollama"
+    assert events[2]["data"]["usage"]["output_tokens"] == 6
+
+
+@pytest.mark.asyncio
+async def test_stream_ask_exception_handling(ollama_llm):
+    """Test exception handling in the stream_ask method"""
+
+    async def failing_stream(messages):
+        raise ValueError("Model not found")
+        yield
+
+    with patch("app.core.llm.ollama.ChatOllama") as mock_chat_ollama:
+        mock_chat_ollama.return_value.astream = failing_stream
+
+        with pytest.raises(ValueError, match="Error generating answer"):
+            [event async for event in ollama_llm.stream_ask("What is the meaning of life?")]
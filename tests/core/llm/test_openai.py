@@ -12,7 +12,8 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import pytest
-from unittest.mock import patch
+from langchain_core.messages import AIMessageChunk
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
 from app.core.llm.openai import OpenAILLM
 from app.core.config import settings
@@ -51,6 +52,17 @@ def test_get_embeddings_provider(openai_llm):
         )
 
 
+def test_get_chat_model_shares_one_http_client(openai_llm):
+    """Test that chat models built on registry misses reuse the registry's HTTP client"""
+    with patch("app.core.llm.openai.ChatOpenAI") as mock_chat_openai:
+        openai_llm.get_chat_model("gpt-4o-mini", 0.0, 100)
+        openai_llm.get_chat_model("gpt-4o-mini", 0.5, 200)
+
+    assert mock_chat_openai.call_count == 2
+    first, second = (call.kwargs["http_async_client"] for call in mock_chat_openai.call_args_list)
+    assert first is second
+
+
 @pytest.mark.asyncio
 async def test_ask_with_default_parameters(openai_llm):
     """Test ask method with default parameters"""
@@ -59,11 +71,12 @@ async def test_ask_with_default_parameters(openai_llm):
     # Mock the ChatOpenAI class
     with patch("app.core.llm.openai.ChatOpenAI") as mock_chat_openai:
         # Create a mock for the response
-        mock_response = "The meaning of life is 42."
+        mock_response = MagicMock()
+        mock_response.content = "The meaning of life is 42."
 
         # Set up the mock to return our response
         chat_instance = mock_chat_openai.return_value
-        chat_instance.invoke.return_value = mock_response
+        chat_instance.ainvoke = AsyncMock(return_value=mock_response)
 
         # Call the ask method
         result = await openai_llm.ask(query)
@@ -74,13 +87,16 @@ async def test_ask_with_default_parameters(openai_llm):
             temperature=settings.default_model_temperature,
             model_name=settings.openai_default_model,
             max_tokens=settings.default_max_tokens,
+            stream_usage=True,
+            max_retries=0,
+            http_async_client=ANY,
         )
 
-        # Check if invoke was called with the right parameters
-        chat_instance.invoke.assert_called_once_with([("human", query)])
+        # Check if ainvoke was awaited with the right parameters
+        chat_instance.ainvoke.assert_awaited_once_with([("human", query)])
 
         # Check the returned response
-        assert result["response"] == mock_response
+        assert result["response"] == "The meaning of life is 42."
         assert result["model"] == settings.openai_default_model
         assert result["provider"] == "openai"
         assert result["temperature"] == settings.default_model_temperature
@@ -98,11 +114,12 @@ async def test_ask_with_custom_parameters(openai_llm):
     # Mock the ChatOpenAI class
     with patch("app.core.llm.openai.ChatOpenAI") as mock_chat_openai:
         # Create a mock for the response
-        mock_response = "The meaning of life is 42."
+        mock_response = MagicMock()
+        mock_response.content = "The meaning of life is 42."
 
         # Set up the mock to return our response
         chat_instance = mock_chat_openai.return_value
-        chat_instance.invoke.return_value = mock_response
+        chat_instance.ainvoke = AsyncMock(return_value=mock_response)
 
         # Call the ask method with custom parameters
         result = await openai_llm.ask(
@@ -115,6 +132,9 @@ async def test_ask_with_custom_parameters(openai_llm):
             temperature=custom_temp,
             model_name=custom_model,
             max_tokens=custom_max_tokens,
+            stream_usage=True,
+            max_retries=0,
+            http_async_client=ANY,
         )
 
         # Check the returned response
@@ -131,8 +151,33 @@ async def test_ask_exception_handling(openai_llm):
     # Mock the ChatOpenAI class to raise an exception
     with patch("app.core.llm.openai.ChatOpenAI") as mock_chat_openai:
         chat_instance = mock_chat_openai.return_value
-        chat_instance.invoke.side_effect = ValueError("API key not valid")
+        chat_instance.ainvoke = AsyncMock(side_effect=ValueError("API key not valid"))
 
         # Check if the method raises the expected exception
         with pytest.raises(ValueError, match="Error generating answer"):
             await openai_llm.ask(query)
+
+
+@pytest.mark.asyncio
+async def test_stream_ask(openai_llm):
+    """Test stream_ask yields tokens followed by the metadata event"""
+    query = "What is the meaning of life?"
+
+    async def fake_stream(messages):
+        yield AIMessageChunk(content="The meaning ")
+        yield AIMessageChunk(
+            content="of life is 42.",
+            usage_metadata={"input_tokens": 7, "output_tokens": 6, "total_tokens": 13},
+        )
+
+    with patch("app.core.llm.openai.ChatOpenAI") as mock_chat_openai:
+        mock_chat_openai.return_value.astream = fake_stream
+
+        events = [event async for event in openai_llm.stream_ask(query)]
+
+    assert events[0] == {"event": "token", "data": {"content": "The meaning "}}
+    assert events[1] == {"event": "token", "data": {"content": "of life is 42."}}
+    assert events[2]["event"] == "metadata"
+    assert events[2]["data"]["model"] == settings.openai_default_model
+    assert events[2]["data"]["provider"] == "openai"
+    assert events[2]["data"]["usage"]["total_tokens"] == 13
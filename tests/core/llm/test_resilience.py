@@ -0,0 +1,226 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.core.llm.errors import CircuitOpenError, UpstreamError
+from app.core.llm.limiter import provider_limiters
+from app.core.llm.resilience import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN
+from app.core.llm.resilience import ProviderResilience, backoff_delay, is_retryable
+
+
+@pytest.fixture
+def resilience():
+    """Fixture to create a ProviderResilience with short delays"""
+    return ProviderResilience(
+        timeout=0.1,
+        max_attempts=3,
+        base_delay=0.001,
+        max_delay=0.01,
+        failure_threshold=2,
+        reset_timeout=60,
+    )
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"Status {status_code}")
+        self.status_code = status_code
+
+
+def test_is_retryable():
+    """Only transient upstream errors are retryable, also when wrapped"""
+    assert is_retryable(httpx.ConnectError("Connection refused"))
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(StatusError(503))
+    assert is_retryable(StatusError(429))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError("Invalid summary type"))
+    assert not is_retryable(CircuitOpenError("ollama", 30))
+
+    try:
+        try:
+            raise httpx.ReadTimeout("Timed out")
+        except httpx.ReadTimeout as e:
+            raise ValueError("Error generating answer") from e
+    except ValueError as e:
+        assert is_retryable(e)
+
+
+def test_backoff_delay_is_capped():
+    """Backoff delays grow exponentially up to the maximum delay"""
+    assert all(0 <= backoff_delay(1, 0.5, 8) <= 0.5 for _ in range(20))
+    assert all(0 <= backoff_delay(10, 0.5, 8) <= 8 for _ in range(20))
+
+
+@pytest.mark.asyncio
+async def test_call_retries_retryable_errors(resilience):
+    """Retryable errors are retried until the call succeeds"""
+    call = AsyncMock(side_effect=[httpx.ConnectError("Connection refused"), "answer"])
+
+    assert await resilience.call("ollama", call) == "answer"
+    assert call.await_count == 2
+    assert resilience.get_breaker("ollama").state == CIRCUIT_CLOSED
+
+
+@pytest.mark.asyncio
+async def test_call_holds_a_limiter_slot_per_attempt(resilience):
+    """Every attempt holds a slot of the model limiter, the backoff between attempts does not"""
+    limiter = provider_limiters.get("ollama", "llama2")
+    in_flight = []
+
+    async def call():
+        in_flight.append(limiter.in_flight)
+        if len(in_flight) == 1:
+            raise httpx.ConnectError("Connection refused")
+        return "answer"
+
+    with patch("app.core.llm.resilience.backoff_delay", return_value=0.05):
+        attempts = asyncio.create_task(resilience.call("ollama", call, "llama2"))
+        while not in_flight:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.001)
+        assert limiter.in_flight == 0
+        assert await attempts == "answer"
+
+    assert in_flight == [1, 1]
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_guard_raises_upstream_errors(resilience):
+    """Streamed calls failing upstream raise an UpstreamError, other errors are left alone"""
+    with pytest.raises(UpstreamError) as exc_info:
+        async with resilience.guard("ollama"):
+            raise StatusError(503)
+    assert exc_info.value.status_code == 502
+
+    with pytest.raises(StatusError):
+        async with resilience.guard("ollama"):
+            raise StatusError(400)
+
+
+@pytest.mark.asyncio
+async def test_stream_deadline(resilience):
+    """Stalled streams time out with a 504 and release their slot, slow consumers do not"""
+    closed = []
+
+    async def stalling_stream():
+        try:
+            yield "first"
+            yield "second"
+            await asyncio.sleep(10)
+            yield "never"
+        finally:
+            closed.append(True)
+
+    chunks = []
+    with pytest.raises(UpstreamError) as exc_info:
+        async for chunk in resilience.stream("ollama", stalling_stream(), "llama2"):
+            chunks.append(chunk)
+            # Time spent by the consumer does not count against the deadline
+            await asyncio.sleep(0.15)
+
+    assert exc_info.value.status_code == 504
+    assert chunks == ["first", "second"]
+    assert closed == [True]
+    assert provider_limiters.get("ollama", "llama2").in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_call_does_not_retry_other_errors(resilience):
+    """Non retryable errors are raised right away"""
+    call = AsyncMock(side_effect=StatusError(400))
+
+    with pytest.raises(StatusError):
+        await resilience.call("ollama", call)
+    assert call.await_count == 1
+    assert resilience.get_breaker("ollama").failures == 0
+
+
+@pytest.mark.asyncio
+async def test_call_deadline(resilience):
+    """Hung calls time out with a 504 and are not generated again on a saturated provider"""
+
+    resilience.failure_threshold = 5
+    attempts = 0
+
+    async def hung_call():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(10)
+
+    with pytest.raises(UpstreamError) as exc_info:
+        await resilience.call("ollama", hung_call)
+    assert exc_info.value.status_code == 504
+    assert isinstance(exc_info.value.__cause__, TimeoutError)
+    assert attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_fails_fast(resilience):
+    """The circuit opens after consecutive failures and calls fail without reaching upstream"""
+    resilience.max_attempts = 1
+    call = AsyncMock(side_effect=httpx.ConnectError("Connection refused"))
+
+    for _ in range(2):
+        with pytest.raises(UpstreamError) as exc_info:
+            await resilience.call("ollama", call)
+        assert exc_info.value.status_code == 502
+
+    with pytest.raises(CircuitOpenError) as exc_info:
+        await resilience.call("ollama", call)
+    assert exc_info.value.retry_after > 1
+    assert call.await_count == 2
+    assert resilience.get_breaker("ollama").state == CIRCUIT_OPEN
+    assert resilience.get_breaker("openai").state == CIRCUIT_CLOSED
+
+
+@pytest.mark.asyncio
+async def test_circuit_half_open_trial(resilience):
+    """After the reset timeout a single trial call decides whether the circuit closes"""
+    breaker = resilience.get_breaker("ollama")
+    breaker.record_failure()
+    breaker.record_failure()
+
+    with patch("app.core.llm.resilience.time.monotonic", return_value=breaker.opened_at + 61):
+        breaker.before_call()
+        assert breaker.state == CIRCUIT_HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        assert breaker.state == CIRCUIT_CLOSED
+        breaker.before_call()
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_before_waiting_for_a_slot(resilience):
+    """Calls to an open circuit are rejected right away, not after queuing for a slot"""
+    breaker = resilience.get_breaker("ollama")
+    breaker.record_failure()
+    breaker.record_failure()
+    call = AsyncMock(return_value="answer")
+
+    with patch("app.core.llm.limiter.settings.limiter_initial_limit", 1):
+        async with provider_limiters.slot("ollama", "llama2"):
+            async with asyncio.timeout(1):
+                with pytest.raises(CircuitOpenError):
+                    await resilience.call("ollama", call, "llama2")
+
+    call.assert_not_awaited()
+    assert provider_limiters.get("ollama", "llama2").queue_depth == 0
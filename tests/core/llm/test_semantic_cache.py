@@ -0,0 +1,159 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+
+from app.core.llm.cache import CACHE_MISS, CACHE_SEMANTIC_HIT
+from app.core.llm.limiter import provider_limiters
+from app.core.llm.semantic_cache import SemanticCache, VectorIndex
+
+
+EMBEDDINGS = {
+    "What is the capital of France?": [1.0, 0.0, 0.1],
+    "what's France's capital": [0.98, 0.0, 0.15],
+    "How tall is Mount Everest?": [0.0, 1.0, 0.0],
+}
+
+
+@pytest.fixture
+def llm_provider():
+    """Fixture to create a fake LLM provider with a fake embeddings model"""
+    provider = MagicMock()
+    provider.provider_name = "ollama"
+    provider.ask = AsyncMock(
+        side_effect=lambda **kwargs: {
+            "response": f"Answer to {kwargs['query']}",
+            "model": "llama2",
+            "provider": "ollama",
+            "temperature": 0.0,
+            "response_max_tokens": 100,
+        }
+    )
+    embeddings = MagicMock()
+    embeddings.model = "all-minilm"
+    embeddings.aembed_query = AsyncMock(side_effect=lambda query: EMBEDDINGS[query])
+    provider.get_embeddings_provider.return_value = embeddings
+    return provider
+
+
+@pytest.fixture
+def cache():
+    """Fixture to create an enabled SemanticCache"""
+    return SemanticCache(enabled=True, threshold=0.95, max_size=2, ttl=60)
+
+
+def test_vector_index_search():
+    """The most similar live vector of the namespace is found"""
+    index = VectorIndex(max_size=4)
+    index.add("a", VectorIndex.normalize([1, 0]), {"response": "x"}, expires_at=10, now=0)
+    index.add("a", VectorIndex.normalize([0, 1]), {"response": "y"}, expires_at=10, now=0)
+    index.add("b", VectorIndex.normalize([1, 1]), {"response": "z"}, expires_at=10, now=0)
+
+    value, similarity = index.search("a", VectorIndex.normalize([1, 0.1]), now=1)
+    assert value == {"response": "x"}
+    assert similarity == pytest.approx(1 / np.sqrt(1.01))
+
+    assert index.search("a", VectorIndex.normalize([1, 0]), now=11) is None
+    assert index.search("c", VectorIndex.normalize([1, 0]), now=1) is None
+
+
+def test_vector_index_evicts_least_recently_used():
+    """When full, the least recently used entry is replaced"""
+    index = VectorIndex(max_size=2)
+    index.add("a", VectorIndex.normalize([1, 0]), {"response": "x"}, expires_at=10, now=0)
+    index.add("a", VectorIndex.normalize([0, 1]), {"response": "y"}, expires_at=10, now=1)
+    index.search("a", VectorIndex.normalize([1, 0]), now=2)
+    index.add("a", VectorIndex.normalize([1, 1]), {"response": "z"}, expires_at=10, now=3)
+
+    assert len(index) == 2
+    assert index.search("a", VectorIndex.normalize([0, 1]), now=4)[0] == {"response": "z"}
+
+
+def test_vector_index_near_misses_are_not_used():
+    """Searches below the threshold find nothing and do not refresh the entry"""
+    index = VectorIndex(max_size=2)
+    index.add("a", VectorIndex.normalize([1, 0]), {"response": "x"}, expires_at=10, now=0)
+    index.add("a", VectorIndex.normalize([0, 1]), {"response": "y"}, expires_at=10, now=1)
+
+    assert index.search("a", VectorIndex.normalize([1, 0.5]), now=2, threshold=0.95) is None
+    index.add("a", VectorIndex.normalize([1, 1]), {"response": "z"}, expires_at=10, now=3)
+
+    assert index.search("a", VectorIndex.normalize([1, 0]), now=4)[0] == {"response": "z"}
+
+
+@pytest.mark.asyncio
+async def test_paraphrase_is_answered_from_cache(cache, llm_provider):
+    """A paraphrased question reuses the earlier answer and reports the similarity"""
+    first, first_status = await cache.ask(
+        llm_provider, llm_provider, "What is the capital of France?", None, 0
+    )
+    second, second_status = await cache.ask(
+        llm_provider, llm_provider, "what's France's capital", None, 0
+    )
+    other, _ = await cache.ask(llm_provider, llm_provider, "How tall is Mount Everest?", None, 0)
+
+    assert (first_status, second_status) == (CACHE_MISS, CACHE_SEMANTIC_HIT)
+    assert "similarity" not in first
+    assert second["response"] == first["response"]
+    assert second["similarity"] >= 0.95
+    assert other["response"] == "Answer to How tall is Mount Everest?"
+    assert llm_provider.ask.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_other_models_and_temperatures_are_not_shared(cache, llm_provider):
+    """Answers are only reused for the same model and deterministic questions"""
+    await cache.ask(llm_provider, llm_provider, "What is the capital of France?", None, 0)
+    await cache.ask(llm_provider, llm_provider, "what's France's capital", "mistral", 0)
+    await cache.ask(llm_provider, llm_provider, "what's France's capital", None, 0.7)
+
+    assert llm_provider.ask.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_embedding_errors_do_not_fail_questions(cache, llm_provider):
+    """The question is answered by the provider when embedding fails"""
+    embeddings = llm_provider.get_embeddings_provider.return_value
+    embeddings.aembed_query.side_effect = ConnectionError("Embeddings model not pulled")
+
+    result, _ = await cache.ask(
+        llm_provider, llm_provider, "What is the capital of France?", None, 0
+    )
+
+    assert result["response"] == "Answer to What is the capital of France?"
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_embeddings_are_skipped(llm_provider):
+    """Embeddings run in a slot of their model's limiter and are abandoned past their deadline"""
+    cache = SemanticCache(enabled=True, threshold=0.95, max_size=2, ttl=60, embed_timeout=0.01)
+
+    async def slow_embedding(query):
+        await asyncio.sleep(1)
+
+    embeddings = llm_provider.get_embeddings_provider.return_value
+    embeddings.aembed_query.side_effect = slow_embedding
+
+    result, _ = await cache.ask(
+        llm_provider, llm_provider, "What is the capital of France?", None, 0
+    )
+
+    assert result["response"] == "Answer to What is the capital of France?"
+    assert len(cache) == 0
+    (limiter,) = provider_limiters.stats()
+    assert (limiter["model"], limiter["in_flight"]) == ("all-minilm", 0)
@@ -0,0 +1,549 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+import itertools
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+from app.core.budget import STRATEGY_CHUNKED, STRATEGY_EXTRACTIVE, STRATEGY_MAP_REDUCE
+from app.core.budget import STRATEGY_NONE, STRATEGY_TREE
+from app.core.budget import TokenBudget, documents_tokens
+from app.core.llm.errors import UpstreamError
+from app.core.llm.limiter import provider_limiters
+from app.core.summarizer.ollama import OllamaSummarizer
+from app.core.summarizer.tree import summary_node_cache
+from tests.helpers import build_pdf
+
+
+METADATA = {"model": "fake", "provider": "ollama", "source": "text"}
+
+
+@pytest.fixture
+def summarizer():
+    """Fixture to create an OllamaSummarizer instance"""
+    return OllamaSummarizer()
+
+
+def fake_llm(summary: str) -> GenericFakeChatModel:
+    """Fake chat model streaming the summary word by word"""
+    return GenericFakeChatModel(messages=iter([AIMessage(content=summary)]))
+
+
+@pytest.mark.asyncio
+async def test_generate_text_summary(summarizer):
+    """Test generating a text summary with the stuff chain"""
+    generated = await summarizer.generate_text_summary(
+        "concise", fake_llm("A short summary"), "Some long text"
+    )
+
+    assert generated["summary"] == "A short summary"
+    assert (generated["strategy"], generated["chunks"]) == (STRATEGY_NONE, 0)
+    assert set(generated["timings"]) == {"summary"}
+
+
+@pytest.mark.asyncio
+async def test_generate_text_summary_invalid_type(summarizer):
+    """Test that an unknown summary type raises an exception"""
+    with pytest.raises(ValueError, match="Error generating text summary"):
+        await summarizer.generate_text_summary("unknown", fake_llm("summary"), "Some text")
+
+
+@pytest.mark.asyncio
+async def test_stream_text_summary(summarizer):
+    """Test that text summaries are streamed as tokens and end with the summary event"""
+    events = [
+        event
+        async for event in summarizer.stream_text_summary(
+            "concise", fake_llm("A short summary"), "Some long text", METADATA
+        )
+    ]
+
+    assert events[0] == {"event": "progress", "data": {"phase": "prompting", "documents": 1}}
+    tokens = [event["data"]["content"] for event in events if event["event"] == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == "A short summary"
+    assert events[-1]["event"] == "summary"
+    assert events[-1]["data"] == {
+        **METADATA,
+        "summary": "A short summary",
+        "strategy": STRATEGY_NONE,
+        "chunks": 0,
+        "timings": events[-1]["data"]["timings"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_stream_pdf_summary_reports_extraction_progress(summarizer):
+    """Test that extraction progress is reported before the summary tokens"""
+    file_content = build_pdf(["First page", "Second page"])
+
+    events = [
+        event
+        async for event in summarizer.stream_pdf_summary(
+            "concise", fake_llm("PDF summary"), file_content, METADATA
+        )
+    ]
+
+    assert events[0] == {"event": "progress", "data": {"phase": "extracting"}}
+    assert events[1] == {"event": "progress", "data": {"phase": "extracted", "pages": 2}}
+    assert events[2] == {"event": "progress", "data": {"phase": "prompting", "documents": 2}}
+    assert events[-1]["data"]["summary"] == "PDF summary"
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_sends_partial_result_on_error(summarizer):
+    """Test that the summary generated so far is sent when the generation fails"""
+
+    async def failing_stream(inputs):
+        yield "Partial "
+        yield "summary"
+        raise RuntimeError("Connection lost")
+
+    chain = MagicMock()
+    chain.astream = failing_stream
+    summarizer.get_summary_chain = MagicMock(return_value=chain)
+
+    events = []
+    with pytest.raises(ValueError, match="Error generating text summary"):
+        async for event in summarizer.stream_text_summary(
+            "concise", fake_llm("unused"), "Some text", METADATA
+        ):
+            events.append(event)
+
+    assert events[-1] == {"event": "partial", "data": {"summary": "Partial summary"}}
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_sends_partial_result_when_the_connection_drops(summarizer):
+    """Test that the summary generated so far is sent when the upstream connection drops"""
+
+    async def dropped_stream(inputs):
+        yield "Partial "
+        yield "summary"
+        raise httpx.ReadError("Connection reset by peer")
+
+    chain = MagicMock()
+    chain.astream = dropped_stream
+    summarizer.get_summary_chain = MagicMock(return_value=chain)
+
+    events = []
+    with pytest.raises(UpstreamError):
+        async for event in summarizer.stream_text_summary(
+            "concise", fake_llm("unused"), "Some text", METADATA
+        ):
+            events.append(event)
+
+    assert events[-1] == {"event": "partial", "data": {"summary": "Partial summary"}}
+
+
+def small_budget() -> TokenBudget:
+    """Budget leaving about 50 input tokens to the concise summary prompt"""
+    return TokenBudget(context_size=200, max_output_tokens=50, reserved_tokens=50)
+
+
+def small_budget_with(strategy: str) -> TokenBudget:
+    """Small budget fitting overflowing documents with the strategy given"""
+    budget = small_budget()
+    budget.overflow_strategy = strategy
+    return budget
+
+
+@pytest.mark.asyncio
+async def test_fit_documents_within_budget(summarizer):
+    """Documents fitting the budget are prompted as they are"""
+    docs = [Document(page_content="Short text")]
+
+    fitted, strategy = await summarizer.fit_documents("concise", fake_llm("unused"), docs, None)
+    assert (fitted, strategy) == (docs, STRATEGY_NONE)
+
+    fitted, strategy = await summarizer.fit_documents(
+        "concise", fake_llm("unused"), docs, small_budget()
+    )
+    assert (fitted, strategy) == (docs, STRATEGY_NONE)
+
+
+@pytest.mark.asyncio
+async def test_fit_documents_extractive_never_drops_every_sentence(summarizer):
+    """Documents with no sentence boundaries are cut to the budget rather than emptied"""
+    docs = [Document(page_content="cell " * 60)]
+
+    fitted, strategy = await summarizer.fit_documents(
+        "concise", fake_llm("unused"), docs, small_budget_with(STRATEGY_EXTRACTIVE)
+    )
+
+    assert strategy == STRATEGY_EXTRACTIVE
+    assert 0 < documents_tokens(fitted) < documents_tokens(docs)
+
+
+@pytest.mark.asyncio
+async def test_fit_documents_pre_compresses_to_the_ratio(summarizer):
+    """Documents are reduced to their key sentences before fitting them in the budget"""
+    sentences = [f"Sentence {index} talks about solar panels and sunlight." for index in range(40)]
+    docs = [Document(page_content=" ".join(sentences))]
+    budget = TokenBudget(context_size=10000, max_output_tokens=50, compression_ratio=0.25)
+
+    events = [
+        event
+        async for event in summarizer.fit_documents_events(
+            "concise", fake_llm("unused"), docs, budget
+        )
+    ]
+
+    fitted = events[-1]["data"]
+    assert fitted["strategy"] == STRATEGY_NONE
+    assert fitted["compression"] == {
+        "input_tokens": documents_tokens(docs),
+        "compressed_tokens": documents_tokens(fitted["documents"]),
+    }
+    assert documents_tokens(fitted["documents"]) <= documents_tokens(docs) / 4
+    assert set(fitted["timings"]) == {"compression"}
+
+
+@pytest.mark.asyncio
+async def test_fit_documents_pre_compresses_unpunctuated_text(summarizer):
+    """Text without sentence boundaries is chunked and ranked rather than compressed to nothing"""
+    filler = " ".join(f"unrelated{index}" for index in range(400))
+    topic = " ".join(["solar panels convert sunlight"] * 200)
+    docs = [Document(page_content=f"{filler} {topic}")]
+    budget = TokenBudget(context_size=100000, max_output_tokens=50, compression_ratio=0.3)
+
+    fitted, _ = await summarizer.fit_documents("concise", fake_llm("unused"), docs, budget)
+
+    tokens = documents_tokens(docs)
+    assert 0.2 * tokens < documents_tokens(fitted) <= 0.3 * tokens + 1
+    assert "solar panels" in fitted[0].page_content
+    assert "unrelated0 " not in fitted[0].page_content
+
+
+@pytest.mark.asyncio
+async def test_fit_documents_chunked(summarizer):
+    """Documents far over the budget are summarized in chunks fitting the budget"""
+    llm = GenericFakeChatModel(messages=itertools.repeat(AIMessage(content="Chunk summary")))
+    docs = [Document(page_content="word " * 200, metadata={"page": page}) for page in range(3)]
+
+    fitted, strategy = await summarizer.fit_documents(
+        "concise", llm, docs, small_budget_with(STRATEGY_CHUNKED)
+    )
+
+    assert strategy == STRATEGY_CHUNKED
+    assert all(doc.page_content == "Chunk summary" for doc in fitted)
+    assert documents_tokens(fitted) <= 50
+
+
+class ConcurrencyTrackingChain:
+    """Summary chain recording how many chunks are summarized at the same time"""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.running += 1
+        self.calls += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return "Chunk summary"
+
+
+@pytest.mark.asyncio
+async def test_fit_documents_map_reduce_bounds_concurrency(summarizer):
+    """Chunks are summarized concurrently, at most TOKEN_BUDGET_MAP_CONCURRENCY at a time"""
+    chain = ConcurrencyTrackingChain()
+    summarizer.get_summary_chain = MagicMock(return_value=chain)
+    docs = [Document(page_content="word " * 200, metadata={"page": page}) for page in range(3)]
+
+    with patch("app.core.summarizer.base.settings.token_budget_map_concurrency", 2):
+        fitted, strategy = await summarizer.fit_documents(
+            "concise", fake_llm("unused"), docs, small_budget_with(STRATEGY_MAP_REDUCE)
+        )
+    assert strategy == STRATEGY_MAP_REDUCE
+    assert chain.calls > 2
+    assert chain.max_running == 2
+    assert documents_tokens(fitted) <= 50
+
+    # The same chunks would be reused from the first summary
+    summary_node_cache.clear()
+    chain = ConcurrencyTrackingChain()
+    summarizer.get_summary_chain = MagicMock(return_value=chain)
+    await summarizer.fit_documents(
+        "concise", fake_llm("unused"), docs, small_budget_with(STRATEGY_CHUNKED)
+    )
+    assert chain.max_running == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_map_reduce_requests_share_the_provider_limit(summarizer):
+    """Every chunk call takes a slot of the model limiter, shared with the other requests"""
+    chain = ConcurrencyTrackingChain()
+    summarizer.get_summary_chain = MagicMock(return_value=chain)
+    summarizer.get_node_chain = MagicMock(return_value=chain)
+    llm = SimpleNamespace(model="llama2", temperature=0.0)
+    docs = [
+        Document(page_content=distinct_words(200), metadata={"page": page}) for page in range(3)
+    ]
+
+    with (
+        patch("app.core.llm.limiter.settings.limiter_initial_limit", 3),
+        patch("app.core.llm.limiter.settings.limiter_max_limit", 3),
+        patch("app.core.llm.limiter.settings.limiter_max_queue", 100),
+        patch("app.core.summarizer.base.settings.token_budget_map_concurrency", 4),
+    ):
+        # Another call to the model, e.g. from /llm/ask, holds one of the slots
+        async with provider_limiters.slot("ollama", "llama2"):
+            await asyncio.gather(
+                *(
+                    summarizer.fit_documents("concise", llm, docs, small_budget_with(strategy))
+                    for strategy in (STRATEGY_MAP_REDUCE, STRATEGY_MAP_REDUCE, STRATEGY_TREE)
+                )
+            )
+
+    assert chain.calls > 4
+    assert chain.max_running == 2
+    assert [(stats["provider"], stats["model"]) for stats in provider_limiters.stats()] == [
+        ("ollama", "llama2")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_reduces_summaries_recursively(summarizer):
+    """Chunk summaries still over the budget are summarized again in reduce rounds"""
+    llm = GenericFakeChatModel(messages=itertools.repeat(AIMessage(content="summary " * 5)))
+    docs = [Document(page_content="word " * 400)]
+
+    events = [
+        event
+        async for event in summarizer.map_reduce_events("concise", llm, docs, 50, concurrency=4)
+    ]
+
+    phases = {event["data"]["phase"] for event in events if event["event"] == "progress"}
+    assert phases == {"summarizing_chunks", "reducing"}
+    reduced = events[-1]["data"]
+    assert reduced["chunks"] == 10
+    assert set(reduced["timings"]) == {"map", "reduce"}
+    assert documents_tokens(reduced["documents"]) <= 50
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_retry_reuses_finished_chunks(summarizer):
+    """A retry only summarizes the chunks that did not finish, for the same summary type"""
+    docs = [Document(page_content=distinct_words(500))]
+    summarizer.get_summary_chain = MagicMock(return_value=CountingChain(fail_on=3))
+
+    with pytest.raises(RuntimeError, match="Node failed"):
+        async for _ in summarizer.map_reduce_events(
+            "concise", fake_llm("unused"), docs, 50, concurrency=1
+        ):
+            pass
+
+    chain = CountingChain()
+    summarizer.get_summary_chain = MagicMock(return_value=chain)
+    events = [
+        event
+        async for event in summarizer.map_reduce_events(
+            "concise", fake_llm("unused"), docs, 50, concurrency=1
+        )
+    ]
+    # Every chunk but the failed one was summarized and cached before the failure
+    reduced = events[-1]["data"]
+    assert reduced["reuse"] == {"chunks_reused": reduced["chunks"] - 1}
+
+    other_type = [
+        event
+        async for event in summarizer.map_reduce_events(
+            "detailed", fake_llm("unused"), docs, 50, concurrency=1
+        )
+    ]
+    assert other_type[-1]["data"]["reuse"] == {"chunks_reused": 0}
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_cancels_chunks_on_error(summarizer):
+    """A failing chunk stops the chunks still being summarized"""
+    cancelled = []
+
+    class FailingChain:
+        async def ainvoke(self, inputs):
+            if inputs["context"][0].metadata["page"] == 0:
+                raise RuntimeError("Chunk failed")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(inputs["context"][0].metadata["page"])
+                raise
+
+    summarizer.get_summary_chain = MagicMock(return_value=FailingChain())
+    docs = [Document(page_content="word " * 200, metadata={"page": page}) for page in range(3)]
+
+    with pytest.raises(RuntimeError, match="Chunk failed"):
+        async for _ in summarizer.map_reduce_events(
+            "concise", fake_llm("unused"), docs, 50, concurrency=3
+        ):
+            pass
+
+    assert cancelled
+
+
+def distinct_words(count: int) -> str:
+    """Text of count different words of 4 characters, so no two chunks are the same"""
+    return " ".join(f"w{index:03d}" for index in range(count))
+
+
+class CountingChain:
+    """Summary chain counting the nodes it summarizes, failing on the given call"""
+
+    def __init__(self, fail_on: int = 0, words: int = 0):
+        self.calls = 0
+        self.fail_on = fail_on
+        self.words = words
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError("Node failed")
+        return f"Node summary {self.calls}" + " details" * self.words
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_builds_tiers_with_the_fan_in(summarizer):
+    """Chunk summaries are summarized again in groups of at most fan_in nodes"""
+    summarizer.get_node_chain = MagicMock(return_value=CountingChain())
+    docs = [Document(page_content=distinct_words(500))]
+
+    events = [
+        event
+        async for event in summarizer.tree_reduce_events(
+            fake_llm("unused"), docs, 50, 5, fan_in=3, concurrency=4
+        )
+    ]
+
+    tiers = {}
+    for event in events[:-1]:
+        tiers[event["data"]["tier"]] = event["data"]["nodes"]
+    reduced = events[-1]["data"]
+    assert tiers[0] == reduced["chunks"]
+    assert tiers[len(tiers) - 1] == 1
+    for tier in range(1, len(tiers)):
+        assert tiers[tier - 1] / 6 <= tiers[tier] < tiers[tier - 1]
+    assert reduced["reuse"] == {"chunks_reused": 0, "nodes": sum(tiers.values()), "nodes_reused": 0}
+    assert len(reduced["documents"]) == 1
+    assert set(reduced["timings"]) == {"map", "reduce"}
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_reuses_nodes_across_summary_types(summarizer):
+    """Another summary type of the same content reuses every node of the tree"""
+    llm = GenericFakeChatModel(messages=itertools.repeat(AIMessage(content="Final summary")))
+    chain = CountingChain()
+    summarizer.get_node_chain = MagicMock(return_value=chain)
+    docs = [Document(page_content=distinct_words(1000))]
+    budget = small_budget_with(STRATEGY_TREE)
+
+    concise = await summarizer.summarize_documents("concise", llm, docs, budget)
+    calls = chain.calls
+    detailed = await summarizer.summarize_documents("detailed", llm, docs, budget)
+
+    assert concise["strategy"] == detailed["strategy"] == STRATEGY_TREE
+    assert calls > concise["chunks"]
+    assert chain.calls == calls
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_retry_reuses_finished_nodes(summarizer):
+    """A retry after a failed node only summarizes the nodes that did not finish"""
+    docs = [Document(page_content=distinct_words(500))]
+    summarizer.get_node_chain = MagicMock(return_value=CountingChain(fail_on=5))
+
+    with pytest.raises(RuntimeError, match="Node failed"):
+        async for _ in summarizer.tree_reduce_events(
+            fake_llm("unused"), docs, 50, 5, fan_in=3, concurrency=1
+        ):
+            pass
+
+    chain = CountingChain()
+    summarizer.get_node_chain = MagicMock(return_value=chain)
+    events = [
+        event
+        async for event in summarizer.tree_reduce_events(
+            fake_llm("unused"), docs, 50, 5, fan_in=3, concurrency=1
+        )
+    ]
+
+    # Every leaf but the failed one was summarized and cached before the failure
+    reduced = events[-1]["data"]
+    assert reduced["reuse"]["chunks_reused"] == reduced["chunks"] - 1
+    assert chain.calls == reduced["reuse"]["nodes"] - reduced["reuse"]["nodes_reused"]
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_reuses_unchanged_chunks_of_a_revision(summarizer):
+    """Only the chunks around an edit of a new revision are summarized again"""
+    llm = GenericFakeChatModel(messages=itertools.repeat(AIMessage(content="Final summary")))
+    summarizer.get_node_chain = MagicMock(return_value=CountingChain(words=20))
+    words = [f"w{index:05d}" for index in range(20000)]
+    budget = TokenBudget(1000, 50, 50, overflow_strategy=STRATEGY_TREE)
+
+    first = await summarizer.summarize_documents(
+        "concise", llm, [Document(page_content=" ".join(words))], budget
+    )
+    words[10000:10002] = ["edit", "ed", "text"]
+    revision = await summarizer.summarize_documents(
+        "concise", llm, [Document(page_content=" ".join(words))], budget
+    )
+
+    assert first["chunks_reused"] == 0
+    assert revision["chunks"] > 20
+    assert revision["chunks"] - revision["chunks_reused"] <= 2
+    assert revision["nodes_reused"] > revision["chunks_reused"]
+
+
+@pytest.mark.asyncio
+async def test_stream_text_summary_reports_fitting_strategy(summarizer):
+    """Test that the strategy used to fit an oversized text is reported before prompting"""
+    llm = GenericFakeChatModel(messages=itertools.repeat(AIMessage(content="Summary")))
+
+    events = [
+        event
+        async for event in summarizer.stream_text_summary(
+            "concise", llm, "word " * 300, METADATA, small_budget()
+        )
+    ]
+
+    phases = [event["data"] for event in events if event["event"] == "progress"]
+    assert phases[0]["phase"] == "summarizing_chunks"
+    assert phases[0]["chunks_summarized"] == 1
+    assert {"phase": "fitted", "strategy": "map_reduce"} in phases
+    assert events[-1]["data"]["summary"] == "Summary"
+    assert events[-1]["data"]["strategy"] == "map_reduce"
+    assert events[-1]["data"]["chunks"] == phases[0]["chunks"]
+    assert {"map", "summary"} <= set(events[-1]["data"]["timings"])
+
+
+@pytest.mark.asyncio
+async def test_load_pdf_documents_from_bytes(summarizer, tmp_path):
+    """Test that PDFs are parsed in memory into one document per page"""
+    with patch("tempfile.tempdir", str(tmp_path)):
+        docs = await summarizer.load_pdf_documents(build_pdf(["First page", "Second page"]))
+
+    assert [doc.page_content for doc in docs] == ["First page", "Second page"]
+    assert [doc.metadata["page"] for doc in docs] == [0, 1]
+    assert all(doc.metadata["total_pages"] == 2 for doc in docs)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,57 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from langchain_core.documents import Document
+
+from app.core.summarizer.chunking import chunk_documents, content_defined_chunks
+
+
+TEXT = " ".join(f"word{index}" for index in range(5000))
+
+
+def test_content_defined_chunks_cover_the_text():
+    """Test that chunks are within the size limits, end between words and cover the text"""
+    chunks = content_defined_chunks(TEXT, 250, 500, 1000)
+
+    assert "".join(chunks) == TEXT
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert all(len(chunk) >= 250 for chunk in chunks[:-1])
+    assert all(chunk.endswith(" ") for chunk in chunks[:-1])
+
+
+def test_content_defined_chunks_are_stable_around_edits():
+    """Test that an edit only changes the chunks around it"""
+    chunks = content_defined_chunks(TEXT, 250, 500, 1000)
+    edited = TEXT.replace("word2500 ", "edited words here ")
+
+    edited_chunks = content_defined_chunks(edited, 250, 500, 1000)
+
+    assert len(set(chunks) - set(edited_chunks)) <= 2
+
+
+def test_content_defined_chunks_cut_long_words():
+    """Test that words longer than the maximum chunk size are cut"""
+    assert content_defined_chunks("a" * 25, 2, 5, 10) == ["a" * 10, "a" * 10, "a" * 5]
+    assert content_defined_chunks("", 2, 5, 10) == []
+
+
+def test_chunk_documents_joins_pages():
+    """Test that pages are chunked as one text, so chunks do not depend on page breaks"""
+    docs = [Document(page_content=TEXT[:20000]), Document(page_content=TEXT[20000:])]
+
+    chunks = chunk_documents(docs, 250)
+
+    assert "".join(chunk.page_content for chunk in chunks) == "\n\n".join(
+        doc.page_content for doc in docs
+    )
+    assert all(len(chunk.page_content) <= 1000 for chunk in chunks)
@@ -0,0 +1,103 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+
+import pytest
+
+from app.core.summarizer.coalescing import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_generation():
+    """Test that concurrent callers with the same key share one call"""
+    flights = SingleFlight()
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"summary": "A summary"}
+
+    results = await asyncio.gather(*(flights.do("key", generate) for _ in range(5)))
+
+    assert calls == 1
+    assert all(result == {"summary": "A summary"} for result in results)
+    assert flights.stats() == {"in_flight": 0, "started": 1, "deduplicated": 4}
+
+
+@pytest.mark.asyncio
+async def test_different_keys_are_not_coalesced():
+    """Test that calls with different keys run independently"""
+    flights = SingleFlight()
+
+    async def generate(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        flights.do("a", lambda: generate("a")), flights.do("b", lambda: generate("b"))
+    )
+
+    assert results == ["a", "b"]
+    assert flights.deduplicated == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_are_fanned_out_to_every_waiter():
+    """Test that every waiter receives the error of the shared call"""
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("Error summarizing text")
+
+    results = await asyncio.gather(
+        *(flights.do("key", failing) for _ in range(3)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    """Test that the other waiters still get the result if the first caller goes away"""
+    flights = SingleFlight()
+
+    async def generate():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.ensure_future(flights.do("key", generate))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flights.do("key", generate))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
+
+
+@pytest.mark.asyncio
+async def test_finished_calls_are_not_reused():
+    """Test that a new call starts once the previous one finished"""
+    flights = SingleFlight()
+
+    async def generate():
+        return "done"
+
+    await flights.do("key", generate)
+    await flights.do("key", generate)
+
+    assert flights.started == 2
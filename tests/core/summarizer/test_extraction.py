@@ -0,0 +1,217 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import time
+from unittest.mock import PropertyMock, patch
+
+import pytest
+from pypdf import PdfReader
+
+from app.core.summarizer.extraction import ExtractionOverloadedError, PDFExtractionPool
+from app.core.summarizer.extraction import cpu_time_limit, extract_pdf_documents
+from app.core.summarizer.extraction import extract_pdf_page_range, page_ranges
+from tests.helpers import build_pdf
+
+
+def test_extract_pdf_documents():
+    """Test that PDF bytes are parsed into one document per page"""
+    docs = extract_pdf_documents(build_pdf(["First page", "Second page"]), "document.pdf")
+
+    assert [doc.page_content for doc in docs] == ["First page", "Second page"]
+    assert docs[0].metadata["source"] == "document.pdf"
+
+
+def test_page_ranges():
+    """Test splitting pages into contiguous ranges, one per process"""
+    assert page_ranges(10, 3) == [(0, 4), (4, 8), (8, 10)]
+    assert page_ranges(2, 4) == [(0, 1), (1, 2)]
+    assert page_ranges(0, 2) == []
+
+
+def test_extract_pdf_page_range_matches_whole_file_extraction():
+    """Test that extracting page ranges builds the same documents as extracting the whole file"""
+    file_content = build_pdf([f"Page {number}" for number in range(5)])
+
+    docs = extract_pdf_page_range(file_content, "document.pdf", 0, 2) + extract_pdf_page_range(
+        file_content, "document.pdf", 2, 5
+    )
+
+    assert docs == extract_pdf_documents(file_content, "document.pdf")
+
+
+def test_extract_pdf_page_range_normalizes_metadata_like_the_parser():
+    """Test that document information gets the same keys and values as with PyPDFParser"""
+    file_content = build_pdf(
+        ["Only page"],
+        {
+            "/Title": " Report ",
+            "/CreationDate": "D:20240102030405+01'00'",
+            "/ModDate": "not a date",
+            "/Page_Count": "1",
+        },
+    )
+
+    docs = extract_pdf_page_range(file_content, "document.pdf", 0, 1)
+
+    assert docs == extract_pdf_documents(file_content, "document.pdf")
+    assert docs[0].metadata["title"] == "Report"
+    assert docs[0].metadata["creationdate"] == "2024-01-02T03:04:05+01:00"
+    assert docs[0].metadata["moddate"] == "not a date"
+
+
+def test_extract_pdf_page_range_computes_the_page_labels_once():
+    """Test that the labels of the whole document are not computed again for every page"""
+    file_content = build_pdf([f"Page {number}" for number in range(5)])
+
+    with patch.object(
+        PdfReader, "page_labels", new_callable=PropertyMock, return_value=list("abcde")
+    ) as page_labels:
+        docs = extract_pdf_page_range(file_content, "document.pdf", 1, 4)
+
+    assert [doc.metadata["page_label"] for doc in docs] == ["b", "c", "d"]
+    page_labels.assert_called_once()
+
+
+def test_cpu_time_limit():
+    """Test that CPU bound work is interrupted once it used its CPU time"""
+    with pytest.raises(TimeoutError), cpu_time_limit(0.05):
+        while True:
+            pass
+
+    # Sleeping does not use CPU time
+    with cpu_time_limit(0.05):
+        time.sleep(0.1)
+
+
+@pytest.mark.asyncio
+async def test_extraction_pool_runs_in_processes():
+    """Test extracting PDFs in worker processes"""
+    pool = PDFExtractionPool(processes=1, max_queued=0, cpu_time=10)
+    await pool.start()
+    try:
+        docs = await pool.extract(build_pdf(["First page", "Second page"]))
+
+        assert [doc.page_content for doc in docs] == ["First page", "Second page"]
+        assert pool.pending == 0
+    finally:
+        await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_extraction_pool_splits_large_files_across_processes():
+    """Test that large PDFs are extracted in page ranges and merged back in page order"""
+    file_content = build_pdf([f"Page {number}" for number in range(7)])
+    pool = PDFExtractionPool(processes=2, max_queued=0, cpu_time=10, parallel_min_pages=5)
+    await pool.start()
+    try:
+        assert await pool._page_ranges(file_content) == [(0, 4), (4, 7)]
+        assert await pool._page_ranges(build_pdf(["Short file"])) == []
+
+        docs = await pool.extract(file_content, "document.pdf")
+
+        assert docs == extract_pdf_documents(file_content, "document.pdf")
+        assert [doc.metadata["page"] for doc in docs] == list(range(7))
+        assert pool.pending == 0
+    finally:
+        await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_extraction_pool_rejects_work_over_the_queue_limit():
+    """Test that extractions are rejected once the queue is full"""
+    pool = PDFExtractionPool(processes=1, max_queued=0, cpu_time=10)
+    await pool.start()
+    pool.pending = 1
+    try:
+        with pytest.raises(ExtractionOverloadedError):
+            await pool.extract(build_pdf(["First page"]))
+    finally:
+        await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_extraction_pool_queue_limit_holds_under_concurrency():
+    """Test that concurrent extractions never hold more slots than the queue allows"""
+    file_content = build_pdf([f"Page {number}" for number in range(6)])
+    pool = PDFExtractionPool(processes=2, max_queued=1, cpu_time=10, parallel_min_pages=5)
+    await pool.start()
+    peak = 0
+
+    async def monitor():
+        nonlocal peak
+        while True:
+            peak = max(peak, pool.pending)
+            await asyncio.sleep(0)
+
+    monitoring = asyncio.create_task(monitor())
+    try:
+        results = await asyncio.gather(
+            *(pool.extract(file_content) for _ in range(20)), return_exceptions=True
+        )
+        monitoring.cancel()
+
+        rejected = [result for result in results if isinstance(result, ExtractionOverloadedError)]
+        assert len(rejected) == 17
+        assert all(len(result) == 6 for result in results if isinstance(result, list))
+        assert peak <= 3
+        assert pool.pending == 0
+    finally:
+        await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_extraction_pool_restarts_a_broken_pool_once(caplog):
+    """Test that concurrent failures on a broken pool do not replace the restarted pool"""
+    pool = PDFExtractionPool(processes=1, max_queued=4, cpu_time=10)
+    await pool.start()
+    broken = pool._executor
+    futures = []
+
+    def submit(*args, **kwargs):
+        futures.append(Future())
+        return futures[-1]
+
+    broken.submit = submit
+    try:
+        extractions = asyncio.gather(
+            *(pool.extract(build_pdf(["Page"])) for _ in range(3)), return_exceptions=True
+        )
+        while len(futures) < 3:
+            await asyncio.sleep(0)
+        for future in futures:
+            future.set_exception(BrokenProcessPool())
+        results = await extractions
+
+        assert all(isinstance(result, BrokenProcessPool) for result in results)
+        assert caplog.text.count("restarting it") == 1
+        restarted = pool._executor
+        assert restarted is not None and restarted is not broken
+        assert [doc.page_content for doc in await pool.extract(build_pdf(["Page"]))] == ["Page"]
+        assert pool._executor is restarted
+    finally:
+        await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_extraction_without_pool_runs_in_a_thread():
+    """Test that extraction still works before the pool is started"""
+    pool = PDFExtractionPool(processes=0, max_queued=0, cpu_time=10)
+    await pool.start()
+
+    docs = await pool.extract(build_pdf(["Only page"]))
+
+    assert not pool.started
+    assert [doc.page_content for doc in docs] == ["Only page"]
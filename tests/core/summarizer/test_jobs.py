@@ -0,0 +1,120 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+
+import pytest
+
+from app.core.summarizer.jobs import JOB_CANCELLED, JOB_FAILED, JOB_PENDING, JOB_SUCCEEDED
+from app.core.summarizer.jobs import JobQueueFullError, SummaryJobManager
+
+
+def summary_events(delay: float = 0, error: Exception = None):
+    """Fake streamed summary reporting progress before its tokens and summary"""
+
+    async def events():
+        yield {"event": "progress", "data": {"phase": "extracted", "pages": 3}}
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        yield {"event": "token", "data": {"content": "Summary"}}
+        yield {"event": "summary", "data": {"summary": "Summary"}}
+
+    return events
+
+
+async def wait_finished(manager: SummaryJobManager, job_id: str):
+    while not manager.get(job_id).finished:
+        await asyncio.sleep(0.01)
+    return manager.get(job_id)
+
+
+@pytest.mark.asyncio
+async def test_job_reports_progress_and_result():
+    """Test that a job keeps its latest progress and the final summary"""
+    manager = SummaryJobManager(max_concurrency=1, max_queued=10, max_retained=10, retention=60)
+
+    job = manager.submit(summary_events())
+    assert job.status == JOB_PENDING
+
+    job = await wait_finished(manager, job.id)
+    assert job.status == JOB_SUCCEEDED
+    assert job.progress == {"phase": "done", "pages": 3, "tokens": 1}
+    assert job.result == {"summary": "Summary"}
+    await manager.aclose()
+
+
+@pytest.mark.asyncio
+async def test_job_failure():
+    """Test that a failed job reports its error"""
+    manager = SummaryJobManager(max_concurrency=1, max_queued=10, max_retained=10, retention=60)
+
+    job = manager.submit(summary_events(error=ValueError("Error generating text summary")))
+
+    job = await wait_finished(manager, job.id)
+    assert job.status == JOB_FAILED
+    assert job.error == "Error generating text summary"
+    await manager.aclose()
+
+
+@pytest.mark.asyncio
+async def test_jobs_with_the_same_key_run_once():
+    """Test that identical jobs share the first one, unless it failed"""
+    manager = SummaryJobManager(max_concurrency=1, max_queued=10, max_retained=10, retention=60)
+
+    first = manager.submit(summary_events(delay=0.01), key="text:a")
+    assert manager.submit(summary_events(), key="text:a") is first
+    assert manager.submit(summary_events(), key="text:b") is not first
+    await wait_finished(manager, first.id)
+    assert manager.submit(summary_events(), key="text:a") is first
+
+    failed = manager.submit(summary_events(error=ValueError("Failed")), key="text:c")
+    await wait_finished(manager, failed.id)
+    assert manager.submit(summary_events(), key="text:c") is not failed
+    await manager.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cancel_running_and_pending_jobs():
+    """Test that running and waiting jobs can be cancelled"""
+    manager = SummaryJobManager(max_concurrency=1, max_queued=10, max_retained=10, retention=60)
+    running = manager.submit(summary_events(delay=10))
+    pending = manager.submit(summary_events())
+    await asyncio.sleep(0.01)
+
+    manager.cancel(pending.id)
+    manager.cancel(running.id)
+
+    assert (await wait_finished(manager, running.id)).status == JOB_CANCELLED
+    assert (await wait_finished(manager, pending.id)).status == JOB_CANCELLED
+    assert pending.result is None
+    await manager.aclose()
+
+
+@pytest.mark.asyncio
+async def test_queue_and_retention_limits():
+    """Test that the wait queue is bounded and old finished jobs are forgotten"""
+    manager = SummaryJobManager(max_concurrency=1, max_queued=1, max_retained=1, retention=60)
+    running = manager.submit(summary_events(delay=10))
+    await asyncio.sleep(0.01)
+    manager.submit(summary_events())
+
+    with pytest.raises(JobQueueFullError) as exc_info:
+        manager.submit(summary_events())
+    assert exc_info.value.retry_after >= 1
+
+    manager.cancel(running.id)
+    await asyncio.sleep(0.05)
+    assert manager.get(running.id) is None
+    assert manager.stats()["retained"] == 1
+    await manager.aclose()
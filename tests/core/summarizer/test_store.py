@@ -0,0 +1,175 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.summarizer.store import (
+    STORE_BYPASS,
+    STORE_HIT,
+    STORE_MISS,
+    SummaryStore,
+    content_hash,
+    summary_key,
+)
+
+
+def key(name: str) -> str:
+    """Return a valid store key for the name"""
+    return content_hash(name.encode("utf-8"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Fixture to create an enabled SummaryStore in a temporary directory"""
+    return SummaryStore(path=str(tmp_path / "summaries"), max_bytes=1024 * 1024, enabled=True)
+
+
+@pytest.fixture
+def summarizer():
+    """Fixture to create a fake summarizer"""
+    summarizer = MagicMock()
+    summarizer.provider_name = "ollama"
+    summarizer.summarize_pdf = AsyncMock(return_value={"summary": "A summary", "source": "pdf"})
+    return summarizer
+
+
+def test_summary_key_depends_on_every_parameter():
+    """Test that the key changes with the content and the generation parameters"""
+    digest = content_hash(b"%PDF-1.4 document")
+    key = summary_key(digest, "ollama", "concise", "llama2", 0.0, 1000)
+
+    assert summary_key(digest, "ollama", "concise", "llama2", None, 1000) == key
+    assert summary_key(content_hash(b"other"), "ollama", "concise", "llama2", 0.0, 1000) != key
+    assert summary_key(digest, "ollama", "detailed", "llama2", 0.0, 1000) != key
+    assert summary_key(digest, "ollama", "concise", "mistral", 0.0, 1000) != key
+    assert summary_key(digest, "ollama", "concise", "llama2", 0.5, 1000) != key
+    assert summary_key(digest, "ollama", "concise", "llama2", 0.0, 500) != key
+
+
+def test_summary_key_resolves_the_configured_defaults():
+    """Test that the key depends on the configured strategy and compression ratio"""
+    digest = content_hash(b"%PDF-1.4 document")
+    key = summary_key(digest, "ollama", "concise", "llama2", 0.0, 1000)
+
+    with patch("app.core.summarizer.store.settings.token_budget_compression_ratio", 0.5):
+        assert summary_key(digest, "ollama", "concise", "llama2", 0.0, 1000) != key
+        assert summary_key(digest, "ollama", "concise", "llama2", 0.0, 1000, None, 0.5) == (
+            summary_key(digest, "ollama", "concise", "llama2", 0.0, 1000)
+        )
+    with patch("app.core.summarizer.store.settings.token_budget_overflow_strategy", "tree"):
+        assert summary_key(digest, "ollama", "concise", "llama2", 0.0, 1000) != key
+        assert summary_key(digest, "ollama", "concise", "llama2", 0.0, 1000, "tree") == (
+            summary_key(digest, "ollama", "concise", "llama2", 0.0, 1000)
+        )
+
+
+def test_entries_survive_new_instances(store):
+    """Test that summaries are persisted on disk"""
+    store.put(key("key"), {"summary": "A summary"})
+
+    reopened = SummaryStore(path=str(store.path), max_bytes=store.max_bytes, enabled=True)
+    assert reopened.get(key("key")) == {"summary": "A summary"}
+
+
+def test_evicts_least_recently_used(store):
+    """Test that the oldest entries are deleted once over the size cap"""
+    store.put(key("old"), {"summary": "x" * 100})
+    store.put(key("new"), {"summary": "y" * 100})
+    os.utime(store.path / f"{key('old')}.json", (1, 1))
+
+    store.max_bytes = 150
+    store.put(key("newest"), {"summary": "z" * 10})
+
+    assert store.get(key("old")) is None
+    assert store.get(key("new")) is not None
+    assert store.get(key("newest")) is not None
+
+
+def test_put_tracks_the_size_without_scanning(store):
+    """Test that the store is only scanned on the first put and when over the size cap"""
+    store.put(key("a"), {"summary": "a"})
+
+    with patch.object(store, "_entries", wraps=store._entries) as entries:
+        store.put(key("b"), {"summary": "b" * 100})
+        store.put(key("b"), {"summary": "b"})
+        store.purge(key("a"))
+        entries.assert_not_called()
+
+        store.max_bytes = 30
+        store.put(key("c"), {"summary": "c"})
+        entries.assert_called()
+
+    assert store.stats()["entries"] == 1
+    assert store._total_bytes == store.stats()["bytes"]
+
+
+def test_purge(store):
+    """Test purging one entry and every entry"""
+    store.put(key("a"), {"summary": "a"})
+    store.put(key("b"), {"summary": "b"})
+    store.put(key("c"), {"summary": "c"})
+
+    assert store.purge(key("a")) == 1
+    assert store.purge(key("a")) == 0
+    assert store.purge() == 2
+    assert store.stats()["entries"] == 0
+
+
+def test_rejects_keys_escaping_the_store(store, tmp_path):
+    """Test that only sha256 keys are accepted, so entries cannot be outside the store"""
+    victim = tmp_path / "victim" / "important.json"
+    victim.parent.mkdir()
+    victim.write_text("{}")
+
+    for invalid_key in ("../victim/important", key("a").upper(), key("a") + "\n", ""):
+        with pytest.raises(ValueError, match="Invalid summary store key"):
+            store.purge(invalid_key)
+        with pytest.raises(ValueError, match="Invalid summary store key"):
+            store.get(invalid_key)
+    assert victim.exists()
+
+
+@pytest.mark.asyncio
+async def test_summarize_pdf_uses_the_store(store, summarizer):
+    """Test that the same PDF and parameters are only summarized once"""
+    arguments = dict(
+        file_content=b"%PDF-1.4 document",
+        file_name="document.pdf",
+        summary_type="concise",
+        model="llama2",
+        temperature=0.0,
+        max_length=1000,
+    )
+
+    first, first_status = await store.summarize_pdf(summarizer, **arguments)
+    second, second_status = await store.summarize_pdf(summarizer, **arguments)
+
+    assert (first_status, second_status) == (STORE_MISS, STORE_HIT)
+    assert first == second
+    summarizer.summarize_pdf.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_summarize_pdf_disabled_store(tmp_path, summarizer):
+    """Test that a disabled store always summarizes"""
+    store = SummaryStore(path=str(tmp_path), max_bytes=1024, enabled=False)
+
+    _, status = await store.summarize_pdf(
+        summarizer, b"%PDF", "document.pdf", "concise", "llama2", 0.0, 1000
+    )
+
+    assert status == STORE_BYPASS
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,103 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+import json
+
+import pytest
+from langchain_core.documents import Document
+
+from app.core.summarizer.tree import SummaryNodeCache, group_nodes, leaf_key, node_key
+
+
+def test_node_keys_are_content_addressed():
+    """Test that node keys change with the content, the children and the model"""
+    identity = ["ollama", "llama3", 0.0]
+    docs = [Document(page_content="Some text", metadata={"page": 1})]
+
+    key = leaf_key(identity, docs)
+    assert leaf_key(identity, [Document(page_content="Some text")]) == key
+    assert leaf_key(identity, [Document(page_content="Other text")]) != key
+    assert leaf_key(["ollama", "mistral", 0.0], docs) != key
+    assert node_key(identity, [key, "b"]) != node_key(identity, ["b", key])
+
+
+def test_group_nodes():
+    """Test grouping consecutive nodes at the keys multiple of fan_in, within the token budget"""
+    odd, even = "00000001", "00000002"
+
+    assert group_nodes([odd, even, odd, odd, even], ["aaaa"] * 5, 2, 100) == [[0, 1], [2, 3, 4]]
+    assert group_nodes([odd] * 5, ["aaaa"] * 5, 2, 100) == [[0, 1, 2, 3], [4]]
+    assert group_nodes([odd] * 3, ["a" * 40, "a" * 40, "a"], 3, 15) == [[0], [1, 2]]
+
+    # Groups that would not reduce the number of nodes fall back to fan_in nodes per group
+    assert group_nodes([even] * 3, ["aaaa"] * 3, 2, 100) == [[0, 1], [2]]
+
+
+def test_summary_node_cache_persistence(tmp_path):
+    """Test that nodes saved on shutdown are loaded on the next startup"""
+    path = tmp_path / "nodes.json"
+    cache = SummaryNodeCache(enabled=True, max_size=10, path=str(path))
+    cache.set("a", "A")
+    cache.save()
+
+    restarted = SummaryNodeCache(enabled=True, max_size=10, path=str(path))
+    restarted.load()
+    assert restarted.get("a") == "A"
+
+    path.write_text("not json")
+    restarted = SummaryNodeCache(enabled=True, max_size=10, path=str(path))
+    restarted.load()
+    assert len(restarted) == 0
+
+
+@pytest.mark.asyncio
+async def test_summary_node_cache_saves_changes_periodically(tmp_path):
+    """Test that changed nodes are saved while running, not only on shutdown"""
+    path = tmp_path / "nodes.json"
+    cache = SummaryNodeCache(enabled=True, max_size=10, path=str(path), save_interval=0.01)
+    await cache.start()
+
+    cache.set("a", "A")
+    for _ in range(100):
+        if path.exists():
+            break
+        await asyncio.sleep(0.01)
+    assert json.loads(path.read_text()) == [["a", "A"]]
+
+    cache.set("b", "B")
+    await cache.aclose()
+    assert json.loads(path.read_text()) == [["a", "A"], ["b", "B"]]
+
+
+def test_summary_node_cache_evicts_least_recently_used():
+    """Test that the cache keeps at most max_size nodes, evicting the least recently used"""
+    cache = SummaryNodeCache(enabled=True, max_size=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("c") == "C"
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_disabled_summary_node_cache():
+    """Test that a disabled cache stores nothing"""
+    cache = SummaryNodeCache(enabled=False, max_size=2)
+    cache.set("a", "A")
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
@@ -0,0 +1,87 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+
+import pytest
+
+from app.core.batch import run_batch
+
+
+@pytest.mark.asyncio
+async def test_run_batch_limits_concurrency_per_group():
+    """Test that at most max_concurrency calls of a group run at the same time"""
+    running = {"ollama": 0, "openai": 0}
+    peak = {"ollama": 0, "openai": 0}
+
+    def make_call(group):
+        async def call():
+            running[group] += 1
+            peak[group] = max(peak[group], running[group])
+            await asyncio.sleep(0.01)
+            running[group] -= 1
+            return group
+
+        return call
+
+    calls = [(group, make_call(group)) for group in ["ollama", "openai"] * 6]
+    results = [batch_result async for batch_result in run_batch(calls, max_concurrency=2)]
+
+    assert len(results) == 12
+    assert peak == {"ollama": 2, "openai": 2}
+
+
+@pytest.mark.asyncio
+async def test_run_batch_reports_errors_with_their_index():
+    """Test that failing calls are reported without stopping the batch"""
+
+    async def succeed():
+        return "ok"
+
+    async def fail():
+        raise ValueError("Error generating answer")
+
+    results = [
+        batch_result
+        async for batch_result in run_batch(
+            [("ollama", succeed), ("ollama", fail), ("ollama", succeed)], max_concurrency=1
+        )
+    ]
+    results.sort(key=lambda batch_result: batch_result.index)
+
+    assert [batch_result.result for batch_result in results] == ["ok", None, "ok"]
+    assert isinstance(results[1].error, ValueError)
+
+
+@pytest.mark.asyncio
+async def test_run_batch_cancels_pending_calls_when_closed():
+    """Test that closing the batch early cancels the calls still running"""
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def fast():
+        return "fast"
+
+    batch = run_batch([("ollama", fast), ("ollama", slow), ("ollama", slow)], 3)
+    first = await anext(batch)
+    await batch.aclose()
+    await asyncio.sleep(0)
+
+    assert first.result == "fast"
+    assert len(cancelled) == 2
@@ -0,0 +1,153 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from unittest.mock import patch
+
+import pytest
+from langchain_core.documents import Document
+
+from app.core.budget import STRATEGY_CHUNKED, STRATEGY_EXTRACTIVE, STRATEGY_MAP_REDUCE
+from app.core.budget import STRATEGY_NONE, STRATEGY_TREE
+from app.core.budget import STRATEGY_TRUNCATE, TokenBudget, context_size, context_window
+from app.core.budget import documents_tokens
+from app.core.budget import estimate_tokens, extract_documents, split_documents
+from app.core.budget import textrank_scores, truncate_documents
+from app.core.config import settings
+
+
+def test_estimate_tokens():
+    """Tokens are estimated from the text length"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_context_size():
+    """Known models use their configured context size, others the default one"""
+    assert context_size("gpt-4o-mini") == settings.model_context_sizes["gpt-4o-mini"]
+    assert context_size("unknown") == settings.default_context_size
+    assert context_size(None) == settings.default_context_size
+
+
+def test_context_window():
+    """Windows are the smallest power of two bucket holding the tokens, within the context"""
+    assert context_window("gpt-4", 10) == settings.token_budget_min_context
+    assert context_window("gpt-4", 2049) == 4096
+    assert context_window("gpt-4", 10**6) == context_window("gpt-4") == 8192
+
+
+def test_input_tokens():
+    """The input budget leaves room for the output, the reserve and the prompt template"""
+    budget = TokenBudget(context_size=1000, max_output_tokens=200, reserved_tokens=100)
+
+    assert budget.input_tokens("Summarize:\n{context}\nSUMMARY:") == 1000 - 200 - 100 - 5
+    with pytest.raises(ValueError):
+        TokenBudget(context_size=1000, max_output_tokens=1000).input_tokens("{context}")
+
+
+def test_strategy():
+    """Mild overflows are pre-compressed, larger ones map-reduced and the largest tree-reduced"""
+    budget = TokenBudget(context_size=1000, max_output_tokens=200)
+
+    assert budget.strategy(100, 100) == STRATEGY_NONE
+    assert budget.strategy(120, 100) == STRATEGY_EXTRACTIVE
+    assert budget.strategy(500, 100) == STRATEGY_MAP_REDUCE
+    assert budget.strategy(1000, 100) == STRATEGY_TREE
+    with patch("app.core.budget.settings.token_budget_overflow_strategy", STRATEGY_TRUNCATE):
+        assert budget.strategy(1000, 100) == STRATEGY_TRUNCATE
+
+        # The strategy of the request wins over the configured one
+        budget = TokenBudget.for_model(None, 200, overflow_strategy=STRATEGY_CHUNKED)
+        assert budget.strategy(100, 100) == STRATEGY_NONE
+        assert budget.strategy(1000, 100) == STRATEGY_CHUNKED
+
+
+def test_compression_tokens():
+    """Documents are pre-compressed to the ratio of the request or the configured one"""
+    assert TokenBudget(1000, 200).compression_tokens(1000) is None
+    assert TokenBudget(1000, 200, compression_ratio=0.25).compression_tokens(1001) == 251
+    assert TokenBudget(1000, 200, compression_ratio=1.0).compression_tokens(1000) is None
+    with patch("app.core.budget.settings.token_budget_compression_ratio", 0.5):
+        assert TokenBudget.for_model(None, 200).compression_tokens(1000) == 500
+        budget = TokenBudget.for_model(None, 200, compression_ratio=0.1)
+        assert budget.compression_tokens(1000) == 100
+
+
+def test_truncate_documents():
+    """Documents are kept in order until the budget and the last one is cut"""
+    docs = [Document(page_content="a" * 40), Document(page_content="b" * 40)]
+
+    truncated = truncate_documents(docs, 15)
+
+    assert [doc.page_content for doc in truncated] == ["a" * 40, "b" * 20]
+
+
+def test_split_documents():
+    """Documents are grouped within the budget, large documents are split"""
+    docs = [
+        Document(page_content="a" * 40, metadata={"page": 0}),
+        Document(page_content="b" * 100, metadata={"page": 1}),
+    ]
+
+    groups = split_documents(docs, 10)
+
+    assert all(documents_tokens(group) <= 10 for group in groups)
+    assert "".join(doc.page_content for group in groups for doc in group) == "a" * 40 + "b" * 100
+    assert groups[0][0].metadata == {"page": 0}
+    assert groups[-1][-1].metadata == {"page": 1, "start_index": 80, "end_index": 100}
+
+
+def test_extract_documents_keeps_representative_sentences():
+    """Sentences sharing the main words of the text are kept in their original order"""
+    docs = [
+        Document(page_content="Solar panels convert sunlight. The weather was nice today."),
+        Document(page_content="Panels need sunlight to convert energy. Lunch was pasta."),
+    ]
+
+    extracted = extract_documents(docs, 20)
+
+    assert documents_tokens(extracted) <= 20
+    assert [doc.page_content for doc in extracted] == [
+        "Solar panels convert sunlight.",
+        "Panels need sunlight to convert energy.",
+    ]
+
+
+def test_extract_documents_cuts_the_top_sentence_when_none_fits():
+    """Text without sentence boundaries is cut to the budget instead of dropped"""
+    docs = [Document(page_content="column value " * 100, metadata={"page": 3})]
+
+    extracted = extract_documents(docs, 20)
+
+    assert [doc.metadata for doc in extracted] == [{"page": 3}]
+    assert 0 < documents_tokens(extracted) <= 20
+    assert docs[0].page_content.startswith(extracted[0].page_content)
+
+
+def test_textrank_scores_rank_central_sentences_first():
+    """Sentences similar to many others score higher, unrelated ones keep the base score"""
+    sentences = [
+        "Solar panels convert sunlight into energy.",
+        "The weather was nice.",
+        "Panels convert sunlight.",
+        "Solar energy needs sunlight.",
+        "Lunch was pasta.",
+    ]
+
+    scores = textrank_scores(sentences)
+
+    assert scores.shape == (5,)
+    assert scores.argmax() == 0
+    assert scores[1] == scores[4] == scores.min()
+    assert textrank_scores(["a b.", "c d."]).tolist() == [0.5, 0.5]
+    assert textrank_scores([]).shape == (0,)
@@ -0,0 +1,84 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import tracemalloc
+
+from langchain_core.documents import Document
+
+from app.core.chunker import iter_chunks, iter_text_chunks
+
+
+PARAGRAPH = "The first sentence of the paragraph. A second sentence follows it. " * 3
+
+
+def test_chunks_end_at_paragraph_and_sentence_boundaries():
+    """Test that chunks fit the budget and prefer paragraph, then sentence boundaries"""
+    text = "\n\n".join([PARAGRAPH.strip()] * 10)
+
+    # Paragraphs are half the budget long, every chunk ends at its first paragraph break
+    chunks = [text[start:end] for start, end in iter_text_chunks(text, 100)]
+    assert chunks == [PARAGRAPH.strip()] * 10
+
+    chunks = [text[start:end] for start, end in iter_text_chunks(text, 20)]
+    assert all(len(chunk) <= 80 and chunk.endswith(".") for chunk in chunks)
+
+
+def test_chunks_cut_words_only_without_whitespace():
+    """Test that words are cut only when a chunk has no whitespace"""
+    assert list(iter_text_chunks("a" * 25, 2)) == [(0, 8), (8, 16), (16, 24), (24, 25)]
+    assert list(iter_text_chunks("   ", 2)) == []
+
+
+def test_chunk_overlap_starts_at_a_word():
+    """Test that chunks repeat the end of the previous chunk, starting at a word"""
+    text = " ".join(f"word{index:02d}" for index in range(40))
+
+    offsets = list(iter_text_chunks(text, 20, overlap_tokens=5))
+
+    for (_, previous_end), (start, _) in zip(offsets, offsets[1:]):
+        assert previous_end - 20 <= start < previous_end
+        assert text[start - 1] == " "
+    assert offsets[-1][1] == len(text)
+
+
+def test_iter_chunks_keeps_page_provenance():
+    """Test that chunks keep the page of their document and their offsets in it"""
+    pages = [
+        Document(page_content=PARAGRAPH * 2, metadata={"page": 0, "source": "spec.pdf"}),
+        Document(page_content=PARAGRAPH, metadata={"page": 1, "source": "spec.pdf"}),
+    ]
+
+    chunks = list(iter_chunks(pages, 50))
+
+    assert [chunk.metadata["page"] for chunk in chunks] == [0, 0, 0, 1, 1]
+    for chunk in chunks:
+        page = pages[chunk.metadata["page"]].page_content
+        start, end = chunk.metadata["start_index"], chunk.metadata["end_index"]
+        assert page[start:end] == chunk.page_content
+        assert chunk.metadata["source"] == "spec.pdf"
+
+
+def test_iter_chunks_streams_large_texts():
+    """Test that chunking a large text never allocates a copy of the text"""
+    text = PARAGRAPH * 20000
+    chunks = iter_chunks([Document(page_content=text)], 500)
+
+    tracemalloc.start()
+    try:
+        count = sum(1 for _ in chunks)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert count > 1000
+    assert peak < len(text) / 10
@@ -0,0 +1,96 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.llm.ollama import OllamaLLM
+from app.core.llm.openai import OpenAILLM
+from app.core.providers import ProviderFactory
+from app.core.summarizer.ollama import OllamaSummarizer
+from app.core.summarizer.openai import OpenAISummarizer
+
+
+@pytest.fixture
+def factory():
+    """Fixture to create a ProviderFactory with both providers configured"""
+    with patch("app.core.providers.settings") as mock_settings:
+        mock_settings.available_ai_providers = ["ollama", "openai"]
+        yield ProviderFactory()
+
+
+def test_providers_are_built_once(factory):
+    """Test that the same provider instance is returned on every call"""
+    llm = factory.get_llm_provider("ollama")
+
+    assert isinstance(llm, OllamaLLM)
+    assert factory.get_llm_provider("ollama") is llm
+    assert isinstance(factory.get_llm_provider("openai"), OpenAILLM)
+
+
+def test_summarizers_share_llm_providers(factory):
+    """Test that summarizers reuse the LLM provider of the same name"""
+    ollama_summarizer = factory.get_summary_provider("ollama")
+    openai_summarizer = factory.get_summary_provider("openai")
+
+    assert isinstance(ollama_summarizer, OllamaSummarizer)
+    assert isinstance(openai_summarizer, OpenAISummarizer)
+    assert ollama_summarizer.llm is factory.get_llm_provider("ollama")
+    assert openai_summarizer.llm is factory.get_llm_provider("openai")
+
+
+def test_available_providers_are_read_once(factory):
+    """Test that the available providers are only computed when building"""
+    factory.get_llm_provider("ollama")
+
+    with patch("app.core.providers.settings") as mock_settings:
+        mock_settings.available_ai_providers = []
+        assert isinstance(factory.get_llm_provider("ollama"), OllamaLLM)
+
+
+def test_unavailable_provider(factory):
+    """Test that asking for a provider that is not configured raises an exception"""
+    with pytest.raises(ValueError, match="Provider unknown not available or not configured"):
+        factory.get_summary_provider("unknown")
+
+
+@pytest.mark.asyncio
+async def test_startup_and_shutdown_hooks(factory):
+    """Test that hooks run on startup and in reverse order on shutdown"""
+    calls = []
+    first = AsyncMock(side_effect=lambda: calls.append("first"))
+    second = AsyncMock(side_effect=lambda: calls.append("second"))
+    factory.add_startup_hook(first)
+    factory.add_shutdown_hook(first)
+    factory.add_shutdown_hook(second)
+
+    await factory.startup()
+    assert calls == ["first"]
+
+    await factory.shutdown()
+    assert calls == ["first", "second", "first"]
+
+
+@pytest.mark.asyncio
+async def test_shutdown_hook_errors_do_not_stop_other_hooks(factory):
+    """Test that a failing shutdown hook does not prevent the others from running"""
+    failing = AsyncMock(side_effect=RuntimeError("boom"))
+    closing = AsyncMock()
+    factory.add_shutdown_hook(closing)
+    factory.add_shutdown_hook(failing)
+
+    await factory.shutdown()
+
+    failing.assert_awaited_once()
+    closing.assert_awaited_once()
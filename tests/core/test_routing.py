@@ -0,0 +1,143 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.core.routing import LLMRouter, LatencyTracker, route_llm_provider
+
+
+class FakeLLM:
+    """Fake LLM provider answering after a delay, or failing"""
+
+    def __init__(self, provider_name: str, delay: float = 0, error: Exception = None):
+        self.provider_name = provider_name
+        self.delay = delay
+        self.error = error
+        self.cancelled = False
+        self.models = []
+
+    async def ask(self, query, model=None, temperature=None, max_tokens=None):
+        self.models.append(model)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return {"response": "42", "provider": self.provider_name, "model": model}
+
+
+@pytest.fixture
+def router():
+    """Fixture to create a router hedging after 50ms"""
+    return LLMRouter(
+        fallbacks=["ollama", "openai:gpt-4o"],
+        hedging_quantile=0.95,
+        hedging_min_delay=0.05,
+        hedging_min_samples=5,
+        hedging_window=10,
+    )
+
+
+def with_fallback(openai_llm):
+    return patch("app.core.routing.get_llm_provider", return_value=openai_llm)
+
+
+def test_latency_tracker_quantile():
+    """The quantile is taken over the latest samples of the window"""
+    tracker = LatencyTracker(window=100)
+    for latency in range(1, 101):
+        tracker.record(latency / 100)
+
+    assert tracker.quantile(0.95) == 0.95
+    assert LatencyTracker(window=10).quantile(0.95) is None
+
+
+def test_routes_skip_unavailable_providers(router):
+    """Fallbacks are only used when their provider is available"""
+    ollama = FakeLLM("ollama")
+
+    with patch("app.core.routing.get_llm_provider", side_effect=ValueError("Not supported")):
+        assert router.routes(ollama, "llama2") == [(ollama, "llama2")]
+
+
+@pytest.mark.asyncio
+async def test_failover_to_next_provider(router):
+    """A failed provider is replaced by the next route, which reports it answered"""
+    ollama = FakeLLM("ollama", error=ValueError("Error generating answer"))
+    openai = FakeLLM("openai")
+
+    with with_fallback(openai):
+        result = await router.ask(ollama, "What is the meaning of life?", model="llama2")
+
+    assert result["provider"] == "openai"
+    assert openai.models == ["gpt-4o"]
+
+
+@pytest.mark.asyncio
+async def test_failover_raises_last_error(router):
+    """The error of the last route is raised when every route fails"""
+    ollama = FakeLLM("ollama", error=ValueError("Ollama is down"))
+    openai = FakeLLM("openai", error=ValueError("OpenAI is down"))
+
+    with with_fallback(openai), pytest.raises(ValueError, match="OpenAI is down"):
+        await router.ask(ollama, "What is the meaning of life?")
+
+
+@pytest.mark.asyncio
+async def test_hedge_slow_provider(router):
+    """A slow provider is hedged with the next route and cancelled once it answers"""
+    ollama = FakeLLM("ollama", delay=1)
+    openai = FakeLLM("openai")
+
+    with with_fallback(openai):
+        result = await router.ask(ollama, "What is the meaning of life?", mode="hedge")
+        await asyncio.sleep(0)
+
+    assert result["provider"] == "openai"
+    assert ollama.cancelled
+
+
+@pytest.mark.asyncio
+async def test_hedge_not_needed_for_fast_provider(router):
+    """A provider answering before the hedging delay is not hedged"""
+    ollama = FakeLLM("ollama")
+    openai = FakeLLM("openai")
+
+    with with_fallback(openai):
+        result = await router.ask(ollama, "What is the meaning of life?", mode="hedge")
+
+    assert result["provider"] == "ollama"
+    assert openai.models == []
+
+
+def test_hedging_delay_follows_latency(router):
+    """The hedging delay is the recent p95 latency once there are enough samples"""
+    ollama = FakeLLM("ollama")
+    assert router.hedging_delay(ollama, None) == 0.05
+
+    for _ in range(5):
+        router._tracker(ollama, None).record(0.2)
+    assert router.hedging_delay(ollama, None) == 0.2
+
+
+def test_route_llm_provider():
+    """Routing off returns the provider itself, otherwise a routed provider"""
+    ollama = FakeLLM("ollama")
+
+    assert route_llm_provider(ollama, "off") is ollama
+    assert route_llm_provider(ollama, "failover").provider_name == "ollama:failover"
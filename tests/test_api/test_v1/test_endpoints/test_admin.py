@@ -0,0 +1,89 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.summarizer.store import SummaryStore, content_hash
+from app.core.summarizer.tree import summary_node_cache
+from app.main import app
+
+
+client = TestClient(app)
+summary_store_endpoint = "api/v1/admin/summary-store"
+
+
+def test_summary_store_stats_and_purge(tmp_path):
+    """Test reading the summary store stats and purging its entries"""
+    store = SummaryStore(path=str(tmp_path), max_bytes=1024 * 1024, enabled=True)
+    store.put(content_hash(b"a"), {"summary": "a"})
+    store.put(content_hash(b"b"), {"summary": "b"})
+
+    with patch("app.api.v1.endpoints.admin.summary_store", store):
+        assert client.get(summary_store_endpoint).json()["entries"] == 2
+        response = client.delete(summary_store_endpoint, params={"key": content_hash(b"a")})
+        assert response.json() == {"purged": 1}
+        assert client.delete(summary_store_endpoint).json() == {"purged": 1}
+        assert client.get(summary_store_endpoint).json()["entries"] == 0
+
+
+def test_summary_store_purge_rejects_invalid_keys(tmp_path):
+    """Test that keys other than sha256 digests cannot reach files outside the store"""
+    victim = tmp_path / "victim" / "important.json"
+    victim.parent.mkdir()
+    victim.write_text("{}")
+    store = SummaryStore(path=str(tmp_path / "store"), max_bytes=1024 * 1024, enabled=True)
+
+    with patch("app.api.v1.endpoints.admin.summary_store", store):
+        response = client.delete(summary_store_endpoint, params={"key": "../victim/important"})
+
+    assert response.status_code == 422
+    assert victim.exists()
+
+
+def test_summarizer_coalescing_stats():
+    """Test reading the request coalescing counters"""
+    response = client.get("api/v1/admin/summarizer-coalescing")
+
+    assert response.status_code == 200
+    assert set(response.json()) == {"in_flight", "started", "deduplicated"}
+
+
+def test_provider_limits():
+    """Test reading the concurrency limit and queue depth of every provider and model"""
+    response = client.get("api/v1/admin/provider-limits")
+
+    assert response.status_code == 200
+    assert response.json()["limiters"] == []
+
+
+def test_provider_circuits():
+    """Test reading the circuit breaker state of every provider"""
+    response = client.get("api/v1/admin/provider-circuits")
+
+    assert response.status_code == 200
+    assert response.json() == {"circuits": []}
+
+
+def test_summary_node_cache_stats_and_clear():
+    """Test reading and clearing the summary tree node cache"""
+    summary_node_cache.set("key", "Node summary")
+
+    response = client.get("api/v1/admin/summary-nodes")
+    assert response.status_code == 200
+    assert response.json()["entries"] == 1
+
+    response = client.delete("api/v1/admin/summary-nodes")
+    assert response.json() == {"cleared": 1}
+    assert len(summary_node_cache) == 0
@@ -0,0 +1,360 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.core.config import settings
+from app.core.llm.limiter import provider_limiters
+from app.core.llm.openai import OpenAILLM
+from app.core.llm.semantic_cache import semantic_cache
+from app.main import app
+
+
+ask_endpoint = "/api/v1/llm/ask"
+ask_stream_endpoint = "/api/v1/llm/ask/stream"
+ask_batch_endpoint = "/api/v1/llm/ask/batch"
+SLOW_CALL_SECONDS = 0.5
+PARALLEL_REQUESTS = 8
+
+
+class SlowChatModel:
+    """Fake chat model that takes a while to answer without blocking the event loop"""
+
+    def __init__(self, model: str = "slow-model", **kwargs):
+        self.model = model
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(SLOW_CALL_SECONDS)
+        return AIMessage(content="42", response_metadata={"model": self.model})
+
+    async def astream(self, messages):
+        for token in ["The answer ", "is ", "42"]:
+            await asyncio.sleep(0)
+            yield AIMessageChunk(content=token)
+        yield AIMessageChunk(
+            content="",
+            response_metadata={"model": self.model},
+            usage_metadata={"input_tokens": 5, "output_tokens": 3, "total_tokens": 8},
+        )
+
+
+def parse_sse(body: str):
+    """Parse a Server-Sent Events body into (event, data) tuples"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_ask_parallel_requests_do_not_block_each_other():
+    """N parallel ask calls should take about as long as a single one"""
+    payload = {"provider": "ollama", "query": "What is the meaning of life?"}
+
+    with patch("app.core.llm.ollama.ChatOllama", SlowChatModel):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(
+                *(client.post(ask_endpoint, json=payload) for _ in range(PARALLEL_REQUESTS))
+            )
+            elapsed = time.perf_counter() - start
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.json()["response"] == "42" for response in responses)
+    assert elapsed < SLOW_CALL_SECONDS * 2
+
+
+@pytest.mark.asyncio
+async def test_ask_stream_sends_tokens_and_metadata():
+    """Tokens are sent as SSE events followed by a final metadata event"""
+    payload = {"provider": "ollama", "query": "What is the meaning of life?"}
+
+    with patch("app.core.llm.ollama.ChatOllama", SlowChatModel):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.post(ask_stream_endpoint, json=payload)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["token", "token", "token", "metadata"]
+    assert "".join(data["content"] for _, data in events[:3]) == "The answer is 42"
+    assert events[-1][1]["model"] == settings.ollama_default_model
+    assert events[-1][1]["provider"] == "ollama"
+    assert events[-1][1]["usage"]["total_tokens"] == 8
+
+
+@pytest.mark.asyncio
+async def test_ask_stream_client_disconnect_closes_upstream_stream():
+    """A client going away mid-stream closes the upstream stream and frees its limiter slot"""
+    upstream_closed = asyncio.Event()
+    first_token_sent = asyncio.Event()
+    request_sent = False
+
+    class EndlessChatModel(SlowChatModel):
+        async def astream(self, messages):
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield AIMessageChunk(content="token ")
+            finally:
+                upstream_closed.set()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            body = json.dumps({"provider": "ollama", "query": "Tell me everything"}).encode()
+            return {"type": "http.request", "body": body, "more_body": False}
+        await first_token_sent.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_token_sent.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": ask_stream_endpoint,
+        "raw_path": ask_stream_endpoint.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"content-type", b"application/json")],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    with patch("app.core.llm.ollama.ChatOllama", EndlessChatModel):
+        async with asyncio.timeout(5):
+            await app(scope, receive, send)
+
+    assert first_token_sent.is_set()
+    assert upstream_closed.is_set()
+    assert provider_limiters.get("ollama", settings.ollama_default_model).in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_ask_stream_unknown_provider():
+    """An unavailable provider is rejected before the stream starts"""
+    payload = {"provider": "unknown", "query": "What is the meaning of life?"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        response = await client.post(ask_stream_endpoint, json=payload)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_ask_reports_cache_status():
+    """Repeated deterministic questions are served from the response cache"""
+    payload = {"provider": "ollama", "query": "What is the meaning of life?", "temperature": 0}
+
+    with (
+        patch("app.core.llm.ollama.ChatOllama", SlowChatModel),
+        patch("app.core.llm.ollama.settings.default_model_temperature", 0.0),
+        patch("app.api.v1.endpoints.llm.response_cache.enabled", True),
+    ):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            first = await client.post(ask_endpoint, json=payload)
+            second = await client.post(ask_endpoint, json=payload)
+            bypassed = await client.post(ask_endpoint, json={**payload, "cache": "bypass"})
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert bypassed.headers["X-Cache"] == "BYPASS"
+    assert second.json() == first.json()
+
+
+class FakeEmbeddings:
+    """Fake embeddings model embedding questions about France alike"""
+
+    def __init__(self, model: str = "fake-embeddings", **kwargs):
+        self.model = model
+
+    async def aembed_query(self, query):
+        return [1.0, 0.0] if "France" in query else [0.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_ask_reports_semantic_cache_status():
+    """Paraphrases answered by the semantic cache alone are reported as HIT-SEMANTIC"""
+    payload = {"provider": "ollama", "query": "What is the capital of France?", "temperature": 0}
+
+    with (
+        patch("app.core.llm.ollama.ChatOllama", SlowChatModel),
+        patch("app.core.llm.ollama.OllamaEmbeddings", FakeEmbeddings),
+        patch("app.core.llm.ollama.settings.default_model_temperature", 0.0),
+        patch("app.api.v1.endpoints.llm.response_cache.enabled", False),
+        patch("app.api.v1.endpoints.llm.semantic_cache.enabled", True),
+    ):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            first = await client.post(ask_endpoint, json=payload)
+            paraphrase = await client.post(
+                ask_endpoint, json={**payload, "query": "France's capital?"}
+            )
+            bypassed = await client.post(ask_endpoint, json={**payload, "cache": "bypass"})
+        # Drop the fake embeddings client
+        await semantic_cache.aclose()
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert paraphrase.headers["X-Cache"] == "HIT-SEMANTIC"
+    assert paraphrase.json()["similarity"] == pytest.approx(1.0)
+    assert bypassed.headers["X-Cache"] == "BYPASS"
+
+
+@pytest.mark.asyncio
+async def test_ask_sheds_load_when_provider_is_overloaded():
+    """Requests beyond the concurrency limit and wait queue are rejected with 429"""
+    payload = {"provider": "ollama", "query": "What is the meaning of life?"}
+
+    with (
+        patch("app.core.llm.ollama.ChatOllama", SlowChatModel),
+        patch("app.core.llm.limiter.settings.limiter_initial_limit", 1),
+        patch("app.core.llm.limiter.settings.limiter_max_queue", 1),
+    ):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            responses = await asyncio.gather(
+                *(client.post(ask_endpoint, json=payload) for _ in range(3))
+            )
+
+    status_codes = sorted(response.status_code for response in responses)
+    assert status_codes == [200, 200, 429]
+    rejected = next(response for response in responses if response.status_code == 429)
+    assert int(rejected.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.asyncio
+async def test_ask_stream_is_refused_when_provider_is_overloaded():
+    """Streams beyond the concurrency limit and wait queue get a real 429 before starting"""
+    payload = {"provider": "ollama", "query": "What is the meaning of life?"}
+
+    with (
+        patch("app.core.llm.ollama.ChatOllama", SlowChatModel),
+        patch("app.core.llm.limiter.settings.limiter_initial_limit", 1),
+        patch("app.core.llm.limiter.settings.limiter_max_queue", 0),
+    ):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            async with provider_limiters.slot("ollama", settings.ollama_default_model):
+                refused = await client.post(ask_stream_endpoint, json=payload)
+            accepted = await client.post(ask_stream_endpoint, json=payload)
+
+    assert refused.status_code == 429
+    assert int(refused.headers["Retry-After"]) >= 1
+    assert accepted.status_code == 200
+    assert parse_sse(accepted.text)[-1][0] == "metadata"
+
+
+class FlakyChatModel(SlowChatModel):
+    """Fake chat model whose upstream is unreachable"""
+
+    async def ainvoke(self, messages):
+        raise httpx.ConnectError("Connection refused")
+
+
+@pytest.mark.asyncio
+async def test_ask_fails_fast_while_circuit_is_open():
+    """Unreachable providers are retried and fail with 502, then are rejected with 503"""
+    payload = {"provider": "ollama", "query": "What is the meaning of life?"}
+
+    with (
+        patch("app.core.llm.ollama.ChatOllama", FlakyChatModel),
+        patch("app.core.llm.resilience.provider_resilience.base_delay", 0.001),
+        patch("app.core.llm.resilience.provider_resilience.failure_threshold", 3),
+    ):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            failed = await client.post(ask_endpoint, json=payload)
+            rejected = await client.post(ask_endpoint, json=payload)
+
+    assert failed.status_code == 502
+    assert rejected.status_code == 503
+    assert int(rejected.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.asyncio
+async def test_ask_fails_over_to_next_provider():
+    """With failover routing an unreachable Ollama is replaced by OpenAI"""
+    payload = {"provider": "ollama", "query": "What is the meaning of life?", "routing": "failover"}
+
+    with patch("app.core.llm.openai.settings.openai_api_key", "test-key"):
+        openai_llm = OpenAILLM()
+
+    with (
+        patch("app.core.llm.ollama.ChatOllama", FlakyChatModel),
+        patch("app.core.llm.openai.ChatOpenAI", SlowChatModel),
+        patch("app.core.llm.resilience.provider_resilience.max_attempts", 1),
+        patch("app.core.routing.get_llm_provider", return_value=openai_llm),
+    ):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.post(ask_endpoint, json=payload)
+
+    assert response.status_code == 200
+    assert response.json()["provider"] == "openai"
+
+
+@pytest.mark.asyncio
+async def test_ask_batch_returns_results_in_input_order():
+    """Batch items are answered concurrently and returned in input order with their errors"""
+    items = [
+        {"provider": "ollama", "query": "First question"},
+        {"provider": "unknown", "query": "Second question"},
+        {"provider": "ollama", "query": "Third question"},
+    ]
+
+    with patch("app.core.llm.ollama.ChatOllama", SlowChatModel):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.post(ask_batch_endpoint, json={"items": items})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[0]["result"]["response"] == "42"
+    assert results[1]["error"] == "Provider unknown not available or not configured"
+    assert results[2]["result"]["response"] == "42"
+
+
+@pytest.mark.asyncio
+async def test_ask_batch_streams_ndjson():
+    """Batch results can be streamed as NDJSON lines"""
+    items = [{"provider": "ollama", "query": f"Question {index}"} for index in range(3)]
+
+    with patch("app.core.llm.ollama.ChatOllama", SlowChatModel):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.post(ask_batch_endpoint, json={"items": items, "stream": True})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert all(line["result"]["response"] == "42" for line in lines)
@@ -11,11 +11,24 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import asyncio
+from itertools import repeat
+import json
+from unittest.mock import AsyncMock, patch
 
-# from unittest.mock import patch
-# from fastapi.testclient import TestClient
+import httpx
+import pytest
+
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.core.summarizer.jobs import summary_jobs
+from app.core.summarizer.ollama import OllamaSummarizer
+from app.core.summarizer.store import SummaryStore
+from app.main import app
+from tests.helpers import build_pdf
 
-# from app.main import app
 # from app.models.schema import SummaryRequest
 
 
@@ -158,3 +171,292 @@
 #     response = client.post(summarize_endpoint, json=invalid_request)
 
 #     assert response.status_code == 422  # FastAPI validation error
+
+
+client = TestClient(app)
+text_stream_endpoint = "api/v1/summarizer/text/stream"
+pdf_stream_endpoint = "api/v1/summarizer/pdf/stream"
+
+
+def fake_chat_ollama(**kwargs):
+    """Fake ChatOllama streaming a fixed summary"""
+    return GenericFakeChatModel(messages=repeat(AIMessage(content="The generated summary")))
+
+
+def parse_sse(body: str):
+    """Parse a Server-Sent Events body into (event, data) tuples"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama)
+def test_summarize_text_stream():
+    """Test streaming a text summary"""
+    response = client.post(text_stream_endpoint, json={"text": "Some long text"})
+
+    assert response.status_code == 200
+    events = parse_sse(response.text)
+    assert events[0] == ("progress", {"phase": "prompting", "documents": 1})
+    assert events[-1][0] == "summary"
+    assert events[-1][1]["summary"] == "The generated summary"
+    assert events[-1][1]["source"] == "text"
+
+
+@patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama)
+def test_summarize_pdf_stream():
+    """Test streaming a PDF summary"""
+    files = {"file": ("document.pdf", build_pdf(["Page one", "Page two"]), "application/pdf")}
+    response = client.post(pdf_stream_endpoint, files=files)
+
+    assert response.status_code == 200
+    events = parse_sse(response.text)
+    assert [event for event, _ in events[:3]] == ["progress", "progress", "progress"]
+    assert events[1][1] == {"phase": "extracted", "pages": 2}
+    assert events[-1][1]["summary"] == "The generated summary"
+    assert events[-1][1]["source"] == "pdf"
+
+
+@patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama)
+def test_summarize_text_reports_the_strategy_used():
+    """Test that texts over the model context are fitted with the strategy requested"""
+    payload = {"text": "word " * 20000, "strategy": "chunked"}
+    response = client.post("api/v1/summarizer/text", json=payload)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["strategy"] == "chunked"
+    assert result["chunks"] > 1
+    assert {"map", "summary"} <= set(result["timings"])
+
+    response = client.post("api/v1/summarizer/text", json={**payload, "strategy": "unknown"})
+    assert response.status_code == 422
+
+
+@patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama)
+def test_summarize_text_reports_the_compression():
+    """Test that texts are pre-compressed to the ratio requested"""
+    text = " ".join(f"Sentence {index} is about solar power." for index in range(200))
+    response = client.post("api/v1/summarizer/text", json={"text": text, "compression_ratio": 0.2})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["compressed_tokens"] <= result["input_tokens"] * 0.2
+    assert "compression" in result["timings"]
+
+    for ratio in (0, 1.5):
+        response = client.post(
+            "api/v1/summarizer/text", json={"text": text, "compression_ratio": ratio}
+        )
+        assert response.status_code == 422
+
+
+def test_summarize_pdf_stream_rejects_other_files():
+    """Test that only PDF files can be summarized"""
+    files = {"file": ("notes.txt", b"Some text", "text/plain")}
+    response = client.post(pdf_stream_endpoint, files=files)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_identical_text_requests_share_one_generation():
+    """Test that concurrent identical text summaries only generate once"""
+
+    async def slow_summary(**kwargs):
+        await asyncio.sleep(0.1)
+        return {
+            "model": kwargs["model"],
+            "provider": "ollama",
+            "response_max_tokens": kwargs["max_length"],
+            "summary": "The generated summary",
+            "summary_type": kwargs["summary_type"],
+            "source": "text",
+            "temperature": kwargs["temperature"],
+        }
+
+    with patch(
+        "app.core.summarizer.ollama.OllamaSummarizer.summarize_text",
+        AsyncMock(side_effect=slow_summary),
+    ) as mock_summarize:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            responses = await asyncio.gather(
+                *(
+                    client.post("/api/v1/summarizer/text", json={"text": "Shared document"})
+                    for _ in range(5)
+                )
+            )
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.json()["summary"] == "The generated summary" for response in responses)
+    mock_summarize.assert_awaited_once()
+
+
+@patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama)
+def test_summarize_text_batch_streams_results():
+    """Test that every text of a batch gets a result line"""
+    items = [{"text": f"Document {index}"} for index in range(3)] + [
+        {"text": "Unknown provider", "provider": "unknown"}
+    ]
+    response = client.post("api/v1/summarizer/text/batch", json={"items": items})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = sorted(
+        (json.loads(line) for line in response.text.splitlines()), key=lambda line: line["index"]
+    )
+    assert [line["index"] for line in lines] == [0, 1, 2, 3]
+    assert all(line["result"]["summary"] == "The generated summary" for line in lines[:3])
+    assert lines[3]["error"] == "Provider unknown not available or not configured"
+
+
+@patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama)
+def test_summarize_pdf_batch_streams_results():
+    """Test that every uploaded PDF gets a result line with its file name"""
+    files = [
+        ("files", ("first.pdf", build_pdf(["First document"]), "application/pdf")),
+        ("files", ("second.pdf", build_pdf(["Second document"]), "application/pdf")),
+    ]
+    response = client.post("api/v1/summarizer/pdf/batch", files=files)
+
+    assert response.status_code == 200
+    lines = {json.loads(line)["file_name"]: json.loads(line) for line in response.text.splitlines()}
+    assert set(lines) == {"first.pdf", "second.pdf"}
+    assert lines["second.pdf"]["index"] == 1
+    assert all(line["result"]["source"] == "pdf" for line in lines.values())
+
+
+def test_summarize_pdf_batch_rejects_large_batches():
+    """Test that batches over the total size limit are rejected before being read"""
+    content = build_pdf(["A document"])
+    files = [("files", (f"{index}.pdf", content, "application/pdf")) for index in range(3)]
+
+    with patch("app.api.v1.endpoints.summarizer.settings.batch_max_bytes", 2 * len(content)):
+        response = client.post("api/v1/summarizer/pdf/batch", files=files)
+
+    assert response.status_code == 413
+
+
+def test_summarize_pdf_batch_rejects_other_files():
+    """Test that batches with files that are not PDFs are rejected"""
+    files = [
+        ("files", ("first.pdf", build_pdf(["First document"]), "application/pdf")),
+        ("files", ("notes.txt", b"Some text", "text/plain")),
+    ]
+    response = client.post("api/v1/summarizer/pdf/batch", files=files)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_pdf_summary_job_lifecycle():
+    """Test polling a PDF summary job until its result is available"""
+    files = {"file": ("document.pdf", build_pdf(["Page one", "Page two"]), "application/pdf")}
+
+    with patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.post("/api/v1/summarizer/jobs/pdf", files=files)
+            assert response.status_code == 202
+            job_id = response.json()["id"]
+
+            for _ in range(100):
+                job = (await client.get(f"/api/v1/summarizer/jobs/{job_id}")).json()
+                if job["status"] == "succeeded":
+                    break
+                await asyncio.sleep(0.01)
+    await summary_jobs.aclose()
+
+    assert job["status"] == "succeeded"
+    assert job["progress"]["pages"] == 2
+    assert job["result"]["summary"] == "The generated summary"
+    assert job["result"]["source"] == "pdf"
+
+
+@pytest.mark.asyncio
+async def test_identical_pdf_summary_jobs_generate_once(tmp_path):
+    """Test that a repeated job POST joins the first job and later ones use the summary store"""
+    files = {"file": ("document.pdf", build_pdf(["Page one", "Page two"]), "application/pdf")}
+    store = SummaryStore(path=str(tmp_path), max_bytes=1024 * 1024, enabled=True)
+    generations = []
+    stream_pdf_summary = OllamaSummarizer.stream_pdf_summary
+
+    def counting_stream_pdf_summary(self, *args, **kwargs):
+        generations.append(args)
+        return stream_pdf_summary(self, *args, **kwargs)
+
+    async def wait_succeeded(client, job_id):
+        for _ in range(100):
+            job = (await client.get(f"/api/v1/summarizer/jobs/{job_id}")).json()
+            if job["status"] == "succeeded":
+                return job
+            await asyncio.sleep(0.01)
+
+    with (
+        patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama),
+        patch.object(OllamaSummarizer, "stream_pdf_summary", counting_stream_pdf_summary),
+        patch("app.api.v1.endpoints.summarizer.summary_store", store),
+    ):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            first = (await client.post("/api/v1/summarizer/jobs/pdf", files=files)).json()
+            retried = (await client.post("/api/v1/summarizer/jobs/pdf", files=files)).json()
+            await wait_succeeded(client, first["id"])
+
+            # Once the job is forgotten, the summary is served from the store
+            summary_jobs._jobs.clear()
+            later = (await client.post("/api/v1/summarizer/jobs/pdf", files=files)).json()
+            job = await wait_succeeded(client, later["id"])
+    await summary_jobs.aclose()
+
+    assert retried["id"] == first["id"]
+    assert later["id"] != first["id"]
+    assert job["result"]["summary"] == "The generated summary"
+    assert len(generations) == 1
+
+
+@pytest.mark.asyncio
+async def test_summary_job_queue_full():
+    """Test that jobs beyond the wait queue are rejected with 429 and a Retry-After header"""
+    payload = {"provider": "ollama", "text": "Some text to summarize"}
+
+    with patch("app.api.v1.endpoints.summarizer.summary_jobs.max_queued", 0):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.post("/api/v1/summarizer/jobs/text", json=payload)
+    await summary_jobs.aclose()
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_unknown_summary_job():
+    """Test that unknown jobs can not be polled or cancelled"""
+    assert client.get("api/v1/summarizer/jobs/unknown").status_code == 404
+    assert client.delete("api/v1/summarizer/jobs/unknown").status_code == 404
+
+
+@patch("app.core.llm.ollama.ChatOllama", fake_chat_ollama)
+def test_summarize_pdf_leaves_no_temp_files(tmp_path):
+    """Test that summarizing a PDF does not write the upload to temporary files"""
+    files = {"file": ("document.pdf", build_pdf(["Page one", "Page two"]), "application/pdf")}
+
+    with patch("tempfile.tempdir", str(tmp_path)):
+        response = client.post("api/v1/summarizer/pdf", files=files)
+
+    assert response.status_code == 200
+    assert response.json()["summary"] == "The generated summary"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_summarize_pdf_rejects_large_files():
+    """Test that PDF uploads over the maximum size are rejected with 413"""
+    files = {"file": ("document.pdf", build_pdf(["Page one"]), "application/pdf")}
+
+    with patch("app.api.v1.uploads.settings.upload_max_bytes", 100):
+        response = client.post("api/v1/summarizer/pdf", files=files)
+
+    assert response.status_code == 413
@@ -0,0 +1,93 @@
+#  Copyright 2024-present Julian Nonino
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import io
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.api.v1.uploads import read_pdf_upload
+from tests.helpers import build_pdf
+
+
+def upload(content: bytes, size=None) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename="document.pdf", size=size)
+
+
+@pytest.mark.asyncio
+async def test_read_pdf_upload():
+    """Test that the whole PDF is read in chunks"""
+    content = build_pdf(["First page", "Second page"])
+
+    with patch("app.api.v1.uploads.settings.upload_chunk_size", 64):
+        assert await read_pdf_upload(upload(content)) == content
+
+
+@pytest.mark.asyncio
+async def test_read_pdf_upload_holds_one_copy_of_the_file():
+    """Test that reading a file does not allocate more than about its size"""
+    content = b"%PDF-1.4\n" + b"x" * (8 * 1024 * 1024)
+
+    with patch("app.api.v1.uploads.settings.upload_chunk_size", 64 * 1024):
+        tracemalloc.start()
+        try:
+            read = await read_pdf_upload(upload(content))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    assert read == content
+    assert peak < 1.5 * len(content)
+
+
+@pytest.mark.asyncio
+async def test_read_pdf_upload_accepts_a_header_after_leading_bytes():
+    """Test that the PDF header is looked for in the first KiB, like PDF readers do"""
+    content = b"\xef\xbb\xbf\r\n" + build_pdf(["First page"])
+
+    assert await read_pdf_upload(upload(content)) == content
+
+    with pytest.raises(HTTPException) as exc_info:
+        await read_pdf_upload(upload(b" " * 1024 + build_pdf(["First page"])))
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_pdf_upload_rejects_other_files():
+    """Test that files without the PDF magic bytes are rejected"""
+    with pytest.raises(HTTPException) as exc_info:
+        await read_pdf_upload(upload(b"Some text pretending to be a PDF"))
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_pdf_upload_rejects_large_files():
+    """Test that files over the maximum size are rejected, before reading when possible"""
+    content = build_pdf(["First page"])
+
+    with (
+        patch("app.api.v1.uploads.settings.upload_max_bytes", 100),
+        patch("app.api.v1.uploads.settings.upload_chunk_size", 64),
+    ):
+        with pytest.raises(HTTPException) as exc_info:
+            await read_pdf_upload(upload(content))
+        assert exc_info.value.status_code == 413
+
+        file = upload(content, size=len(content))
+        with pytest.raises(HTTPException) as exc_info:
+            await read_pdf_upload(file)
+        assert exc_info.value.status_code == 413
+        assert file.file.tell() == 0
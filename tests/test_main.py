@@ -11,6 +11,7 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+from unittest.mock import AsyncMock, patch
 
 from fastapi.testclient import TestClient
 
@@ -40,3 +41,14 @@ def test_health_endpoint():
 
     assert response.status_code == 200
     assert response.json() == {"status": "OK"}
+
+
+def test_lifespan_starts_and_shuts_down_providers():
+    """Test that the application lifespan drives the provider factory"""
+    with patch("app.main.provider_factory") as mock_factory:
+        mock_factory.startup = AsyncMock()
+        mock_factory.shutdown = AsyncMock()
+        with TestClient(app):
+            mock_factory.startup.assert_awaited_once()
+            mock_factory.shutdown.assert_not_awaited()
+        mock_factory.shutdown.assert_awaited_once()